@@ -0,0 +1,157 @@
+"""Offline benchmarks for `query` and `Sbom_Process_CLI` against the local
+deps.dev stand-in in `mock_server.py`.
+
+    python benchmarks/bench.py --sizes 100 1000 --latency 0.02 --output bench.json
+
+Results (throughput and latency percentiles) are written as JSON, compare two
+files from different versions to spot regressions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_server import MockServer, MockSettings
+from open_source_insights_api import __version__
+from open_source_insights_api.cli import Sbom_Process_CLI
+from open_source_insights_api.os_insights import query
+from open_source_insights_api.throttle import RetryPolicy
+
+
+def synthetic_sbom(size):
+    """`size` npm components, spread over size / 4 packages and size / 10
+    repositories, like a real SBOM with several versions of the same package.
+    """
+    return {
+        "bomFormat": "CycloneDX",
+        "components": [
+            {"name": f"pkg-{i % max(1, size // 4)}", "purl": f"pkg:npm/%40scope-{i % max(1, size // 10)}/pkg-{i % max(1, size // 4)}@1.0.{i % 5}"}
+            for i in range(size)
+        ]
+    }
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    def pick(p):
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": pick(50) * 1000,
+        "p95_ms": pick(95) * 1000,
+        "p99_ms": pick(99) * 1000,
+        "max_ms": samples[-1] * 1000
+    }
+
+
+def new_query(server):
+    return query(base_url=server.base_url, retry=RetryPolicy(backoff_base=0.01))
+
+
+def bench_sync(server, size):
+    samples = []
+    started = time.perf_counter()
+    with new_query(server) as osi:
+        for i in range(size):
+            t = time.perf_counter()
+            osi.GetVersion('npm', f'pkg-{i}', '1.0.0')
+            samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    return {"requests": size, "seconds": elapsed, "requests_per_second": size / elapsed, "latency": percentiles(samples)}
+
+
+def bench_async(server, size, concurrency):
+    samples = []
+
+    async def timed(osi, semaphore, i):
+        async with semaphore:
+            t = time.perf_counter()
+            await osi.async_GetVersion('npm', f'pkg-{i}', '1.0.0')
+            samples.append(time.perf_counter() - t)
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        async with new_query(server) as osi:
+            await asyncio.gather(*[timed(osi, semaphore, i) for i in range(size)])
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    return {"requests": size, "concurrency": concurrency, "seconds": elapsed, "requests_per_second": size / elapsed, "latency": percentiles(samples)}
+
+
+def bench_process(server, size, concurrency):
+    sbom = synthetic_sbom(size)
+    requests_before = server.settings.requests
+    started = time.perf_counter()
+    with new_query(server) as osi:
+        sbom_process = Sbom_Process_CLI(sbom_json=sbom, osi=osi)
+        sbom_process.process(concurrency=concurrency)
+    elapsed = time.perf_counter() - started
+    return {
+        "components": size,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "components_per_second": size / elapsed,
+        "upstream_requests": server.settings.requests - requests_before
+    }
+
+
+def run(arguments):
+    settings = MockSettings(latency=arguments.latency, jitter=arguments.jitter, error_rate=arguments.error_rate, dependency_nodes=arguments.dependency_nodes)
+    results = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "started_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "settings": {
+            "latency": arguments.latency,
+            "jitter": arguments.jitter,
+            "error_rate": arguments.error_rate,
+            "dependency_nodes": arguments.dependency_nodes,
+            "concurrency": arguments.concurrency
+        },
+        "benchmarks": []
+    }
+    with MockServer(settings) as server:
+        for size in arguments.sizes:
+            entry = {"size": size}
+            if size <= arguments.sync_limit:
+                entry["sync_GetVersion"] = bench_sync(server, size)
+                entry["process_sequential"] = bench_process(server, size, None)
+            entry["async_GetVersion"] = bench_async(server, size, arguments.concurrency)
+            entry["process_concurrent"] = bench_process(server, size, arguments.concurrency)
+            results["benchmarks"].append(entry)
+    return results
+
+
+def args():
+    parser = argparse.ArgumentParser(description="SBOM Insights offline benchmarks")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[100, 1000, 10000], help="Synthetic SBOM sizes. (Default is 100 1000 10000)")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrency of the async runs. (Default is 50)")
+    parser.add_argument("--sync-limit", type=int, default=1000, help="Skip the sequential runs above this size. (Default is 1000)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the stand-in waits per answer. (Default is 0.02)")
+    parser.add_argument("--jitter", type=float, default=0.005, help="Random +/- seconds around --latency. (Default is 0.005)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of answers failing with 503. (Default is 0)")
+    parser.add_argument("--dependency-nodes", type=int, default=50, help="Nodes in each dependency graph. (Default is 50)")
+    parser.add_argument("-o", "--output", type=str, default='bench.json', help="Write the results to this JSON file. (Default is bench.json)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = args()
+    results = run(arguments)
+    with open(arguments.output, 'w') as file:
+        file.write(json.dumps(results, indent=4))
+    print(json.dumps(results, indent=4))
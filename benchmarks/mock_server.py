@@ -0,0 +1,186 @@
+"""Local stand-in for the deps.dev `/v3alpha` endpoints used by `query`.
+
+Answers are synthetic but shaped like the real API. Latency, error rate and
+the size of dependency graphs are configurable, so benchmarks run offline and
+are repeatable.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import urllib.parse
+import zlib
+
+
+def stable_hash(text):
+    return zlib.crc32(text.encode('utf-8'))
+
+
+class MockSettings:
+    def __init__(self, latency=0.02, jitter=0.01, error_rate=0.0, dependency_nodes=50, advisories=1, seed=0) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.dependency_nodes = dependency_nodes
+        self.advisories = advisories
+        self.seed = seed
+        self.counter = multiprocessing.Value('l', 0)
+
+    @property
+    def requests(self):
+        return self.counter.value
+
+
+def package_body(system, name):
+    return {
+        "packageKey": {"system": system.upper(), "name": name},
+        "versions": [
+            {"versionKey": {"system": system.upper(), "name": name, "version": f"1.0.{i}"}, "publishedAt": "2023-01-01T00:00:00Z", "isDefault": i == 4}
+            for i in range(5)
+        ]
+    }
+
+
+def version_body(system, name, version, settings):
+    repo = name.split('/')[0].lstrip('@') or name
+    return {
+        "versionKey": {"system": system.upper(), "name": name, "version": version},
+        "isDefault": version == "1.0.4",
+        "licenses": ["MIT"] if stable_hash(name) % 3 else [],
+        "advisoryKeys": [{"id": f"GHSA-mock-{abs(stable_hash(name)) % 97:04d}-{i:04d}"} for i in range(settings.advisories if stable_hash(name) % 5 == 0 else 0)],
+        "links": [{"label": "SOURCE_REPO", "url": f"https://github.com/mock/{repo}"}]
+    }
+
+
+def dependencies_body(system, name, version, settings):
+    nodes = [{"versionKey": {"system": system.upper(), "name": name, "version": version}, "bundled": False, "relation": "SELF", "errors": []}]
+    edges = []
+    for i in range(1, settings.dependency_nodes + 1):
+        relation = "DIRECT" if i <= max(1, settings.dependency_nodes // 5) else "INDIRECT"
+        nodes.append({"versionKey": {"system": system.upper(), "name": f"dep-{i}", "version": "1.0.4"}, "bundled": False, "relation": relation, "errors": []})
+        edges.append({"fromNode": 0 if relation == "DIRECT" else 1 + i % max(1, settings.dependency_nodes // 5), "toNode": i, "requirement": "^1.0.0"})
+    return {"nodes": nodes, "edges": edges, "error": ""}
+
+
+def project_body(repo):
+    return {
+        "projectKey": {"id": repo},
+        "license": "MIT",
+        "scorecard": {"overallScore": 6.1, "checks": [{"name": "Maintained", "score": 10}, {"name": "Code-Review", "score": 4}]}
+    }
+
+
+def advisory_body(advisory_id):
+    return {"advisoryKey": {"id": advisory_id}, "url": f"https://osv.dev/vulnerability/{advisory_id}", "title": "Mock advisory", "aliases": ["CVE-2023-0000"], "cvss3Score": 7.5, "cvss3Vector": "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:N/A:N"}
+
+
+def route(path, query, settings):
+    parts = [urllib.parse.unquote(part) for part in path.split('/') if part]
+    if parts[:1] != ['v3alpha']:
+        return 404, {"code": 5, "message": "not found"}
+    parts = parts[1:]
+    if parts[:1] == ['systems'] and len(parts) == 4:
+        return 200, package_body(parts[1], parts[3])
+    if parts[:1] == ['systems'] and len(parts) == 6:
+        version, _, suffix = parts[5].partition(':')
+        if suffix == 'dependencies':
+            return 200, dependencies_body(parts[1], parts[3], version, settings)
+        if suffix == 'requirements':
+            return 200, {"nuget": {"dependencyGroups": []}}
+        return 200, version_body(parts[1], parts[3], version, settings)
+    if parts[:1] == ['projects'] and len(parts) >= 2:
+        return 200, project_body('/'.join(parts[1:]))
+    if parts[:1] == ['advisories'] and len(parts) == 2:
+        return 200, advisory_body(parts[1])
+    if parts == ['query']:
+        name = query.get('versionKey.name', ['hashed'])[0]
+        return 200, {"results": [{"version": version_body(query.get('versionKey.system', ['npm'])[0], name, query.get('versionKey.version', ['1.0.4'])[0], settings)}]}
+    return 404, {"code": 5, "message": "not found"}
+
+
+class Server:
+    """Minimal asyncio HTTP/1.1 server with keep-alive, much faster than
+    http.server under many concurrent connections.
+    """
+    def __init__(self, settings) -> None:
+        self.settings = settings
+        self.random = random.Random(settings.seed)
+
+    def answer(self, target):
+        with self.settings.counter.get_lock():
+            self.settings.counter.value += 1
+        delay = max(0, self.settings.latency + self.random.uniform(-self.settings.jitter, self.settings.jitter))
+        if self.random.random() < self.settings.error_rate:
+            return delay, 503, {"code": 14, "message": "unavailable"}
+        url = urllib.parse.urlsplit(target)
+        status, body = route(url.path, urllib.parse.parse_qs(url.query), self.settings)
+        return delay, status, body
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                request_line = head.split(b'\r\n', 1)[0].decode('latin-1')
+                target = request_line.split(' ')[1]
+                delay, status, body = self.answer(target)
+                await asyncio.sleep(delay)
+                payload = json.dumps(body).encode('utf-8')
+                retry_after = b'Retry-After: 0\r\n' if status == 503 else b''
+                writer.write(
+                    f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\n'.encode('latin-1')
+                    + b'Content-Type: application/json\r\n'
+                    + f'Content-Length: {len(payload)}\r\n'.encode('latin-1')
+                    + retry_after + b'\r\n' + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, host, port, ready=None):
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        if ready is not None:
+            ready.put(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+
+def serve(settings, host, port, ready=None):
+    asyncio.run(Server(settings).run(host, port, ready))
+
+
+class MockServer:
+    """Run the stand-in in a child process, so the server does not share the
+    GIL with the code being measured. `base_url` is ready for `query`.
+    """
+    def __init__(self, settings=None, host='127.0.0.1', port=0) -> None:
+        self.settings = settings or MockSettings()
+        self.host = host
+        self.port = port
+        self.base_url = None
+        self.process = None
+
+    def __enter__(self):
+        ready = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=serve, args=(self.settings, self.host, self.port, ready), daemon=True)
+        self.process.start()
+        self.base_url = f'http://{self.host}:{ready.get(timeout=30)}/v3alpha'
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="deps.dev stand-in server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every answer.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of answers that fail with 503.")
+    parser.add_argument("--dependency-nodes", type=int, default=50, help="Nodes in every dependency graph.")
+    arguments = parser.parse_args()
+    settings = MockSettings(latency=arguments.latency, error_rate=arguments.error_rate, dependency_nodes=arguments.dependency_nodes)
+    print(f"Serving http://127.0.0.1:{arguments.port}/v3alpha")
+    serve(settings, '127.0.0.1', arguments.port)
@@ -0,0 +1,32 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+def batch_keys(keys):
+    """Distinct keys as tuples, in the order of their first position, so
+    results follow the caller order.
+    """
+    return list(dict.fromkeys(tuple(key) for key in keys))
+
+
+def batch(func, keys, concurrency):
+    """`func(*key)` of each distinct key, by up to `concurrency` threads,
+    as a dict keyed by the key tuples.
+    """
+    keys = batch_keys(keys)
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(keys)))) as executor:
+        return dict(zip(keys, executor.map(lambda key: func(*key), keys)))
+
+
+async def async_batch(func, keys, concurrency):
+    """Async version of `batch`, at most `concurrency` awaits of `func` run
+    together.
+    """
+    keys = batch_keys(keys)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(key):
+        async with semaphore:
+            return await func(*key)
+
+    return dict(zip(keys, await asyncio.gather(*[fetch(key) for key in keys])))
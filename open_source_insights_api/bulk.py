@@ -0,0 +1,102 @@
+import glob
+import json
+import os
+from array import array
+from open_source_insights_api.export import as_record
+from open_source_insights_api.sbom import iter_components
+from packageurl import PackageURL
+
+
+def sbom_files(pattern):
+    """SBOM files of a directory (its *.json files) or of a glob pattern, sorted."""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.json')
+    return sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+
+class BulkInventory:
+    """Union of the purls of many SBOMs.
+
+    Each unique purl is kept once in `purls`, and every SBOM keeps the
+    positions of its own purls in SBOM order (a purl listed twice is kept
+    twice, so its report has the rows of a single file scan), so one scan of
+    `components()` is enough to write a report per SBOM and the aggregated
+    inventory.
+    """
+    def __init__(self) -> None:
+        self.purls = []
+        self.ids = {}
+        self.sboms = {}
+
+    def add(self, name, components):
+        """Add the components of the SBOM `name`, returning its number of purls."""
+        positions = array('i')
+        for comp in components:
+            if not comp.get('purl'):
+                continue
+            purl = PackageURL.from_string(comp.get('purl')).to_string()
+            position = self.ids.get(purl)
+            if position is None:
+                position = self.ids[purl] = len(self.purls)
+                self.purls.append(purl)
+            positions.append(position)
+        self.sboms[name] = positions
+        return len(positions)
+
+    def add_file(self, path, name=None, identifier=None):
+        """Add an SBOM file, with the purls found from hashes by `identifier`
+        (an `identify.HashIdentifier`) when given.
+        """
+        with open(path, 'r') as file:
+            components = iter_components(file)
+            return self.add(name or path, identifier.fill(components) if identifier is not None else components)
+
+    def components(self):
+        """The unique purls as components for `Sbom_Process_CLI`."""
+        return [{"purl": purl} for purl in self.purls]
+
+    def stats(self):
+        return {
+            "sboms": len(self.sboms),
+            "components": sum(len(positions) for positions in self.sboms.values()),
+            "unique_purls": len(self.purls)
+        }
+
+    def report(self, name, results):
+        """Records of the SBOM `name` in its order, from `results` (purl to model)."""
+        return [as_record(results[self.purls[position]]) for position in self.sboms[name] if self.purls[position] in results]
+
+    def inventory(self, results):
+        """One record per unique purl with the SBOMs it appears in."""
+        containing = [[] for _ in self.purls]
+        for name, positions in self.sboms.items():
+            for position in dict.fromkeys(positions):
+                containing[position].append(name)
+        return [
+            dict(as_record(results[purl]), sboms=containing[position])
+            for position, purl in enumerate(self.purls) if purl in results
+        ]
+
+    def write(self, results, output_dir, inventory_name='inventory.json'):
+        """Write a `<sbom name>.json` report per SBOM and the inventory in
+        `output_dir`, returning the paths written.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        written = []
+        used = {inventory_name}
+        for name in self.sboms:
+            stem = os.path.splitext(os.path.basename(name))[0]
+            file_name, count = f'{stem}.json', 1
+            while file_name in used:
+                count += 1
+                file_name = f'{stem}-{count}.json'
+            used.add(file_name)
+            written.append(self.__dump(self.report(name, results), os.path.join(output_dir, file_name)))
+        written.append(self.__dump(self.inventory(results), os.path.join(output_dir, inventory_name)))
+        return written
+
+    @staticmethod
+    def __dump(records, path):
+        with open(path, 'w') as file:
+            file.write(json.dumps(records, indent=4))
+        return path
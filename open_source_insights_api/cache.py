@@ -0,0 +1,198 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from open_source_insights_api import decoder
+
+# Seconds a cached response stays fresh, by endpoint. Versions, requirements and
+# resolved dependencies of a published release rarely change, advisories and
+# projects (scorecards) are refreshed upstream much more often.
+DEFAULT_TTL = {
+    "package": 24 * 3600,
+    "version": 7 * 24 * 3600,
+    "requirements": 30 * 24 * 3600,
+    "dependencies": 7 * 24 * 3600,
+    "project": 6 * 3600,
+    "advisory": 6 * 3600,
+    "query": 24 * 3600,
+}
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'open_source_insights_api')
+
+
+class SQLiteCache:
+    """Persistent response cache in a single SQLite file, values are stored as
+    zlib compressed JSON.
+
+    Several processes may share the file, e.g. the workers of a scan. A writer
+    waits up to `timeout` seconds for the lock of another one, past that the
+    response is just not cached.
+    """
+    def __init__(self, path=os.path.join(DEFAULT_PATH, 'cache.sqlite3'), timeout=30) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, stored_at REAL, value BLOB)")
+        self.__db.commit()
+
+    def get(self, key, max_age=None):
+        """Return the cached value or None when missing or older than `max_age` seconds."""
+        try:
+            with self.__lock:
+                row = self.__db.execute("SELECT stored_at, value FROM responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        if row is None:
+            return None
+        if max_age is not None and time.time() - row[0] > max_age:
+            return None
+        return decoder.loads(zlib.decompress(row[1]))
+
+    def set(self, key, value, raw=None):
+        """`raw` is `value` already encoded as JSON, e.g. the response body,
+        stored as is instead of encoding `value` again.
+        """
+        blob = zlib.compress(raw if raw is not None else decoder.dumps(value))
+        with self.__lock:
+            try:
+                self.__db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, time.time(), blob))
+                self.__db.commit()
+            except sqlite3.OperationalError:
+                # Still locked by another writer, the response is fetched again next time
+                self.__db.rollback()
+
+    def clear(self):
+        with self.__lock:
+            self.__db.execute("DELETE FROM responses")
+            self.__db.commit()
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+
+class DirectoryCache:
+    """Persistent response cache as a directory of gzip JSON files, one per
+    response, named by the hash of the key.
+    """
+    def __init__(self, path=os.path.join(DEFAULT_PATH, 'responses')) -> None:
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def __file(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest[:2], f'{digest}.json.gz')
+
+    def get(self, key, max_age=None):
+        """Return the cached value or None when missing or older than `max_age` seconds."""
+        file_path = self.__file(key)
+        try:
+            if max_age is not None and time.time() - os.path.getmtime(file_path) > max_age:
+                return None
+            with gzip.open(file_path, 'rb') as file:
+                return decoder.loads(file.read())
+        except (OSError,) + decoder.DECODE_ERRORS:
+            return None
+
+    def set(self, key, value, raw=None):
+        file_path = self.__file(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # Write then rename, so concurrent scans never read a half written file
+        tmp_path = f'{file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with gzip.open(tmp_path, 'wb') as file:
+            file.write(raw if raw is not None else decoder.dumps(value))
+        os.replace(tmp_path, file_path)
+
+    def clear(self):
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith('.json.gz'):
+                    os.remove(os.path.join(root, name))
+
+    def close(self):
+        pass
+
+
+def open_cache(path=None, backend='sqlite'):
+    """Build a cache backend by name, `sqlite` or `files`."""
+    if backend == 'sqlite':
+        return SQLiteCache(path) if path else SQLiteCache()
+    elif backend == 'files':
+        return DirectoryCache(path) if path else DirectoryCache()
+    raise ValueError(f"Cache backend not supported: {backend}")
+
+
+class MemoryCache:
+    """In process LRU cache of resolved responses, bounded by `maxsize` entries
+    and by `max_bytes`, the summed size of the raw responses. The least
+    recently used entries are dropped first and each entry may carry its own
+    TTL in seconds. Thread safe, so sync and async callers can share it.
+    """
+    def __init__(self, maxsize=4096, max_bytes=256 * 1024 * 1024) -> None:
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value or None when missing or expired."""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+                self.__remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, size=None, ttl=None):
+        """Store `value`, `size` is its weight in bytes for the memory budget
+        (estimated from its JSON form when not given).
+        """
+        if size is None:
+            size = len(decoder.dumps(value))
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            self.__entries[key] = (value, size, expires_at)
+            self.bytes += size
+            while len(self.__entries) > self.maxsize or self.bytes > self.max_bytes:
+                self.__remove(next(iter(self.__entries)))
+                self.evictions += 1
+
+    def __remove(self, key):
+        self.bytes -= self.__entries.pop(key)[1]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.__entries),
+            "bytes": self.bytes
+        }
+
+    def __len__(self):
+        return len(self.__entries)
@@ -1,38 +1,139 @@
+from __future__ import annotations
 import argparse
+import functools
+from collections import deque
 import json
-import time
-from open_source_insights_api.os_insights import query
-from rich.table import Table
-from rich.progress import Progress
-from rich.console import Console
+import sys
+from typing import TYPE_CHECKING
+from open_source_insights_api.sbom import iter_components, sbom_components
+from open_source_insights_api.export import EXPORT_FORMATS, NDJSONWriter, export_report, missing_extra, write_json
+from open_source_insights_api.profiler import NullProfiler, StageProfiler
+from open_source_insights_api.lazy import lazy_import
 try:
     from open_source_insights_api import __version__
 except:
     from __init__ import __version__
-import pandas as pd
 import re
-import threading
-from packageurl import PackageURL
+
+# Imported on first use, `sbom_insights --version` or `--help` never load them
+asyncio = lazy_import('asyncio')
+packageurl = lazy_import('packageurl')
+models = lazy_import('open_source_insights_api.models')
+rich = lazy_import('rich')
+rich_progress = lazy_import('rich.progress')
+rich_table = lazy_import('rich.table')
+if TYPE_CHECKING:
+    from rich.table import Table
+
+REGEX_GITHUB = re.compile(r'(github.com\/[a-zA-Z0-9\-\_]{2,}\/[a-zA-Z0-9\-\_]{2,})')
 
 def args():
     parser = argparse.ArgumentParser(description="SBOM Insights")
     parser.add_argument("-f", "--file", type=str, const=True, nargs='?', default='sbom.json', help="Define sbom.json to consume e return insights. (Default is sbom.json)")
     parser.add_argument("-o", "--output", type=str, const=True, nargs='?', default='output.json', help="Output JSON to file, NEED --json to works! (Default is output.json)")
     parser.add_argument("-j", "--json", action="store_true", help="Print output as JSON instead of a table.")
+    parser.add_argument("-c", "--concurrency", type=int, default=None, help="Fetch components concurrently with asyncio, at most N at a time. (Default is sequential)")
+    parser.add_argument("--output-format", type=str, choices=['json', 'ndjson'], default=None, help="With ndjson each component is appended to --output as one JSON line as soon as it is ready.")
+    parser.add_argument("--resume", action="store_true", help="Keep the components already in the --output NDJSON file and scan only the missing ones.")
+    parser.add_argument("-s", "--stream", action="store_true", help="Read the SBOM components incrementally instead of loading the whole file, for very large SBOMs.")
+    parser.add_argument("-w", "--window", type=int, default=None, help="Components held in flight with --concurrency, results are written in order as they leave the window. (Default is 4x concurrency)")
+    parser.add_argument("--cache", type=str, const=True, nargs='?', default=None, help="Keep deps.dev responses in a persistent cache between runs. (Default path is ~/.cache/open_source_insights_api)")
+    parser.add_argument("--cache-backend", type=str, choices=['sqlite', 'files'], default='sqlite', help="Store the cache in one SQLite file or in a directory of gzip JSON files. (Default is sqlite)")
+    parser.add_argument("--offline", action="store_true", help="Only answer from the cache, NEED --cache to works!")
+    parser.add_argument("--api-url", type=str, default='https://api.deps.dev/v3alpha', help="Base URL of the deps.dev API, e.g. a local stand-in. (Default is https://api.deps.dev/v3alpha)")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Send at most N requests per second to deps.dev. (Default is unlimited)")
+    parser.add_argument("--retries", type=int, default=3, help="Retry failed, throttled (429) and 5xx requests N times with backoff. (Default is 3)")
+    parser.add_argument("--stats", action="store_true", help="Print request statistics per endpoint (p50/p95/p99 latency, bytes, cache hits) at the end.")
+    parser.add_argument("--metrics", type=str, default=None, help="Write the request statistics to this file in Prometheus text format.")
+    parser.add_argument("--profile", type=str, const=True, nargs='?', default=None, help="Print the time spent in each pipeline stage. With a PREFIX also write PREFIX.pstats (cProfile), PREFIX.collapsed (flamegraph stacks) and PREFIX.json (per component).")
+    parser.add_argument("--transitive", action="store_true", help="Also count the vulnerabilities of every resolved dependency, each unique version is fetched once for the whole SBOM.")
+    parser.add_argument("--advisories", action="store_true", help="Attach CVSS score, severity and aliases of each advisory, every advisory is fetched once for the whole SBOM. With --transitive the advisories of the dependencies too.")
+    parser.add_argument("--why", type=str, default=None, help="Show which SBOM components pull in PACKAGE[@VERSION] through their resolved dependencies, with the shortest path.")
+    parser.add_argument("--export", type=str, choices=EXPORT_FORMATS + ('none',), default=None, help="Also write the results as an xlsx, csv or parquet (needs pyarrow) report. (Default is xlsx with the table, none with --json or ndjson)")
+    parser.add_argument("--export-file", type=str, default=None, help="Path of the --export report. (Default is output.<format>)")
+    parser.add_argument("--bulk", type=str, default=None, help="Scan every SBOM of a directory or glob pattern (e.g. 'sboms/**/*.json'), each unique purl is enriched once for all of them.")
+    parser.add_argument("--output-dir", type=str, default='reports', help="Directory of the per SBOM reports and inventory.json written by --bulk. (Default is reports)")
+    parser.add_argument("--workers", type=int, default=None, help="Shard the components over N processes, each with its own HTTP client fetching with --concurrency, to use every core. (Default is one process)")
+    parser.add_argument("--identify-hashes", action="store_true", help="Find the purl of components without one (vendored JARs, binaries) from their SHA1/SHA256/SHA512/MD5 hashes with the deps.dev query endpoint.")
+    parser.add_argument("--previous", type=str, default=None, help="Results of a previous run (JSON or NDJSON). Only added components and those scanned more than --max-age ago are enriched again, the rest is carried over, and a diff summary is printed.")
+    parser.add_argument("--max-age", type=float, default=24, help="Hours after which a --previous result is enriched again. (Default is 24)")
+    parser.add_argument("--diff-file", type=str, default=None, help="Also write the --previous diff summary to this JSON file.")
+    parser.add_argument("--server", type=str, default=None, help="Ask a running `sbom_insights serve` daemon (http://host:port or unix:/path) instead of deps.dev, sharing its warm cache. --cache, --api-url and --rate-limit are then the daemon's.")
     parser.add_argument("-v", "--version", action="store_true", help="Show version.")
     arguments = parser.parse_args()
+    if arguments.workers and (arguments.why or arguments.stats or arguments.metrics):
+        parser.error("--workers can not be combined with --why, --stats or --metrics, their data stays in the worker processes")
+    if arguments.export and missing_extra(arguments.export):
+        # Before the scan, whose results would be lost when the writer fails
+        module, extra = missing_extra(arguments.export)
+        parser.error(f"--export {arguments.export} requires the '{extra}' extra ({module}), `pip install open-source-insights-api[{extra}]`")
+    if arguments.bulk and arguments.previous:
+        parser.error("--previous can not be combined with --bulk, it compares the results of one SBOM")
+    if arguments.server and (arguments.stats or arguments.metrics):
+        parser.error("--server can not be combined with --stats or --metrics, the requests are made by the daemon (see its /stats)")
     return arguments
 
 
 class Sbom_Process_CLI:
-    def __init__(self, sbom_json) -> None:
+    def __init__(self, sbom_json=None, osi=None, components=None, skip=None, start=0, profiler=None, graph=None, transitive=False, advisories=False, osi_factory=None, progress=True, identify_hashes=False) -> None:
+        """`components` may be any iterable, e.g. `sbom.iter_components(file)`
+        to stream a large SBOM instead of loading it in `sbom_json`. Components
+        whose purl is in `skip` are left out, and so are the first `start`
+        components with a purl, e.g. those already written by a resumed scan.
+        A `profiler.StageProfiler` records the time spent in each stage and
+        the dependency graph of every component is merged in `graph`, a
+        `graph.SBOMGraph`, when given.
+
+        With `transitive=True` the vulnerabilities of the whole resolved tree
+        are counted too. Each unique version in the merged graph is looked up
+        once for the SBOM, whatever the number of trees it appears in.
+
+        With `advisories=True` the advisories of each component (and of its
+        tree with `transitive`) are attached with their CVSS score, severity
+        and aliases. Advisory IDs are deduplicated SBOM wide and each one is
+        fetched once.
+
+        `osi_factory` is a picklable callable returning the `query` of each
+        worker process with `iter_process(workers=N)`, e.g.
+        `functools.partial(parallel.worker_query, base_url=url)`. Workers keep
+        their own merged graph, advisories and caches. `progress=False` hides
+        the progress bar.
+
+        With `identify_hashes=True` components without a purl are looked up by
+        their `hashes` (see `identify.HashIdentifier`) and enriched like the
+        others when deps.dev knows them.
+        """
         self.sbom = sbom_json
-        self.osi = query()
+        self.profiler = profiler if profiler is not None else NullProfiler()
+        self.transitive = transitive
+        if graph is None and transitive:
+            from open_source_insights_api.graph import SBOMGraph
+            graph = SBOMGraph()
+        self.graph = graph
+        self.node_advisories = {}
+        self.advisories = advisories
+        self.advisory_details = {}
+        self.skip = skip if skip is not None else set()
+        self.start = start
+        self.components = components if components is not None else sbom_components(sbom_json)
+        if osi is None:
+            from open_source_insights_api.os_insights import query
+            osi = query(models=True)
+        self.osi = osi
+        self.identifier = None
+        if identify_hashes:
+            from open_source_insights_api.identify import HashIdentifier
+            self.identifier = HashIdentifier(self.osi)
+            with self.profiler.stage('identify'):
+                self.components = self.identifier.fill(self.components)
+        self.osi_factory = osi_factory
+        self.progress = progress
         self.all_pkgs_info = []
+        self.projects = {}
 
     def generate_table(self) -> Table:
         """Make a new table."""
-        table = Table(title="SBOM Insights")
+        table = rich_table.Table(title="SBOM Insights")
         table.add_column(":package: Package")
         table.add_column(":package: Repository")
         table.add_column(":right_arrow: Version")
@@ -43,237 +144,601 @@ class Sbom_Process_CLI:
         table.add_column(":light_bulb: OpenSSF Score")
         table.add_column(":hammer_and_wrench: Maintainability")
         table.add_column(":credit_card: License")
+        if self.transitive:
+            table.add_column(":skull: Transitive Vulns")
+        if self.advisories:
+            table.add_column(":warning: Max CVSS")
        
+        with self.profiler.stage('table'):
+            self.__add_rows(table)
+        return table
+
+    def export(self, path='output.xlsx', format='xlsx'):
+        """Write the results to a report file, see `export.export_report`."""
+        with self.profiler.stage('export'):
+            return export_report(self.all_pkgs_info, path, format)
+
+    def __add_rows(self, table):
         for pkg in self.all_pkgs_info:
-            dep_dir = f"{pkg.get('dep_indir')}"
-            dep_indir = f"{pkg.get('dep_dir')}"
+            dep_dir = f"{pkg.dep_indir}"
+            dep_indir = f"{pkg.dep_dir}"
             maintained = ""
-            license = f"{pkg.get('license')}"
-            if pkg.get('recv_version') != pkg.get('latest'): 
-                latest = f":new: {pkg.get('latest')}"
+            license = f"{pkg.license}"
+            if pkg.recv_version != pkg.latest: 
+                latest = f":new: {pkg.latest}"
             else:
-                latest = f"{pkg.get('latest')}"
-            if pkg.get('vulnerabilities') != 0:
-                vulnerabilities = f":red_circle: {pkg.get('vulnerabilities')}"
+                latest = f"{pkg.latest}"
+            if pkg.vulnerabilities != 0:
+                vulnerabilities = f":red_circle: {pkg.vulnerabilities}"
             else:
-                vulnerabilities = f":green_circle: {pkg.get('vulnerabilities')}"
-
-            if pkg.get('maintained') != None:
-                if int(pkg.get('maintained')) == 0:
-                    maintained = f":red_circle: {pkg.get('maintained')}"
-                elif int(pkg.get('maintained')) < 5:
-                    maintained = f":yellow_circle: {pkg.get('maintained')}"
-                elif int(pkg.get('maintained')) < 10:
-                    maintained = f":blue_circle: {pkg.get('maintained')}"
-                elif int(pkg.get('maintained')) == 10:
-                    maintained = f":green_circle: {pkg.get('maintained')}"
+                vulnerabilities = f":green_circle: {pkg.vulnerabilities}"
+
+            if pkg.maintained != None:
+                if int(pkg.maintained) == 0:
+                    maintained = f":red_circle: {pkg.maintained}"
+                elif int(pkg.maintained) < 5:
+                    maintained = f":yellow_circle: {pkg.maintained}"
+                elif int(pkg.maintained) < 10:
+                    maintained = f":blue_circle: {pkg.maintained}"
+                elif int(pkg.maintained) == 10:
+                    maintained = f":green_circle: {pkg.maintained}"
             
-            if pkg.get('dep_dir') <= 30:
-                dep_dir = f":green_circle: {pkg.get('dep_dir')}"
-            elif pkg.get('dep_dir') < 60:
-                dep_dir = f":blue_circle: {pkg.get('dep_dir')}"
-            elif pkg.get('dep_dir') <= 100:
-                dep_dir = f":yellow_circle: {pkg.get('dep_dir')}"
-            elif pkg.get('dep_dir') > 100:
-                dep_dir = f":red_circle: {pkg.get('dep_dir')}"
-
-            if pkg.get('dep_indir') <= 30:
-                dep_indir = f":green_circle: {pkg.get('dep_indir')}"
-            elif pkg.get('dep_indir') < 60:
-                dep_indir = f":blue_circle: {pkg.get('dep_indir')}"
-            elif pkg.get('dep_indir') <= 100:
-                dep_indir = f":yellow_circle: {pkg.get('dep_indir')}"
-            elif pkg.get('dep_indir') > 100:
-                dep_indir = f":red_circle: {pkg.get('dep_indir')}"
+            if pkg.dep_dir <= 30:
+                dep_dir = f":green_circle: {pkg.dep_dir}"
+            elif pkg.dep_dir < 60:
+                dep_dir = f":blue_circle: {pkg.dep_dir}"
+            elif pkg.dep_dir <= 100:
+                dep_dir = f":yellow_circle: {pkg.dep_dir}"
+            elif pkg.dep_dir > 100:
+                dep_dir = f":red_circle: {pkg.dep_dir}"
+
+            if pkg.dep_indir <= 30:
+                dep_indir = f":green_circle: {pkg.dep_indir}"
+            elif pkg.dep_indir < 60:
+                dep_indir = f":blue_circle: {pkg.dep_indir}"
+            elif pkg.dep_indir <= 100:
+                dep_indir = f":yellow_circle: {pkg.dep_indir}"
+            elif pkg.dep_indir > 100:
+                dep_indir = f":red_circle: {pkg.dep_indir}"
+
+            optional = []
+            if self.transitive:
+                optional.append(f":red_circle: {pkg.transitive_vulnerabilities}" if pkg.transitive_vulnerabilities else f":green_circle: {pkg.transitive_vulnerabilities}")
+            if self.advisories:
+                optional.append(f"{pkg.max_cvss} {models.cvss_severity(pkg.max_cvss)}" if pkg.max_cvss is not None else "")
 
             table.add_row(
-                f"{pkg.get('pkg_name')}", 
-                f"{pkg.get('system')}".upper(), 
-                f"{pkg.get('recv_version')}",
+                f"{pkg.pkg_name}", 
+                f"{pkg.system}".upper(), 
+                f"{pkg.recv_version}",
                 f"{latest}",
                 f"{dep_dir}",
                 f"{dep_indir}",
                 f"{vulnerabilities}",
-                f"{pkg.get('openssf_score')}",
+                f"{pkg.openssf_score}",
                 f"{maintained}",
-                f"{license}"
+                f"{license}",
+                *optional
             )
-        pd.DataFrame(self.all_pkgs_info).to_excel('output.xlsx', sheet_name="SBOM_INSIGHTS", index=False, header=True)
-        return table
     
-    def __get_osscore(self, pkg_version_info):
-        repo_url = ""
-        score = None
-        regex_github = '(github.com\/[a-zA-Z0-9\-\_]{2,}\/[a-zA-Z0-9\-\_]{2,})'
-        if pkg_version_info.get('links'):
-            if len(pkg_version_info.get('links')) == 0:
-                return ""
-            else:
-                for link in pkg_version_info.get('links'):
-                    if link.get('label') == 'SOURCE_REPO':
-                        try:
-                            repo_url = re.search(regex_github, link.get('url'))[0]
-                        except:
-                            repo_url = ""
-        if repo_url != "":
-            project_data = self.osi.GetProject(repo_url)
-            if project_data.get('scorecard'):
-                score = project_data.get('scorecard').get('overallScore')
-
-        return score
-    
-    def __get_score_maintained(self, pkg_version_info):
-        repo_url = ""
-        score = None
-        regex_github = '(github.com\/[a-zA-Z0-9\-\_]{2,}\/[a-zA-Z0-9\-\_]{2,})'
-        if pkg_version_info.get('links'):
-            if len(pkg_version_info.get('links')) == 0:
-                return ""
-            else:
-                for link in pkg_version_info.get('links'):
-                    if link.get('label') == 'SOURCE_REPO':
-                        try:
-                            repo_url = re.search(regex_github, link.get('url'))[0]
-                        except:
-                            repo_url = ""
-        if repo_url != "":
-            project_data = self.osi.GetProject(repo_url)
-            if project_data.get('scorecard'):
-                for check in project_data.get('scorecard').get('checks'):
-                    if check.get('name') == "Maintained":
-                        score = float(check.get('score'))
-
-        return score
-            
+    def __get_repo_url(self, pkg_version_info):
+        match = REGEX_GITHUB.search(pkg_version_info.source_repo or "")
+        return match[0] if match else ""
 
-    def __get_latest_version(self, pkg_info_os):
-        if pkg_info_os.get('versions'):
-            for version in pkg_info_os.get('versions'):
-                if version.get('isDefault'):
-                    return version.get('versionKey').get('version')
-    
-    def __get_latest_version_date(self, pkg_info_os):
-        if pkg_info_os.get('versions'):
-            for version in pkg_info_os.get('versions'):
-                if version.get('isDefault'):
-                    return version.get('publishedAt')
-              
-    def __get_relations_deps(self, pkg_deps_os):
-        c_relations = {'direct': 0, 'indirect': 0}
-        if pkg_deps_os.get('nodes'):
-            for node in pkg_deps_os.get('nodes'):
-                if node.get('relation') == 'DIRECT':
-                    c_relations['direct'] += 1
-                if node.get('relation') == 'INDIRECT':
-                    c_relations['indirect'] += 1
-            return c_relations
-    
-    def __get_relation_indirect(self, pkg_deps_os):
-        relations = self.__get_relations_deps(pkg_deps_os)
-        if relations:
-            return relations.get('indirect')
-        else:
-            return 0
+    def __get_project(self, repo_url):
+        # Projects are grouped by repository for the whole SBOM, monorepos and
+        # scoped packages share one lookup
+        if repo_url == "":
+            return models.ProjectInfo()
+        if repo_url not in self.projects:
+            self.projects[repo_url] = models.ProjectInfo.coerce(self.osi.GetProject(repo_url))
+        return self.projects[repo_url]
 
-    def __get_relation_direct(self, pkg_deps_os):
-        relations = self.__get_relations_deps(pkg_deps_os)
-        if relations:
-            return relations.get('direct')
-        else:
-            return 0
+    async def __async_get_project(self, repo_url):
+        if repo_url == "":
+            return models.ProjectInfo()
+        if repo_url not in self.projects:
+            self.projects[repo_url] = asyncio.ensure_future(self.osi.async_GetProject(repo_url))
+        return models.ProjectInfo.coerce(await self.projects[repo_url])
 
-    def __get_license(self, pkg_version_info):
-        if pkg_version_info.get('licenses') != None and len(pkg_version_info.get('licenses')) > 0:
-            return pkg_version_info.get('licenses')[0]
+    def __get_pkg_name(self, purl):
+        if purl.namespace and purl.type == 'maven':
+            # deps.dev names Maven packages group:artifact
+            return f'{purl.namespace}:{purl.name}'
+        if purl.namespace:
+            return f'{purl.namespace}/{purl.name}'
         else:
-            repo_url = ""
-            score = None
-            regex_github = '(github.com\/[a-zA-Z0-9\-\_]{2,}\/[a-zA-Z0-9\-\_]{2,})'
-            if pkg_version_info.get('links'):
-                if len(pkg_version_info.get('links')) == 0:
-                    return ""
-                else:
-                    for link in pkg_version_info.get('links'):
-                        if link.get('label') == 'SOURCE_REPO':
-                            try:
-                                repo_url = re.search(regex_github, link.get('url'))[0]
-                            except:
-                                repo_url = ""
-            if repo_url != "":
-                project_data = self.osi.GetProject(repo_url)
-                if project_data.get('license'):
-                    return project_data.get('license')
-        
-    def __get_vulnerabilities(self, pkg_version_info):
-        if pkg_version_info.get('advisoryKeys'):
-            return len(pkg_version_info.get('advisoryKeys'))
+            return f'{purl.name}'
+
+    def __build_model(self, purl, pkg_info, pkg_version, pkg_deps, project_data, **optional):
+        model = models.ComponentInsight.from_responses(
+            self.__get_pkg_name(purl), purl.type, purl.version, purl.to_string(),
+            pkg_info, pkg_version, pkg_deps, project_data
+        )
+        for name, value in optional.items():
+            setattr(model, name, value)
+        return model
+
+    def __index_graph(self, purl, pkg_version, pkg_deps):
+        """Merge the component tree into the SBOM graph, return its key IDs."""
+        if self.graph is None:
+            return None
+        with self.profiler.stage('graph_index'):
+            members = self.graph.add(purl.to_string(), models.DependencyGraph.coerce(pkg_deps))
+            # The component version was just fetched, other trees reuse it
+            root_id = self.graph.roots[-1]
+            if root_id >= 0 and root_id not in self.node_advisories:
+                self.node_advisories[root_id] = pkg_version.advisories
+        return members
+
+    def __tree_advisories(self, members):
+        return tuple(dict.fromkeys(advisory for key_id in members for advisory in self.node_advisories[key_id]))
+
+    def __transitive_vulnerabilities(self, members):
+        missing = [key_id for key_id in members if key_id not in self.node_advisories]
+        if missing:
+            versions = self.osi.GetVersionBatch([self.graph.keys[key_id] for key_id in missing])
+            for key_id in missing:
+                self.node_advisories[key_id] = models.VersionInfo.coerce(versions.get(self.graph.keys[key_id])).advisories
+        return self.__tree_advisories(members)
+
+    async def __bounded(self, call, *args):
+        # Fetches for the trees and advisories of the components get their own
+        # `concurrency` permits, a component already holds one of its semaphore
+        async with self.__fetches:
+            return await call(*args)
+
+    async def __async_transitive_vulnerabilities(self, members):
+        # Versions being fetched are kept as tasks, shared with the other trees
+        for key_id in members:
+            if key_id not in self.node_advisories:
+                self.node_advisories[key_id] = asyncio.ensure_future(self.__bounded(self.osi.async_GetVersion, *self.graph.keys[key_id]))
+        for key_id in members:
+            advisories = self.node_advisories[key_id]
+            if isinstance(advisories, asyncio.Future):
+                self.node_advisories[key_id] = models.VersionInfo.coerce(await advisories).advisories
+        return self.__tree_advisories(members)
+
+    def __advisory(self, advisory_id, answer):
+        advisory = models.AdvisoryInfo.coerce(answer)
+        return advisory if advisory.id is not None else models.AdvisoryInfo(id=advisory_id)
+
+    def __advisory_fields(self, direct, transitive):
+        # Optional ComponentInsight fields of the fetched advisories
+        details = tuple(self.advisory_details[advisory_id] for advisory_id in direct)
+        scores = [advisory.cvss3_score for advisory in details if advisory.cvss3_score is not None]
+        fields = {"advisories": details, "max_cvss": max(scores) if scores else None}
+        if transitive is not None:
+            fields["transitive_advisories"] = tuple(self.advisory_details[advisory_id] for advisory_id in transitive)
+        return fields
+
+    def __get_advisories(self, direct, transitive=None):
+        """Advisory fields of one component, each advisory ID of the SBOM is
+        fetched once.
+        """
+        missing = [advisory_id for advisory_id in dict.fromkeys(direct + (transitive or ())) if advisory_id not in self.advisory_details]
+        if missing:
+            answers = self.osi.GetAdvisoryBatch(missing)
+            for advisory_id in missing:
+                self.advisory_details[advisory_id] = self.__advisory(advisory_id, answers.get(advisory_id))
+        return self.__advisory_fields(direct, transitive)
+
+    async def __async_get_advisories(self, direct, transitive=None):
+        advisory_ids = tuple(dict.fromkeys(direct + (transitive or ())))
+        for advisory_id in advisory_ids:
+            if advisory_id not in self.advisory_details:
+                self.advisory_details[advisory_id] = asyncio.ensure_future(self.__bounded(self.osi.async_GetAdvisory, advisory_id))
+        for advisory_id in advisory_ids:
+            advisory = self.advisory_details[advisory_id]
+            if isinstance(advisory, asyncio.Future):
+                self.advisory_details[advisory_id] = self.__advisory(advisory_id, await advisory)
+        return self.__advisory_fields(direct, transitive)
+
+    def __purls(self):
+        position = 0
+        for comp in self.components:
+            if comp.get('purl'):
+                position += 1
+                if position <= self.start:
+                    continue
+                with self.profiler.stage('parse_purl'):
+                    purl = packageurl.PackageURL.from_string(comp.get('purl'))
+                if purl.to_string() not in self.skip:
+                    yield purl
+
+    def __total(self):
+        # Unknown while the SBOM is still being streamed
+        if isinstance(self.components, list):
+            purls = [comp.get('purl') for comp in self.components if comp.get('purl')][self.start:]
+            return len([purl for purl in purls if packageurl.PackageURL.from_string(purl).to_string() not in self.skip])
+
+    def process(self, concurrency=None):
+        """Enrich every component with a purl. With `concurrency` set, components
+        are fetched with the async API, at most `concurrency` at a time.
+        """
+        self.all_pkgs_info.extend(self.iter_process(concurrency=concurrency))
+
+    def iter_process(self, concurrency=None, window=None, workers=None, shard_size=50):
+        """Yield the enriched components in SBOM order as soon as each one is
+        ready. With `concurrency` set the async API is used and at most `window`
+        components (default 4x `concurrency`) are held in flight.
+
+        With `workers` the components are sharded, `shard_size` at a time, over
+        that many processes (see `parallel.iter_sharded`), each fetching with
+        `concurrency`, and merged back in order.
+        """
+        if workers:
+            yield from self.__sharded(concurrency, workers, shard_size)
+            return
+        if concurrency:
+            yield from self.__drive(self.async_iter_process(concurrency, window))
+            return
+
+        self.projects = {}
+        with rich_progress.Progress(disable=not self.progress) as progress:
+            task = progress.add_task("[green bold]Processing...", total=self.__total())
+            for purl in self.__purls():
+                with self.profiler.stage('component', component=purl.to_string()):
+                    pkg_name = self.__get_pkg_name(purl)
+                    with self.profiler.stage('fetch'):
+                        pkg_info = self.osi.GetPackage(purl.type, pkg_name)
+                        pkg_version = models.VersionInfo.coerce(self.osi.GetVersion(purl.type, pkg_name, purl.version))
+                        pkg_deps = self.osi.GetDependencies(purl.type, pkg_name, purl.version)
+                    with self.profiler.stage('links'):
+                        repo_url = self.__get_repo_url(pkg_version)
+                    with self.profiler.stage('fetch_project'):
+                        project_data = self.__get_project(repo_url)
+                    members = self.__index_graph(purl, pkg_version, pkg_deps)
+                    optional = {}
+                    transitive = None
+                    if self.transitive:
+                        with self.profiler.stage('transitive'):
+                            transitive = self.__transitive_vulnerabilities(members)
+                            optional["transitive_vulnerabilities"] = len(transitive)
+                    if self.advisories:
+                        with self.profiler.stage('advisories'):
+                            optional.update(self.__get_advisories(pkg_version.advisories, transitive))
+                    with self.profiler.stage('build_model'):
+                        model = self.__build_model(purl, pkg_info, pkg_version, pkg_deps, project_data, **optional)
+
+                progress.update(task, advance=1, description=f"[green bold]Processing: [bold blue]{purl.to_string()}")
+                yield model
+
+    def __sharded(self, concurrency, workers, shard_size):
+        from open_source_insights_api.parallel import iter_sharded
+        options = {"transitive": self.transitive, "advisories": self.advisories}
+        components = ({"purl": purl.to_string()} for purl in self.__purls())
+        with rich_progress.Progress(disable=not self.progress) as progress:
+            task = progress.add_task("[green bold]Processing...", total=self.__total())
+            for model in iter_sharded(components, workers, self.osi_factory, options, concurrency, shard_size):
+                progress.update(task, advance=1, description=f"[green bold]Processing: [bold blue]{model.purl}")
+                yield model
+
+    def __drive(self, async_iterator):
+        # One event loop for the whole run, so the pooled AsyncClient is reused
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(async_iterator.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(async_iterator.aclose())
+            # The AsyncClient of this loop can only close its connections before the loop does
+            if hasattr(self.osi, 'aclose'):
+                loop.run_until_complete(self.osi.aclose())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    async def __async_process_purl(self, purl, semaphore, progress, task):
+        async with semaphore:
+            with self.profiler.stage('component', component=purl.to_string()):
+                pkg_name = self.__get_pkg_name(purl)
+                with self.profiler.stage('fetch'):
+                    pkg_info, pkg_version, pkg_deps = await asyncio.gather(
+                        self.osi.async_GetPackage(purl.type, pkg_name),
+                        self.osi.async_GetVersion(purl.type, pkg_name, purl.version),
+                        self.osi.async_GetDependencies(purl.type, pkg_name, purl.version)
+                    )
+                pkg_version = models.VersionInfo.coerce(pkg_version)
+                with self.profiler.stage('links'):
+                    repo_url = self.__get_repo_url(pkg_version)
+                with self.profiler.stage('fetch_project'):
+                    project_data = await self.__async_get_project(repo_url)
+                members = self.__index_graph(purl, pkg_version, pkg_deps)
+                optional = {}
+                transitive = None
+                if self.transitive:
+                    with self.profiler.stage('transitive'):
+                        transitive = await self.__async_transitive_vulnerabilities(members)
+                        optional["transitive_vulnerabilities"] = len(transitive)
+                if self.advisories:
+                    with self.profiler.stage('advisories'):
+                        optional.update(await self.__async_get_advisories(pkg_version.advisories, transitive))
+                with self.profiler.stage('build_model'):
+                    model = self.__build_model(purl, pkg_info, pkg_version, pkg_deps, project_data, **optional)
+
+            progress.update(task, advance=1, description=f"[green bold]Processing: [bold blue]{purl.to_string()}")
+            return model
+
+    async def async_iter_process(self, concurrency=10, window=None):
+        """Async version of `iter_process`, results keep the SBOM order."""
+        self.projects = {}
+        semaphore = asyncio.Semaphore(concurrency)
+        self.__fetches = asyncio.Semaphore(concurrency)
+        pending = deque()
+        with rich_progress.Progress(disable=not self.progress) as progress:
+            task = progress.add_task("[green bold]Processing...", total=self.__total())
+            try:
+                for purl in self.__purls():
+                    pending.append(asyncio.ensure_future(self.__async_process_purl(purl, semaphore, progress, task)))
+                    if len(pending) >= (window or concurrency * 4):
+                        yield await pending.popleft()
+                while pending:
+                    yield await pending.popleft()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    async def async_process(self, concurrency=10, window=None):
+        """Async version of `process`, results keep the SBOM order."""
+        async for model in self.async_iter_process(concurrency, window):
+            self.all_pkgs_info.append(model)
+
+def keep(results, store):
+    """Pass the streamed results through, keeping them in `store` for the export."""
+    for model in results:
+        store.append(model)
+        yield model
+
+
+def profile_table(profiler) -> Table:
+    """Time per pipeline stage, in total and per call."""
+    table = rich_table.Table(title="Pipeline Profile")
+    for column in ("Stage", "Calls", "Total s", "Mean ms", "Max ms", "% of wall"):
+        table.add_column(column)
+    wall = profiler.wall_time()
+    for stage, entry in profiler.summary().items():
+        table.add_row(
+            stage,
+            f"{entry['calls']}",
+            f"{entry['seconds']:.3f}",
+            f"{entry['mean'] * 1000:.2f}",
+            f"{entry['max'] * 1000:.2f}",
+            f"{entry['seconds'] / wall * 100:.1f}"
+        )
+    table.caption = f"Wall time: {wall:.3f}s, stages of concurrent components overlap"
+    return table
+
+def why_table(graph, package) -> Table:
+    """Components depending on `package` (name or name@version) and the shortest path to it."""
+    name, _, version = package.rpartition('@') if package.rfind('@') > 0 else (package, '', '')
+    table = rich_table.Table(title=f"Components pulling in {package}")
+    table.add_column(":package: Component")
+    table.add_column(":gear: Depth")
+    table.add_column(":right_arrow: Path")
+    for component, path in graph.dependents(name, version or None).items():
+        if path is None:
+            table.add_row(component, "-", "")
         else:
-            return 0
-
-    def process(self):
-        with Progress() as progress:
-            task = progress.add_task("[green bold]Processing...", total=len(self.sbom.get('components')))
-            # while not progress.finished:
-            for comp in self.sbom.get('components'):
-                if comp.get('purl'):
-                    model = {
-                        "pkg_name": None,
-                        "system": None,
-                        "recv_version": None,
-                        "latest": None,
-                        "publishedAt": None,
-                        "dep_dir": None,
-                        "dep_indir": None,
-                        "vulnerabilities": None,
-                        "openssf_score": None,
-                        "maintained": None,
-                        "license": None
-                    }
-                    purl = PackageURL.from_string(comp.get('purl'))
-                    if purl.namespace:
-                        pkg_name = f'{purl.namespace}/{purl.name}'
-                    else:
-                        pkg_name = f'{purl.name}'
-                    pkg_info = self.osi.GetPackage(purl.type, pkg_name)
-                    pkg_version = self.osi.GetVersion(purl.type, pkg_name, purl.version)
-                    pkg_deps = self.osi.GetDependencies(purl.type, pkg_name, purl.version)
-                    model['pkg_name'] = pkg_name
-                    model['system'] = purl.type
-                    model['recv_version'] = purl.version
-                    model['latest'] = self.__get_latest_version(pkg_info)
-                    model['publishedAt'] = self.__get_latest_version_date(pkg_info)
-                    model['dep_dir'] = self.__get_relation_direct(pkg_deps)
-                    model['dep_indir'] = self.__get_relation_indirect(pkg_deps)
-                    model['vulnerabilities'] = self.__get_vulnerabilities(pkg_version)
-                    model['openssf_score'] = self.__get_osscore(pkg_version)
-                    model['maintained'] = self.__get_score_maintained(pkg_version)
-                    model['license'] = self.__get_license(pkg_version)
-
-                    progress.update(task, advance=1, description=f"[green bold]Processing: [bold blue]{purl.to_string()}")
-                    self.all_pkgs_info.append(model)
+            table.add_row(component, f"{len(path) - 1}", " > ".join(f"{key[1]}@{key[2]}" for key in path))
+    return table
+
+def diff_table(diff) -> Table:
+    """Summary of a `diff.DifferentialScan` against the previous results."""
+    table = rich_table.Table(title="Changes since the previous scan")
+    table.add_column(":memo: Change")
+    table.add_column(":1234: Count")
+    table.add_column(":package: Components")
+    for change, title in (("added", "Added"), ("removed", "Removed")):
+        table.add_row(title, f"{len(diff[change])}", "\n".join(diff[change]))
+    for change, title in (("changed", "Version changed"), ("new_vulnerabilities", ":skull: New vulnerabilities"), ("latest_drift", ":up_arrow: Latest drift"), ("score_changes", ":light_bulb: Score changes")):
+        table.add_row(title, f"{len(diff[change])}", "\n".join(f"{item['purl']} ({item['from']} > {item['to']})" for item in diff[change]))
+    table.caption = f"{diff['carried_over']} carried over, {diff['enriched']} enriched"
+    return table
+
+def stats_table(stats) -> Table:
+    """Request statistics per endpoint, latencies in milliseconds."""
+    table = rich_table.Table(title="Request Statistics")
+    for column in ("Endpoint", "Requests", "Cache hits", "Retries", "Errors", "p50 ms", "p95 ms", "p99 ms", "Bytes", "Wait ms", "Decode ms"):
+        table.add_column(column)
+    milliseconds = lambda seconds: f"{seconds * 1000:.1f}" if seconds is not None else "-"
+    for endpoint, entry in stats.summary().items():
+        table.add_row(
+            endpoint,
+            f"{entry['requests']}",
+            f"{entry['cache_hits']}",
+            f"{entry['retries']}",
+            f"{entry['errors']}",
+            milliseconds(entry['p50']),
+            milliseconds(entry['p95']),
+            milliseconds(entry['p99']),
+            f"{entry['bytes']}",
+            milliseconds(entry['phases'].get('wait')),
+            milliseconds(entry['phases'].get('decode'))
+        )
+    table.caption = f"Total bytes: {stats.total_bytes()}"
+    return table
+
+def serve_args(argv):
+    parser = argparse.ArgumentParser(prog="sbom_insights serve", description="Local deps.dev insights daemon, shared by every client on the host.")
+    parser.add_argument("--host", type=str, default='127.0.0.1', help="Listen on this address. (Default is 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Listen on this TCP port. (Default is 8765)")
+    parser.add_argument("--socket", type=str, default=None, help="Listen on this Unix socket instead of TCP.")
+    parser.add_argument("--cache", type=str, const=True, nargs='?', default=None, help="Keep deps.dev responses in a persistent cache between runs. (Default path is ~/.cache/open_source_insights_api)")
+    parser.add_argument("--cache-backend", type=str, choices=['sqlite', 'files'], default='sqlite', help="Store the cache in one SQLite file or in a directory of gzip JSON files. (Default is sqlite)")
+    parser.add_argument("--offline", action="store_true", help="Only answer from the cache, NEED --cache to works!")
+    parser.add_argument("--api-url", type=str, default='https://api.deps.dev/v3alpha', help="Base URL of the deps.dev API, e.g. a local stand-in. (Default is https://api.deps.dev/v3alpha)")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Send at most N requests per second to deps.dev. (Default is unlimited)")
+    parser.add_argument("--retries", type=int, default=3, help="Retry failed, throttled (429) and 5xx requests N times with backoff. (Default is 3)")
+    return parser.parse_args(argv)
+
+
+def serve(ARGS):
+    """Run the `service.InsightsService` daemon until interrupted."""
+    from open_source_insights_api.cache import open_cache
+    from open_source_insights_api.instrumentation import Stats
+    from open_source_insights_api.os_insights import query
+    from open_source_insights_api.service import InsightsService
+    from open_source_insights_api.throttle import RetryPolicy
+
+    response_cache = open_cache(None if ARGS.cache is True else ARGS.cache, backend=ARGS.cache_backend) if ARGS.cache else None
+    stats = Stats()
+    service = InsightsService(query(base_url=ARGS.api_url, cache=response_cache, offline=ARGS.offline, rate_limit=ARGS.rate_limit, retry=RetryPolicy(max_retries=ARGS.retries), hooks=[stats]), stats=stats)
+
+    async def main():
+        address = await service.start(ARGS.host, ARGS.port, ARGS.socket)
+        print(f'Serving deps.dev insights on {address}', flush=True)
+        try:
+            await service.serve_forever()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if response_cache is not None:
+            response_cache.close()
+
+
 def cli():
+    if sys.argv[1:2] == ['serve']:
+        serve(serve_args(sys.argv[2:]))
+        return
     ARGS = args()
-    console = Console()
     if ARGS.version:
-        console.print(f'Current version: {__version__}')
+        print(f'Current version: {__version__}')
         exit(0)
+    console = rich.get_console()
         
     if ARGS.file:
-        file_path = ARGS.file
-        with open(file_path, 'r') as file:
-            sbom = json.loads(file.read())
+        from open_source_insights_api.os_insights import query
+        from open_source_insights_api.cache import open_cache
+        from open_source_insights_api.throttle import RetryPolicy
+        from open_source_insights_api.instrumentation import Stats
+        from open_source_insights_api.graph import SBOMGraph
+        response_cache = None
+        if ARGS.cache and not ARGS.server:
+            cache_path = None if ARGS.cache is True else ARGS.cache
+            response_cache = open_cache(cache_path, backend=ARGS.cache_backend)
+        stats = Stats()
+        if ARGS.server:
+            from open_source_insights_api.service import RemoteQuery
+            osi = RemoteQuery(ARGS.server, models=True)
+        else:
+            osi = query(models=True, base_url=ARGS.api_url, cache=response_cache, offline=ARGS.offline, rate_limit=ARGS.rate_limit, retry=RetryPolicy(max_retries=ARGS.retries), hooks=[stats] if ARGS.stats or ARGS.metrics else None)
+        osi_factory = None
+        if ARGS.workers and ARGS.server:
+            osi_factory = functools.partial(RemoteQuery, ARGS.server, models=True)
+        elif ARGS.workers:
+            from open_source_insights_api.parallel import worker_query
+            # Each worker gets its share of the rate limit and its own cache connection
+            osi_factory = functools.partial(
+                worker_query, cache=ARGS.cache, cache_backend=ARGS.cache_backend, base_url=ARGS.api_url, offline=ARGS.offline,
+                rate_limit=ARGS.rate_limit / ARGS.workers if ARGS.rate_limit else None, retry=RetryPolicy(max_retries=ARGS.retries)
+            )
+
+        scan = None
+        skip = set()
+        if ARGS.previous:
+            # Read before --output, which may be the same file, is rewritten
+            from open_source_insights_api.diff import DifferentialScan
+            scan = DifferentialScan.from_file(ARGS.previous, max_age=ARGS.max_age * 3600)
+            skip = scan.carried
 
-        sbom_process = Sbom_Process_CLI(sbom_json=sbom)
-        sbom_process.process()
+        start = 0
+        if ARGS.output_format == 'ndjson' and not ARGS.bulk:
+            writer = NDJSONWriter(ARGS.output, resume=ARGS.resume)
+            start = writer.done
 
-        if ARGS.json:
-            console.print(json.dumps(sbom_process.all_pkgs_info, indent=4))
-            with open(ARGS.output, 'w') as file:
-                file.write(json.dumps(sbom_process.all_pkgs_info, indent=4))
+        profiler = StageProfiler() if ARGS.profile else NullProfiler()
+        graph = SBOMGraph() if ARGS.why or ARGS.transitive else None
+        c_profile = None
+        if isinstance(ARGS.profile, str):
+            import cProfile
+            c_profile = cProfile.Profile()
+            c_profile.enable()
+
+        if ARGS.bulk:
+            from open_source_insights_api.bulk import BulkInventory, sbom_files
+            inventory = BulkInventory()
+            identifier = None
+            if ARGS.identify_hashes:
+                from open_source_insights_api.identify import HashIdentifier
+                identifier = HashIdentifier(osi)
+            with profiler.stage('read_sbom'):
+                for path in sbom_files(ARGS.bulk):
+                    inventory.add_file(path, identifier=identifier)
+            sbom_process = Sbom_Process_CLI(components=inventory.components(), osi=osi, profiler=profiler, graph=graph, transitive=ARGS.transitive, advisories=ARGS.advisories, osi_factory=osi_factory)
+            results = {model.purl: model for model in sbom_process.iter_process(concurrency=ARGS.concurrency, window=ARGS.window, workers=ARGS.workers)}
+            with profiler.stage('reports'):
+                inventory.write(results, ARGS.output_dir)
+            bulk_stats = inventory.stats()
+            console.print(f"{bulk_stats['sboms']} SBOMs, {bulk_stats['components']} components, {bulk_stats['unique_purls']} unique purls enriched, reports in {ARGS.output_dir}")
         else:
-            console.print(sbom_process.generate_table())
+            with open(ARGS.file, 'r') as file:
+                if ARGS.stream:
+                    sbom_process = Sbom_Process_CLI(components=iter_components(file), osi=osi, skip=skip, start=start, profiler=profiler, graph=graph, transitive=ARGS.transitive, advisories=ARGS.advisories, osi_factory=osi_factory, identify_hashes=ARGS.identify_hashes)
+                else:
+                    with profiler.stage('read_sbom'):
+                        sbom = json.loads(file.read())
+                    sbom_process = Sbom_Process_CLI(sbom_json=sbom, osi=osi, skip=skip, start=start, profiler=profiler, graph=graph, transitive=ARGS.transitive, advisories=ARGS.advisories, osi_factory=osi_factory, identify_hashes=ARGS.identify_hashes)
+                if scan is not None:
+                    sbom_process.components = scan.track(sbom_process.components, start)
+                results = sbom_process.iter_process(concurrency=ARGS.concurrency, window=ARGS.window, workers=ARGS.workers)
+                if scan is not None:
+                    results = scan.merge(results)
+                streamed = ARGS.output_format == 'ndjson' or ARGS.json
+                export_format = ARGS.export or ('none' if streamed else 'xlsx')
+                if streamed and export_format != 'none':
+                    results = keep(results, sbom_process.all_pkgs_info)
+
+                if ARGS.output_format == 'ndjson':
+                    with writer:
+                        for model in results:
+                            writer.write(model)
+                elif ARGS.json:
+                    write_json(results, console, ARGS.output)
+                else:
+                    sbom_process.all_pkgs_info.extend(results)
+                    table = sbom_process.generate_table()
+                    with profiler.stage('render'):
+                        console.print(table)
+                if export_format != 'none':
+                    sbom_process.export(ARGS.export_file or f'output.{export_format}', export_format)
+
+        if scan is not None:
+            diff = scan.summary()
+            console.print(diff_table(diff))
+            if ARGS.diff_file:
+                with open(ARGS.diff_file, 'w') as file:
+                    file.write(json.dumps(diff, indent=4))
+        if ARGS.identify_hashes:
+            identifier = identifier if ARGS.bulk else sbom_process.identifier
+            console.print(f"Identified by hash: {identifier.identified} components, unknown to deps.dev: {identifier.unknown}")
+        if ARGS.why:
+            console.print(why_table(graph, ARGS.why))
+        if c_profile is not None:
+            c_profile.disable()
+            c_profile.dump_stats(f'{ARGS.profile}.pstats')
+        if profiler.enabled:
+            console.print(profile_table(profiler))
+            if isinstance(ARGS.profile, str):
+                profiler.write_collapsed(f'{ARGS.profile}.collapsed')
+                profiler.write_json(f'{ARGS.profile}.json')
+
+        if response_cache is not None:
+            response_cache.close()
+        if ARGS.stats:
+            console.print(stats_table(stats))
+        if ARGS.metrics:
+            with open(ARGS.metrics, 'w') as file:
+                file.write(stats.to_prometheus())
     else:
         print('Please --help')
 
 if __name__ == "__main__":
-    cli()
\ No newline at end of file
+    cli()
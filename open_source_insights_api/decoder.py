@@ -0,0 +1,63 @@
+import json
+
+# Optional fast backends, `pip install orjson` or `pip install msgspec`
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+    import msgspec.json
+except ImportError:
+    msgspec = None
+
+# One msgspec decoder per schema, built on first use
+_DECODERS = {}
+
+BACKEND = 'orjson' if orjson is not None else 'msgspec' if msgspec is not None else 'json'
+
+# Everything raised on a malformed document, whichever backend decoded it
+DECODE_ERRORS = (ValueError, TypeError) + ((msgspec.MsgspecError,) if msgspec is not None else ())
+
+
+def loads(data):
+    """Decode a JSON document (bytes or str) with the fastest backend installed,
+    orjson, then msgspec, then the standard library.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+def dumps(value):
+    """Encode `value` as compact JSON bytes with the fastest backend installed."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    if msgspec is not None:
+        return msgspec.json.encode(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def decode(data, model=None):
+    """Decode a JSON document, into an instance of `model` (one of
+    `models.PackageInfo`, `VersionInfo`, `DependencyGraph`, `ProjectInfo`)
+    when given.
+
+    With msgspec installed the document is decoded straight into the
+    `model.schema` Struct, which only declares the fields the model keeps, so
+    the rest of the payload is skipped instead of being built as dicts.
+    """
+    if model is None:
+        return loads(data)
+    if msgspec is not None and model.schema is not None:
+        struct_decoder = _DECODERS.get(model.schema)
+        if struct_decoder is None:
+            struct_decoder = _DECODERS[model.schema] = msgspec.json.Decoder(model.schema)
+        try:
+            return model.from_struct(struct_decoder.decode(data))
+        except msgspec.ValidationError:
+            # Field of an unexpected type, the generic path is more lenient
+            pass
+    return model.from_dict(loads(data))
@@ -0,0 +1,169 @@
+import json
+import os
+from collections import deque
+from datetime import datetime, timezone
+from open_source_insights_api.export import as_record
+from open_source_insights_api.models import ComponentInsight
+from packageurl import PackageURL
+
+# Fields of the records compared by `DifferentialScan.summary`
+COMPARED = ('recv_version', 'vulnerabilities', 'latest', 'openssf_score')
+
+
+def load_results(path):
+    """Records of a previous scan, a JSON array or NDJSON file (a line cut by
+    an interrupted run is ignored).
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        text = file.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    records = []
+    for line in text.splitlines():
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def package_key(purl):
+    """The purl without its version, pairing two versions of one package."""
+    parsed = PackageURL.from_string(purl)
+    return (parsed.type, parsed.namespace, parsed.name)
+
+
+class DifferentialScan:
+    """Incremental re-scan against the results of a previous run.
+
+    Components whose purl was already scanned less than `max_age` seconds ago
+    (per record `scanned_at`, else the `scanned` time of the previous file)
+    are carried over, only added components and expired ones are enriched
+    again. `track` marks them in `carried` as the SBOM is read, `merge` puts
+    the carried records back among the enriched ones in SBOM order and
+    `summary` compares the new results with the previous ones.
+    """
+    def __init__(self, previous, max_age=24 * 3600, scanned=None) -> None:
+        self.previous = {}
+        for record in previous:
+            if record.get('purl'):
+                self.previous[PackageURL.from_string(record['purl']).to_string()] = record
+        self.packages = {package_key(purl): purl for purl in self.previous}
+        self.max_age = max_age
+        self.scanned = scanned or now()
+        self.carried = set()
+        self.current = set()
+        self.pending = deque()
+        self.enriched = {}
+        self.counts = {"carried_over": 0, "enriched": 0}
+
+    @classmethod
+    def from_file(cls, path, max_age=24 * 3600):
+        """Previous results of `path`, records without `scanned_at` date from
+        the last change of the file.
+        """
+        scanned = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc).isoformat(timespec='seconds')
+        return cls(load_results(path), max_age=max_age, scanned=scanned)
+
+    def __fresh(self, record):
+        scanned_at = datetime.fromisoformat(record.get('scanned_at') or self.scanned)
+        return (datetime.now(timezone.utc) - scanned_at).total_seconds() < self.max_age
+
+    def track(self, components, start=0):
+        """`components` passed through, adding the purls to carry over to
+        `carried` (the `skip` of `Sbom_Process_CLI`) as they are read. The
+        first `start` components with a purl, already written by a resumed
+        scan, are left out of `merge`. A list gives a list, any other
+        iterable stays streamed.
+        """
+        if isinstance(components, list):
+            return list(self.__track(components, start))
+        return self.__track(components, start)
+
+    def __track(self, components, start):
+        position = 0
+        for comp in components:
+            if comp.get('purl'):
+                purl = PackageURL.from_string(comp['purl']).to_string()
+                self.current.add(purl)
+                position += 1
+                if position > start:
+                    carried = purl in self.previous and self.__fresh(self.previous[purl])
+                    if carried:
+                        self.carried.add(purl)
+                    self.pending.append((purl, carried))
+            yield comp
+
+    def merge(self, models):
+        """Results in SBOM order: the enriched `models` (stamped with
+        `scanned_at`) and the carried over records between them. Only the
+        models arriving before their turn are held.
+        """
+        scanned_at = now()
+        early = {}
+        for model in models:
+            model.scanned_at = scanned_at
+            early.setdefault(model.purl, deque()).append(model)
+            yield from self.__ready(early)
+        yield from self.__ready(early, final=True)
+
+    def __ready(self, early, final=False):
+        while self.pending:
+            purl, carried = self.pending[0]
+            if carried:
+                result = ComponentInsight.from_dict(self.previous[purl])
+                result.scanned_at = result.scanned_at or self.scanned
+            elif early.get(purl):
+                result = early[purl].popleft()
+            elif not final:
+                return
+            else:
+                # Never enriched, e.g. an invalid purl
+                self.pending.popleft()
+                continue
+            self.pending.popleft()
+            self.__count(result, carried)
+            yield result
+
+    def __count(self, result, carried):
+        if carried:
+            self.counts["carried_over"] += 1
+            return
+        self.counts["enriched"] += 1
+        record = as_record(result)
+        # Only the compared fields are kept until `summary`
+        self.enriched.setdefault(record['purl'], {name: record.get(name) for name in COMPARED})
+
+    def summary(self):
+        """Changes against the previous run, over the merged results: added,
+        removed and upgraded packages, new vulnerabilities, drift of the latest
+        version and OpenSSF score changes.
+        """
+        current_packages = {package_key(purl) for purl in self.current}
+        summary = dict(self.counts, added=[], removed=[], changed=[], new_vulnerabilities=[], latest_drift=[], score_changes=[])
+        for purl in sorted(set(self.previous) - self.current):
+            if package_key(purl) not in current_packages:
+                summary["removed"].append(purl)
+
+        for purl, record in self.enriched.items():
+            before = self.previous.get(purl)
+            if before is None:
+                previous_purl = self.packages.get(package_key(purl))
+                before = self.previous.get(previous_purl) if previous_purl not in self.current else None
+                if before is None:
+                    summary["added"].append(purl)
+                else:
+                    summary["changed"].append({"purl": purl, "from": before.get('recv_version'), "to": record.get('recv_version')})
+            if (record.get('vulnerabilities') or 0) > ((before or {}).get('vulnerabilities') or 0):
+                summary["new_vulnerabilities"].append({"purl": purl, "from": (before or {}).get('vulnerabilities'), "to": record.get('vulnerabilities')})
+            if before is None:
+                continue
+            if before.get('latest') != record.get('latest'):
+                summary["latest_drift"].append({"purl": purl, "from": before.get('latest'), "to": record.get('latest')})
+            if before.get('openssf_score') != record.get('openssf_score'):
+                summary["score_changes"].append({"purl": purl, "from": before.get('openssf_score'), "to": record.get('openssf_score')})
+        return summary
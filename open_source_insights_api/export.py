@@ -0,0 +1,166 @@
+import importlib.util
+import json
+import os
+import textwrap
+import time
+
+
+def as_record(model):
+    """JSON ready form of a scan result, `models.ComponentInsight` or dict."""
+    return model.to_dict() if hasattr(model, 'to_dict') else model
+
+
+def write_json(models, console, output):
+    """Write the models to `output` and the console as a JSON array while they
+    arrive, with the same text as `json.dumps(models, indent=4)`.
+    """
+    with open(output, 'w') as file:
+        previous = None
+        for model in models:
+            if previous is None:
+                file.write('[\n')
+                console.print('[')
+            else:
+                file.write(f'{previous},\n')
+                console.print(f'{previous},')
+            previous = textwrap.indent(json.dumps(as_record(model), indent=4), '    ')
+        if previous is None:
+            file.write('[]')
+            console.print('[]')
+        else:
+            file.write(f'{previous}\n]')
+            console.print(previous)
+            console.print(']')
+
+
+class NDJSONWriter:
+    """Append scan results to a JSON Lines file, one component per line.
+
+    Lines are flushed every `flush_every` records or `flush_interval` seconds,
+    so consumers can tail the file while the scan runs. With `resume=True` the
+    records already in the file are kept and counted in `done`, the number of
+    leading components to leave out (records follow the SBOM order, so an SBOM
+    listing a purl twice resumes like a fresh run). A line cut by an
+    interrupted run is dropped.
+    """
+    def __init__(self, path, resume=False, flush_every=100, flush_interval=1.0) -> None:
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.done = 0
+        self.count = 0
+        if resume and os.path.exists(path):
+            self.__load()
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        self.flushed_at = time.monotonic()
+
+    def __load(self):
+        valid_size = 0
+        with open(self.path, 'rb') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                valid_size += len(line)
+                if record.get('purl'):
+                    self.done += 1
+        if valid_size != os.path.getsize(self.path):
+            os.truncate(self.path, valid_size)
+
+    def write(self, record):
+        self.file.write(json.dumps(as_record(record)) + '\n')
+        self.count += 1
+        if self.count % self.flush_every == 0 or time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.file.flush()
+            self.flushed_at = time.monotonic()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Report formats of `export_report`, also their file extension
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+# Optional dependency of each writer, with the extra installing it
+EXPORT_EXTRAS = {'parquet': ('pyarrow', 'parquet')}
+
+
+def missing_extra(format):
+    """Extra and module of `format` when its optional dependency is not
+    installed, None when the writer can run. Checked without importing it.
+    """
+    extra = EXPORT_EXTRAS.get(format)
+    if extra is not None and importlib.util.find_spec(extra[0]) is None:
+        return extra
+    return None
+
+
+def columns(models):
+    """Column name to list of values of the scan results, built in one pass
+    without an intermediate DataFrame. Optional fields missing from a record
+    are None, nested values (advisories) are kept as lists of dicts.
+    """
+    table = {}
+    for row, model in enumerate(models):
+        record = as_record(model)
+        for key in record:
+            if key not in table:
+                table[key] = [None] * row
+        for key, values in table.items():
+            values.append(record.get(key))
+    return table
+
+
+def _cell(value):
+    # Spreadsheet and CSV cells hold scalars, nested values are written as JSON
+    return json.dumps(value) if isinstance(value, (list, dict)) else value
+
+
+def write_csv(table, path):
+    import csv
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(table.keys())
+        writer.writerows(zip(*(map(_cell, values) for values in table.values())))
+
+
+def write_xlsx(table, path, sheet_name="SBOM_INSIGHTS"):
+    """Stream the rows with openpyxl's write-only workbook, which does not
+    keep a cell object per value in memory.
+    """
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(list(table.keys()))
+    for row in zip(*table.values()):
+        sheet.append([_cell(value) for value in row])
+    workbook.save(path)
+
+
+def write_parquet(table, path):
+    """Write the columns as a Parquet file, needs `pip install pyarrow`."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow, `pip install pyarrow`") from None
+    pyarrow.parquet.write_table(pyarrow.table(table), path)
+
+
+def export_report(models, path, format='xlsx'):
+    """Write the scan results to `path` as one of `EXPORT_FORMATS`. Writers are
+    imported on first use, so only the chosen one is loaded.
+    """
+    writers = {'xlsx': write_xlsx, 'csv': write_csv, 'parquet': write_parquet}
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Export format not supported: {format}")
+    writers[format](columns(models), path)
+    return path
@@ -0,0 +1,345 @@
+from array import array
+from bisect import bisect_left
+from collections import deque
+from itertools import accumulate
+from open_source_insights_api.models import DependencyGraph
+
+
+class KeyTable:
+    """Interned (system, name, version) keys, each with an integer ID."""
+    def __init__(self) -> None:
+        self.keys = []
+        self.ids = {}
+        self.names = {}
+
+    def intern(self, key):
+        key_id = self.ids.get(key)
+        if key_id is None:
+            key_id = self.ids[key] = len(self.keys)
+            self.keys.append(key)
+            self.names.setdefault(key[1], []).append(key_id)
+        return key_id
+
+    def get(self, key):
+        return self.ids.get(key)
+
+    def find(self, name, version=None, system=None):
+        """IDs of the keys of package `name`, optionally of one version and system."""
+        return [
+            key_id for key_id in self.names.get(name, ())
+            if (version is None or self.keys[key_id][2] == version)
+            and (system is None or (self.keys[key_id][0] or '').upper() == system.upper())
+        ]
+
+    def __getitem__(self, key_id):
+        return self.keys[key_id]
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def _csr(pairs, size):
+    """Offsets and targets arrays of (source, target) pairs over `size` nodes."""
+    pairs.sort()
+    counts = [0] * (size + 1)
+    for source, _ in pairs:
+        counts[source + 1] += 1
+    return array('i', accumulate(counts)), array('i', [target for _, target in pairs])
+
+
+class Graph:
+    """Index of one `GetDependencies` answer.
+
+    Nodes are numbered as in the answer (the root, relation SELF, is usually 0)
+    and `nodes[i]` is the ID of their key in `keys`. Edges are kept in CSR
+    form: the children of node i are `targets[offsets[i]:offsets[i + 1]]`,
+    and the parents the same way in `parent_offsets` and `sources`.
+    """
+    __slots__ = ('keys', 'nodes', 'offsets', 'targets', 'parent_offsets', 'sources', 'root', '_local', '_depths')
+
+    def __init__(self, graph, keys=None) -> None:
+        graph = DependencyGraph.coerce(graph)
+        self.keys = keys if keys is not None else KeyTable()
+        self.nodes = array('i', (self.keys.intern(node[:3]) for node in graph.nodes))
+        self.root = next((i for i, node in enumerate(graph.nodes) if node[3] == 'SELF'), 0)
+
+        size = len(self.nodes)
+        edges = [(from_node, to_node) for from_node, to_node, _ in graph.edges if 0 <= from_node < size and 0 <= to_node < size]
+        self.offsets, self.targets = _csr(edges, size)
+        self.parent_offsets, self.sources = _csr([(to_node, from_node) for from_node, to_node in edges], size)
+        self._local = None
+        self._depths = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, key):
+        return self.local(key) is not None
+
+    def key(self, node):
+        return self.keys[self.nodes[node]]
+
+    def local(self, key):
+        """Node number of `key` in this graph, None when absent."""
+        key_id = self.keys.get(tuple(key))
+        return self.local_id(key_id) if key_id is not None else None
+
+    def local_id(self, key_id):
+        if self._local is None:
+            self._local = {}
+            for node, node_key_id in enumerate(self.nodes):
+                self._local.setdefault(node_key_id, node)
+        return self._local.get(key_id)
+
+    def children(self, node):
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def parents(self, node):
+        return self.sources[self.parent_offsets[node]:self.parent_offsets[node + 1]]
+
+    def depths(self):
+        """Breadth first depth of every node from the root, -1 when unreachable."""
+        if self._depths is None:
+            depths = array('i', [-1]) * len(self.nodes)
+            if self.nodes:
+                depths[self.root] = 0
+                queue = deque((self.root,))
+                while queue:
+                    node = queue.popleft()
+                    for child in self.children(node):
+                        if depths[child] < 0:
+                            depths[child] = depths[node] + 1
+                            queue.append(child)
+            self._depths = depths
+        return self._depths
+
+    def depth_histogram(self):
+        """Number of nodes at each depth below the root."""
+        histogram = {}
+        for depth in self.depths():
+            if depth > 0:
+                histogram[depth] = histogram.get(depth, 0) + 1
+        return dict(sorted(histogram.items()))
+
+    def closure(self, key=None):
+        """Keys reachable from `key` (the root by default), itself excluded."""
+        start = self.root if key is None else self.local(key)
+        if start is None:
+            return set()
+        seen = {start}
+        stack = [start]
+        while stack:
+            for child in self.children(stack.pop()):
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+        seen.discard(start)
+        return {self.key(node) for node in seen}
+
+    def shortest_path(self, targets):
+        """Keys from the root to the nearest node whose key is in `targets`
+        (keys, or a predicate on keys), None when no such node is reachable.
+        """
+        if callable(targets):
+            target_ids = {key_id for key_id, key in enumerate(self.keys.keys) if targets(key)}
+        else:
+            target_ids = {self.keys.get(tuple(key)) for key in targets} - {None}
+        return self.path_to_ids(target_ids)
+
+    def path_to_ids(self, target_ids):
+        """`shortest_path` to the nearest node whose key ID is in `target_ids`."""
+        if not self.nodes or not target_ids:
+            return None
+        # Breadth first from the targets up the parents, which only visits
+        # their ancestors, until the root is reached
+        following = array('i', [-2]) * len(self.nodes)
+        queue = deque()
+        for key_id in target_ids:
+            node = self.local_id(key_id)
+            if node is not None and node != self.root:
+                following[node] = -1
+                queue.append(node)
+        while queue:
+            node = queue.popleft()
+            for parent in self.parents(node):
+                if following[parent] == -2:
+                    following[parent] = node
+                    if parent == self.root:
+                        path = [parent]
+                        while following[path[-1]] != -1:
+                            path.append(following[path[-1]])
+                        return [self.key(step) for step in path]
+                    queue.append(parent)
+        return None
+
+
+class SBOMGraph:
+    """Merged dependency graph of every component of an SBOM.
+
+    Version keys are interned in one `KeyTable` and each unique edge is kept
+    once, so heavily overlapping trees (npm, Maven) cost about their number of
+    unique nodes. Each component keeps its root and the sorted key IDs of its
+    tree. Answers SBOM wide questions without fetching anything again: fan-in
+    of each package and which components pull in a package, with the
+    shortest path. Paths follow the merged edges inside the component tree.
+    """
+    def __init__(self) -> None:
+        self.keys = KeyTable()
+        self.components = []
+        self.roots = array('i')
+        self.members = []
+        self.edges = set()
+        self.__containing = None
+        self.__csr = None
+
+    def add(self, component, graph):
+        """Merge the `GetDependencies` answer of `component` (e.g. its purl),
+        returning the key IDs of its tree, root excluded.
+        """
+        graph = DependencyGraph.coerce(graph)
+        ids = [self.keys.intern(node[:3]) for node in graph.nodes]
+        size = len(ids)
+        edge_count = len(self.edges)
+        for from_node, to_node, _ in graph.edges:
+            if 0 <= from_node < size and 0 <= to_node < size:
+                self.edges.add(ids[from_node] << 32 | ids[to_node])
+        root = next((i for i, node in enumerate(graph.nodes) if node[3] == 'SELF'), 0)
+        root_id = ids[root] if ids else -1
+        members = array('i', sorted(set(ids) - {root_id}))
+
+        self.components.append(component)
+        self.roots.append(root_id)
+        self.members.append(members)
+        self.__containing = None
+        if len(self.edges) != edge_count:
+            self.__csr = None
+        return members
+
+    def __len__(self):
+        return len(self.components)
+
+    def stats(self):
+        """Sizes of the merged store against the sum of the component graphs."""
+        return {
+            "components": len(self.components),
+            "nodes": sum(len(members) + 1 for members in self.members),
+            "unique_nodes": len(self.keys),
+            "unique_edges": len(self.edges)
+        }
+
+    def __graph(self):
+        # Children and parents of every key ID, rebuilt after new edges
+        if self.__csr is None:
+            edges = [(edge >> 32, edge & 0xFFFFFFFF) for edge in self.edges]
+            size = len(self.keys)
+            self.__csr = _csr(edges, size) + _csr([(to_id, from_id) for from_id, to_id in edges], size)
+        return self.__csr
+
+    def closure(self, component):
+        """Keys of the resolved tree of `component`, itself excluded."""
+        return {self.keys[key_id] for key_id in self.members[self.components.index(component)]}
+
+    def __index(self):
+        # Components containing each key ID, built on the first query after a change
+        if self.__containing is None:
+            containing = [None] * len(self.keys)
+            for position, members in enumerate(self.members):
+                for key_id in members:
+                    if containing[key_id] is None:
+                        containing[key_id] = array('i')
+                    containing[key_id].append(position)
+            self.__containing = containing
+        return self.__containing
+
+    def fan_in(self, top=None):
+        """(key, number of components depending on it) pairs, highest first."""
+        counts = [(self.keys[key_id], len(positions)) for key_id, positions in enumerate(self.__index()) if positions]
+        counts.sort(key=lambda item: item[1], reverse=True)
+        return counts[:top] if top is not None else counts
+
+    def dependents(self, name, version=None, system=None, paths=True):
+        """Components whose resolved tree contains package `name` (any version
+        unless `version` is given), mapped to the shortest path to it, or to
+        None with `paths=False`.
+        """
+        containing = self.__index()
+        key_ids = [key_id for key_id in self.keys.find(name, version, system) if key_id < len(containing)]
+        positions = sorted({position for key_id in key_ids for position in containing[key_id] or ()})
+        if not paths:
+            return {self.components[position]: None for position in positions}
+        toward = self.__toward(key_ids)
+        return {self.components[position]: self.__follow(position, toward) or self.path(position, key_ids) for position in positions}
+
+    def __toward(self, target_ids):
+        # One breadth first walk up the parents from the targets, for every key
+        # the next step of a shortest path down to a target
+        _, _, parent_offsets, sources = self.__graph()
+        toward = dict.fromkeys(target_ids)
+        queue = deque(target_ids)
+        while queue:
+            key_id = queue.popleft()
+            for parent in sources[parent_offsets[key_id]:parent_offsets[key_id + 1]]:
+                if parent not in toward:
+                    toward[parent] = key_id
+                    queue.append(parent)
+        return toward
+
+    def __follow(self, position, toward):
+        # The merged shortest path from the root, if it stays inside the tree
+        members, key_id = self.members[position], self.roots[position]
+        if toward.get(key_id) is None:
+            return None
+        path = [key_id]
+        while toward[key_id] is not None:
+            key_id = toward[key_id]
+            if not _contains(members, key_id):
+                return None
+            path.append(key_id)
+        return [self.keys[step] for step in path]
+
+    def path(self, position, target_ids):
+        """Shortest path, as keys, from the root of the component at `position`
+        to the nearest of `target_ids` in its tree, None when not connected.
+        """
+        offsets, targets, _, _ = self.__graph()
+        members, root = set(self.members[position]), self.roots[position]
+        target_ids = set(target_ids) & members
+        parents = {root: None}
+        queue = deque((root,))
+        while queue and target_ids:
+            key_id = queue.popleft()
+            if key_id in target_ids:
+                path = [key_id]
+                while parents[path[-1]] is not None:
+                    path.append(parents[path[-1]])
+                return [self.keys[step] for step in reversed(path)]
+            for child in targets[offsets[key_id]:offsets[key_id + 1]]:
+                if child not in parents and child in members:
+                    parents[child] = key_id
+                    queue.append(child)
+        return None
+
+    def depth_histogram(self):
+        """Number of nodes at each depth below their component root, summed
+        over every component.
+        """
+        offsets, targets, _, _ = self.__graph()
+        histogram = {}
+        for members, root in zip(self.members, self.roots):
+            members = set(members)
+            depths = {root: 0}
+            queue = deque((root,))
+            while queue:
+                key_id = queue.popleft()
+                depth = depths[key_id] + 1
+                for child in targets[offsets[key_id]:offsets[key_id + 1]]:
+                    if child not in depths and child in members:
+                        depths[child] = depth
+                        histogram[depth] = histogram.get(depth, 0) + 1
+                        queue.append(child)
+        return dict(sorted(histogram.items()))
+
+
+def _contains(sorted_ids, key_id):
+    position = bisect_left(sorted_ids, key_id)
+    return position < len(sorted_ids) and sorted_ids[position] == key_id
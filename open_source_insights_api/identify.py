@@ -0,0 +1,142 @@
+import base64
+import binascii
+from itertools import islice
+from packageurl import PackageURL
+
+# Hash types of the deps.dev query endpoint, in the order they are tried
+HASH_TYPES = ('SHA1', 'SHA256', 'SHA512', 'MD5')
+
+# purl type of each deps.dev system
+PURL_TYPES = {"NPM": "npm", "PYPI": "pypi", "MAVEN": "maven", "GO": "golang", "CARGO": "cargo", "NUGET": "nuget"}
+
+
+def hash_value(content):
+    """Base64 form of a hash, as deps.dev expects it, from the hex digest of
+    CycloneDX/SPDX (base64 values are kept). None when it is neither or empty.
+    """
+    content = (content or '').strip()
+    if not content:
+        return None
+    try:
+        return base64.b64encode(bytes.fromhex(content)).decode('ascii')
+    except ValueError:
+        pass
+    try:
+        base64.b64decode(content, validate=True)
+        return content
+    except (binascii.Error, ValueError):
+        return None
+
+
+def component_hashes(component):
+    """(type, base64 value) pairs of the supported hashes of a component, in
+    `HASH_TYPES` order.
+    """
+    hashes = {}
+    for item in component.get('hashes') or []:
+        hash_type = (item.get('alg') or '').upper().replace('-', '')
+        value = hash_value(item.get('content'))
+        if hash_type in HASH_TYPES and value is not None:
+            hashes.setdefault(hash_type, value)
+    return [(hash_type, hashes[hash_type]) for hash_type in HASH_TYPES if hash_type in hashes]
+
+
+def version_purl(system, name, version):
+    """purl of a deps.dev version key."""
+    purl_type = PURL_TYPES.get((system or '').upper(), (system or '').lower())
+    namespace = None
+    if purl_type == 'maven' and ':' in name:
+        namespace, name = name.split(':', 1)
+    elif '/' in name:
+        namespace, name = name.rsplit('/', 1)
+    return PackageURL(type=purl_type, namespace=namespace, name=name, version=version).to_string()
+
+
+def best_candidate(answer, component=None):
+    """Version key (system, name, version) of the best result of a hash
+    search, None without results.
+
+    A hash often matches several versions (the same artifact republished or
+    vendored). Results named like the component are preferred, then those of
+    its version, then default versions; ties keep the deps.dev order.
+    """
+    if not isinstance(answer, dict):
+        return None
+    name = ((component or {}).get('name') or '').lower()
+    group = ((component or {}).get('group') or '').lower()
+    version = (component or {}).get('version')
+    best, best_score = None, None
+    for result in answer.get('results') or []:
+        found = result.get('version') or {}
+        key = found.get('versionKey') or {}
+        if not key.get('name') or not key.get('version'):
+            continue
+        found_name = key['name'].lower()
+        short_name = found_name.replace(':', '/').rsplit('/', 1)[-1]
+        score = (
+            bool(name) and (found_name == name or short_name == name or (bool(group) and found_name == f'{group}:{name}')),
+            bool(version) and key['version'] == version,
+            bool(found.get('isDefault'))
+        )
+        if best_score is None or score > best_score:
+            best, best_score = (key.get('system'), key['name'], key['version']), score
+    return best
+
+
+class HashIdentifier:
+    """Finds the purl of components that only have `hashes` (vendored JARs,
+    binaries) with the deps.dev query endpoint.
+
+    Hashes are gathered over `chunk_size` components at a time, deduplicated
+    and resolved concurrently with `osi.SearchHashBatch`, which goes through
+    the caches of `query`. Each round asks the next hash type of the
+    components still unknown, so a component costs one lookup when its first
+    hash matches.
+    """
+    def __init__(self, osi, concurrency=50, chunk_size=5000) -> None:
+        self.osi = osi
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.identified = 0
+        self.unknown = 0
+
+    def identify(self, components):
+        """purl of each component of the list, by position, for those without
+        a purl whose hashes are known to deps.dev.
+        """
+        pending = {position: component_hashes(comp) for position, comp in enumerate(components) if not comp.get('purl')}
+        pending = {position: hashes for position, hashes in pending.items() if hashes}
+        purls = {}
+        for round_index in range(len(HASH_TYPES)):
+            asked = {position: hashes[round_index] for position, hashes in pending.items() if round_index < len(hashes)}
+            if not asked:
+                break
+            answers = self.osi.SearchHashBatch(asked.values(), self.concurrency)
+            for position, key in asked.items():
+                candidate = best_candidate(answers.get(key), components[position])
+                if candidate is not None:
+                    purls[position] = version_purl(*candidate)
+                    del pending[position]
+        self.identified += len(purls)
+        self.unknown += len(pending)
+        return purls
+
+    def fill(self, components):
+        """Components with the purl found from their hashes added (as copies).
+        A list gives a list, any other iterable is read and resolved
+        `chunk_size` components at a time.
+        """
+        if isinstance(components, list):
+            return self.__filled(components)
+        return self.__iter_filled(iter(components))
+
+    def __filled(self, components):
+        purls = self.identify(components)
+        return [dict(comp, purl=purls[position]) if position in purls else comp for position, comp in enumerate(components)]
+
+    def __iter_filled(self, components):
+        while True:
+            chunk = list(islice(components, self.chunk_size))
+            if not chunk:
+                return
+            yield from self.__filled(chunk)
@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import deque
+
+# httpcore trace steps and the latency phase they belong to. DNS resolution
+# happens inside connect_tcp, so it is part of `connect`.
+TRACE_PHASES = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+    "send_request_headers": "send",
+    "send_request_body": "send",
+    "receive_response_headers": "wait",
+    "receive_response_body": "receive",
+}
+
+
+class RequestEvent:
+    """What happened to one call of the request layer, handed to every hook
+    of `query`.
+
+    `cache` is `memory` or `disk` when answered from a cache, `miss` when a
+    request was sent. `phases` holds seconds per latency phase (connect, tls,
+    send, wait for the server, receive, decode) summed over all attempts.
+    """
+    __slots__ = ('endpoint', 'url', 'status', 'bytes', 'elapsed', 'phases', 'cache', 'retries', 'error', '_started', '_steps')
+
+    def __init__(self, endpoint, url) -> None:
+        self.endpoint = endpoint
+        self.url = url
+        self.status = None
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.phases = {}
+        self.cache = 'miss'
+        self.retries = 0
+        self.error = None
+        self._started = time.perf_counter()
+        self._steps = {}
+
+    def add_phase(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def trace(self, name, info):
+        """httpcore `trace` extension callback."""
+        step, _, state = name.rpartition('.')
+        phase = TRACE_PHASES.get(step.rpartition('.')[2])
+        if phase is None:
+            return
+        if state == 'started':
+            self._steps[step] = time.perf_counter()
+        elif step in self._steps:
+            self.add_phase(phase, time.perf_counter() - self._steps.pop(step))
+
+    async def async_trace(self, name, info):
+        self.trace(name, info)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self._started
+        return self
+
+
+class Stats:
+    """Hook aggregating request events per endpoint: counts, bytes, cache hits,
+    retries, errors and latency percentiles over the last `samples` requests.
+
+    Add it with `query(hooks=[stats])`, then read `summary()` or export it with
+    `to_prometheus()`.
+    """
+    def __init__(self, samples=10000) -> None:
+        self.samples = samples
+        self.endpoints = {}
+        self.__lock = threading.Lock()
+
+    def __call__(self, event):
+        with self.__lock:
+            entry = self.endpoints.get(event.endpoint)
+            if entry is None:
+                entry = self.endpoints[event.endpoint] = {
+                    "requests": 0, "cache_hits": 0, "errors": 0, "retries": 0, "bytes": 0,
+                    "seconds": 0.0, "phases": {}, "latencies": deque(maxlen=self.samples)
+                }
+            entry["requests"] += 1
+            entry["retries"] += event.retries
+            entry["errors"] += 1 if event.error else 0
+            if event.cache != 'miss':
+                entry["cache_hits"] += 1
+                return
+            entry["bytes"] += event.bytes
+            entry["seconds"] += event.elapsed
+            entry["latencies"].append(event.elapsed)
+            for phase, seconds in event.phases.items():
+                entry["phases"][phase] = entry["phases"].get(phase, 0.0) + seconds
+
+    @staticmethod
+    def percentile(samples, p):
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+
+    def summary(self):
+        """Per endpoint totals plus p50/p95/p99 latency in seconds of the
+        requests sent upstream.
+        """
+        summary = {}
+        with self.__lock:
+            for endpoint, entry in sorted(self.endpoints.items()):
+                latencies = sorted(entry["latencies"])
+                summary[endpoint] = {
+                    "requests": entry["requests"],
+                    "cache_hits": entry["cache_hits"],
+                    "errors": entry["errors"],
+                    "retries": entry["retries"],
+                    "bytes": entry["bytes"],
+                    "seconds": entry["seconds"],
+                    "p50": self.percentile(latencies, 50),
+                    "p95": self.percentile(latencies, 95),
+                    "p99": self.percentile(latencies, 99),
+                    "phases": dict(entry["phases"])
+                }
+        return summary
+
+    def total_bytes(self):
+        return sum(entry["bytes"] for entry in self.summary().values())
+
+    def to_prometheus(self, prefix='osi'):
+        """Prometheus/OpenMetrics text exposition of the current summary."""
+        summary = self.summary()
+        lines = [
+            f'# HELP {prefix}_requests_total Calls of the request layer by endpoint.',
+            f'# TYPE {prefix}_requests_total counter'
+        ]
+        lines += [f'{prefix}_requests_total{{endpoint="{endpoint}"}} {entry["requests"]}' for endpoint, entry in summary.items()]
+        for metric, key, help_text in (
+            ('cache_hits_total', 'cache_hits', 'Calls answered from the memory or disk cache.'),
+            ('errors_total', 'errors', 'Calls answered with an error.'),
+            ('retries_total', 'retries', 'Retried attempts.'),
+            ('response_bytes_total', 'bytes', 'Bytes received from upstream.')
+        ):
+            lines += [f'# HELP {prefix}_{metric} {help_text}', f'# TYPE {prefix}_{metric} counter']
+            lines += [f'{prefix}_{metric}{{endpoint="{endpoint}"}} {entry[key]}' for endpoint, entry in summary.items()]
+        lines += [
+            f'# HELP {prefix}_request_duration_seconds Latency of upstream requests.',
+            f'# TYPE {prefix}_request_duration_seconds summary'
+        ]
+        for endpoint, entry in summary.items():
+            for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99')):
+                if entry[key] is not None:
+                    lines.append(f'{prefix}_request_duration_seconds{{endpoint="{endpoint}",quantile="{quantile}"}} {entry[key]}')
+            lines.append(f'{prefix}_request_duration_seconds_sum{{endpoint="{endpoint}"}} {entry["seconds"]}')
+            lines.append(f'{prefix}_request_duration_seconds_count{{endpoint="{endpoint}"}} {entry["requests"] - entry["cache_hits"]}')
+        return '\n'.join(lines) + '\n'
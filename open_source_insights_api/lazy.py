@@ -0,0 +1,24 @@
+import importlib
+
+
+class LazyModule:
+    """Stand-in for the module `name`, imported on the first attribute access.
+
+    Keeps costly imports (asyncio, httpx, rich, packageurl) out of the startup
+    of the `sbom_insights` entry point, only the code paths using them pay for
+    them. Attributes are kept once resolved, later accesses are plain lookups.
+    """
+    def __init__(self, name) -> None:
+        self.__dict__['_name'] = name
+
+    def __getattr__(self, attr):
+        value = getattr(importlib.import_module(self._name), attr)
+        self.__dict__[attr] = value
+        return value
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
@@ -0,0 +1,452 @@
+from open_source_insights_api.decoder import msgspec
+
+
+class Model:
+    """Slotted answer of one deps.dev endpoint, holding only the fields the
+    library and CLI read. `from_dict` builds it from the API JSON and `to_dict`
+    gives that JSON back, limited to the kept fields. With msgspec installed
+    the JSON is decoded into `schema` and read by `from_struct`.
+
+    Derived fields (default version, dependency counts, ...) are computed once
+    in the constructor.
+    """
+    __slots__ = ()
+    schema = None
+
+    @classmethod
+    def coerce(cls, data):
+        """`data` as this model, also when it is the dict answer of
+        `query(models=False)` or an error dict (read as an empty answer).
+        """
+        if isinstance(data, cls):
+            return data
+        return cls.from_dict(data if isinstance(data, dict) else {})
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+def _version_key(data):
+    key = data.get('versionKey') or data.get('packageKey') or {}
+    return key.get('system'), key.get('name'), key.get('version')
+
+
+class PackageInfo(Model):
+    """GetPackage: `versions` holds (version, publishedAt, isDefault) tuples,
+    `default_version` and `default_published_at` describe the default one.
+    """
+    __slots__ = ('system', 'name', 'versions', 'default_version', 'default_published_at')
+
+    def __init__(self, system=None, name=None, versions=()) -> None:
+        self.system = system
+        self.name = name
+        self.versions = versions
+        self.default_version, self.default_published_at = next(
+            ((version, published_at) for version, published_at, is_default in versions if is_default), (None, None)
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        system, name, _ = _version_key(data)
+        versions = tuple(
+            (_version_key(version)[2], version.get('publishedAt'), bool(version.get('isDefault')))
+            for version in data.get('versions') or []
+        )
+        return cls(system, name, versions)
+
+    @classmethod
+    def from_struct(cls, data):
+        key = data.package_key or _EMPTY_KEY
+        versions = tuple(
+            ((version.version_key or _EMPTY_KEY).version, version.published_at, version.is_default)
+            for version in data.versions
+        )
+        return cls(key.system, key.name, versions)
+
+    def to_dict(self):
+        return {
+            "packageKey": {"system": self.system, "name": self.name},
+            "versions": [
+                {"versionKey": {"system": self.system, "name": self.name, "version": version}, "publishedAt": published_at, "isDefault": is_default}
+                for version, published_at, is_default in self.versions
+            ]
+        }
+
+
+class VersionInfo(Model):
+    """GetVersion: licenses, advisory IDs and (label, url) links of a version.
+    `license` is the first license and `source_repo` the URL of the
+    SOURCE_REPO link.
+    """
+    __slots__ = ('system', 'name', 'version', 'is_default', 'licenses', 'advisories', 'links', 'license', 'source_repo')
+
+    def __init__(self, system=None, name=None, version=None, is_default=False, licenses=(), advisories=(), links=()) -> None:
+        self.system = system
+        self.name = name
+        self.version = version
+        self.is_default = is_default
+        self.licenses = licenses
+        self.advisories = advisories
+        self.links = links
+        self.license = licenses[0] if licenses else None
+        self.source_repo = None
+        for label, url in links:
+            if label == 'SOURCE_REPO':
+                self.source_repo = url
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            *_version_key(data),
+            is_default=bool(data.get('isDefault')),
+            licenses=tuple(data.get('licenses') or ()),
+            advisories=tuple(advisory.get('id') for advisory in data.get('advisoryKeys') or []),
+            links=tuple((link.get('label'), link.get('url')) for link in data.get('links') or [])
+        )
+
+    @classmethod
+    def from_struct(cls, data):
+        key = data.version_key or _EMPTY_KEY
+        return cls(
+            key.system, key.name, key.version,
+            is_default=data.is_default,
+            licenses=tuple(data.licenses),
+            advisories=tuple(advisory.id for advisory in data.advisory_keys),
+            links=tuple((link.label, link.url) for link in data.links)
+        )
+
+    def to_dict(self):
+        return {
+            "versionKey": {"system": self.system, "name": self.name, "version": self.version},
+            "isDefault": self.is_default,
+            "licenses": list(self.licenses),
+            "advisoryKeys": [{"id": advisory} for advisory in self.advisories],
+            "links": [{"label": label, "url": url} for label, url in self.links]
+        }
+
+
+class DependencyGraph(Model):
+    """GetDependencies: `nodes` holds (system, name, version, relation) tuples
+    and `edges` (fromNode, toNode, requirement) tuples, `direct` and
+    `indirect` count the nodes by relation.
+    """
+    __slots__ = ('nodes', 'edges', 'error', 'direct', 'indirect')
+
+    def __init__(self, nodes=(), edges=(), error=None) -> None:
+        self.nodes = nodes
+        self.edges = edges
+        self.error = error
+        self.direct = 0
+        self.indirect = 0
+        for node in nodes:
+            if node[3] == 'DIRECT':
+                self.direct += 1
+            elif node[3] == 'INDIRECT':
+                self.indirect += 1
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            nodes=tuple(_version_key(node) + (node.get('relation'),) for node in data.get('nodes') or []),
+            edges=tuple((edge.get('fromNode') or 0, edge.get('toNode') or 0, edge.get('requirement')) for edge in data.get('edges') or []),
+            error=data.get('error') or None
+        )
+
+    @classmethod
+    def from_struct(cls, data):
+        nodes = []
+        for node in data.nodes:
+            key = node.version_key or _EMPTY_KEY
+            nodes.append((key.system, key.name, key.version, node.relation))
+        return cls(
+            nodes=tuple(nodes),
+            edges=tuple((edge.from_node, edge.to_node, edge.requirement) for edge in data.edges),
+            error=data.error or None
+        )
+
+    def to_dict(self):
+        return {
+            "nodes": [
+                {"versionKey": {"system": system, "name": name, "version": version}, "relation": relation}
+                for system, name, version, relation in self.nodes
+            ],
+            "edges": [{"fromNode": from_node, "toNode": to_node, "requirement": requirement} for from_node, to_node, requirement in self.edges],
+            "error": self.error or ""
+        }
+
+
+class ProjectInfo(Model):
+    """GetProject: license, OpenSSF Scorecard score and (name, score) checks,
+    `maintained` is the score of the Maintained check.
+    """
+    __slots__ = ('id', 'license', 'score', 'checks', 'maintained')
+
+    def __init__(self, id=None, license=None, score=None, checks=()) -> None:
+        self.id = id
+        self.license = license
+        self.score = score
+        self.checks = checks
+        self.maintained = None
+        for name, check_score in checks:
+            if name == 'Maintained' and check_score is not None:
+                self.maintained = float(check_score)
+
+    @classmethod
+    def from_dict(cls, data):
+        scorecard = data.get('scorecard') or {}
+        return cls(
+            id=(data.get('projectKey') or {}).get('id'),
+            license=data.get('license') or None,
+            score=scorecard.get('overallScore'),
+            checks=tuple((check.get('name'), check.get('score')) for check in scorecard.get('checks') or [])
+        )
+
+    @classmethod
+    def from_struct(cls, data):
+        scorecard = data.scorecard
+        return cls(
+            id=(data.project_key or _EMPTY_KEY).id,
+            license=data.license or None,
+            score=scorecard.overall_score if scorecard else None,
+            checks=tuple((check.name, check.score) for check in scorecard.checks) if scorecard else ()
+        )
+
+    def to_dict(self):
+        data = {"projectKey": {"id": self.id}, "license": self.license or ""}
+        if self.score is not None or self.checks:
+            data["scorecard"] = {"overallScore": self.score, "checks": [{"name": name, "score": score} for name, score in self.checks]}
+        return data
+
+
+class AdvisoryInfo(Model):
+    """GetAdvisory: title, aliases (CVE, ...) and CVSS v3 score and vector,
+    `severity` is the CVSS v3 rating of the score.
+    """
+    __slots__ = ('id', 'url', 'title', 'aliases', 'cvss3_score', 'cvss3_vector', 'severity')
+
+    def __init__(self, id=None, url=None, title=None, aliases=(), cvss3_score=None, cvss3_vector=None) -> None:
+        self.id = id
+        self.url = url
+        self.title = title
+        self.aliases = aliases
+        self.cvss3_score = cvss3_score
+        self.cvss3_vector = cvss3_vector
+        self.severity = cvss_severity(cvss3_score)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            id=(data.get('advisoryKey') or {}).get('id'),
+            url=data.get('url') or None,
+            title=data.get('title') or None,
+            aliases=tuple(data.get('aliases') or ()),
+            cvss3_score=data.get('cvss3Score'),
+            cvss3_vector=data.get('cvss3Vector') or None
+        )
+
+    @classmethod
+    def from_struct(cls, data):
+        return cls(
+            id=(data.advisory_key or _EMPTY_KEY).id,
+            url=data.url or None,
+            title=data.title or None,
+            aliases=tuple(data.aliases),
+            cvss3_score=data.cvss3_score,
+            cvss3_vector=data.cvss3_vector or None
+        )
+
+    def to_dict(self):
+        return {
+            "advisoryKey": {"id": self.id},
+            "url": self.url or "",
+            "title": self.title or "",
+            "aliases": list(self.aliases),
+            "cvss3Score": self.cvss3_score,
+            "cvss3Vector": self.cvss3_vector or ""
+        }
+
+    def summary(self):
+        """Fields written in the scan records."""
+        return {"id": self.id, "severity": self.severity, "cvss3Score": self.cvss3_score, "aliases": list(self.aliases)}
+
+
+def cvss_severity(score):
+    """CVSS v3 qualitative rating of a base score."""
+    if score is None:
+        return None
+    if score >= 9.0:
+        return "CRITICAL"
+    if score >= 7.0:
+        return "HIGH"
+    if score >= 4.0:
+        return "MEDIUM"
+    if score > 0:
+        return "LOW"
+    return "NONE"
+
+
+class ComponentInsight(Model):
+    """Scan result of one SBOM component. `to_dict` gives the record written
+    by the CLI, `get` and `[]` read it by record key. Optional fields, filled
+    by extra scan modes, are left out of the record while None.
+    """
+    __slots__ = ('pkg_name', 'system', 'recv_version', 'latest', 'published_at', 'dep_dir', 'dep_indir', 'vulnerabilities', 'openssf_score', 'maintained', 'license', 'purl', 'transitive_vulnerabilities', 'max_cvss', 'advisories', 'transitive_advisories', 'scanned_at')
+
+    # Record key of each field, in output order
+    KEYS = {name: name for name in __slots__} | {"published_at": "publishedAt"}
+    FIELDS = {key: name for name, key in KEYS.items()}
+    OPTIONAL = ('transitive_vulnerabilities', 'max_cvss', 'advisories', 'transitive_advisories', 'scanned_at')
+
+    def __init__(self, pkg_name=None, system=None, recv_version=None, latest=None, published_at=None, dep_dir=None, dep_indir=None, vulnerabilities=None, openssf_score=None, maintained=None, license=None, purl=None) -> None:
+        self.pkg_name = pkg_name
+        self.system = system
+        self.recv_version = recv_version
+        self.latest = latest
+        self.published_at = published_at
+        self.dep_dir = dep_dir
+        self.dep_indir = dep_indir
+        self.vulnerabilities = vulnerabilities
+        self.openssf_score = openssf_score
+        self.maintained = maintained
+        self.license = license
+        self.purl = purl
+        self.transitive_vulnerabilities = None
+        self.max_cvss = None
+        self.advisories = None
+        self.transitive_advisories = None
+        self.scanned_at = None
+
+    @classmethod
+    def from_responses(cls, pkg_name, system, recv_version, purl, package, version, graph, project):
+        """Combine the answers about one component, models or dicts."""
+        package = PackageInfo.coerce(package)
+        version = VersionInfo.coerce(version)
+        graph = DependencyGraph.coerce(graph)
+        project = ProjectInfo.coerce(project)
+        return cls(
+            pkg_name=pkg_name,
+            system=system,
+            recv_version=recv_version,
+            latest=package.default_version,
+            published_at=package.default_published_at,
+            dep_dir=graph.direct,
+            dep_indir=graph.indirect,
+            vulnerabilities=len(version.advisories),
+            openssf_score=project.score,
+            maintained=project.maintained,
+            license=version.license if version.license is not None else project.license,
+            purl=purl
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        insight = cls(**{name: data.get(key) for name, key in cls.KEYS.items() if name not in cls.OPTIONAL})
+        for name in cls.OPTIONAL:
+            value = data.get(cls.KEYS[name])
+            setattr(insight, name, tuple(value) if isinstance(value, list) else value)
+        return insight
+
+    def to_dict(self):
+        record = {}
+        for name, key in self.KEYS.items():
+            value = getattr(self, name)
+            if isinstance(value, tuple):
+                # Advisories are shared AdvisoryInfo objects, or dicts read back
+                value = [item.summary() if isinstance(item, AdvisoryInfo) else item for item in value]
+            if value is not None or name not in self.OPTIONAL:
+                record[key] = value
+        return record
+
+    def get(self, key, default=None):
+        name = self.FIELDS.get(key)
+        return getattr(self, name) if name is not None else default
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, self.FIELDS[key])
+
+
+if msgspec is not None:
+    # Decoding schemas, fields missing here are skipped by the msgspec decoder
+    class _Key(msgspec.Struct):
+        system: str | None = None
+        name: str | None = None
+        version: str | None = None
+        id: str | None = None
+
+    class _PackageVersion(msgspec.Struct, rename='camel'):
+        version_key: _Key | None = None
+        published_at: str | None = None
+        is_default: bool = False
+
+    class _Package(msgspec.Struct, rename='camel'):
+        package_key: _Key | None = None
+        versions: list[_PackageVersion] = []
+
+    class _Link(msgspec.Struct):
+        label: str | None = None
+        url: str | None = None
+
+    class _Version(msgspec.Struct, rename='camel'):
+        version_key: _Key | None = None
+        is_default: bool = False
+        licenses: list[str] = []
+        advisory_keys: list[_Key] = []
+        links: list[_Link] = []
+
+    class _Node(msgspec.Struct, rename='camel'):
+        version_key: _Key | None = None
+        relation: str | None = None
+
+    class _Edge(msgspec.Struct, rename='camel'):
+        from_node: int = 0
+        to_node: int = 0
+        requirement: str | None = None
+
+    class _Dependencies(msgspec.Struct):
+        nodes: list[_Node] = []
+        edges: list[_Edge] = []
+        error: str | None = None
+
+    class _Check(msgspec.Struct):
+        name: str | None = None
+        score: float | None = None
+
+    class _Scorecard(msgspec.Struct, rename='camel'):
+        overall_score: float | None = None
+        checks: list[_Check] = []
+
+    class _Advisory(msgspec.Struct, rename='camel'):
+        advisory_key: _Key | None = None
+        url: str | None = None
+        title: str | None = None
+        aliases: list[str] = []
+        cvss3_score: float | None = None
+        cvss3_vector: str | None = None
+
+    class _Project(msgspec.Struct, rename='camel'):
+        project_key: _Key | None = None
+        license: str | None = None
+        scorecard: _Scorecard | None = None
+
+    _EMPTY_KEY = _Key()
+
+    PackageInfo.schema = _Package
+    VersionInfo.schema = _Version
+    DependencyGraph.schema = _Dependencies
+    ProjectInfo.schema = _Project
+    AdvisoryInfo.schema = _Advisory
+
+# Model of each endpoint answer, see `query(models=True)`
+RESPONSE_MODELS = {
+    "package": PackageInfo,
+    "version": VersionInfo,
+    "dependencies": DependencyGraph,
+    "project": ProjectInfo,
+    "advisory": AdvisoryInfo,
+}
@@ -1,8 +1,30 @@
-import httpx as requests
-from httpx import AsyncClient
-import json
+import httpx
+import asyncio
+import time
 import urllib.parse
-from functools import cache
+from open_source_insights_api.batch import async_batch, batch
+from open_source_insights_api.cache import DEFAULT_TTL, MemoryCache
+from open_source_insights_api.throttle import RetryPolicy, TokenBucket
+from open_source_insights_api.instrumentation import RequestEvent
+from open_source_insights_api import decoder
+from open_source_insights_api.models import RESPONSE_MODELS
+try:
+    import h2
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+
+async def close_with_loop(client):
+    """Waits for the end of the running event loop and closes `client`.
+
+    `asyncio.run` cancels the tasks left pending before closing its loop,
+    the client is then closed while its connections can still be shut.
+    """
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await client.aclose()
 
 class query:
     """The Deps.dev Insights API provides information about open source software
@@ -10,7 +32,67 @@ class query:
     from upstream services like npm, GitHub, and OSV, and augmented by computing
     dependencies and relationships between entities.
     """
-    def __init__(self) -> None:
+    def __init__(self, base_url='https://api.deps.dev/v3alpha', timeout=60, max_connections=100, max_keepalive_connections=20, keepalive_expiry=30, http2=True, transport=None, cache=None, cache_ttl=None, offline=False, memory_maxsize=4096, memory_max_bytes=256 * 1024 * 1024, rate_limit=None, rate_burst=None, retry=None, hooks=None, models=False) -> None:
+        """`base_url` points to the deps.dev API, or to a compatible stand-in.
+
+        The HTTP clients are created on first use and reused by every call,
+        so connections to api.deps.dev are kept alive between requests.
+        HTTP/2 is used when the `h2` package is installed.
+
+        Use `with query() as q` or `async with query() as q` to close them
+        at the end, or call `close()` / `aclose()`. A custom httpx `transport`
+        may be given, e.g. `httpx.MockTransport` in tests.
+
+        `cache` takes a persistent backend from `open_source_insights_api.cache`
+        (`SQLiteCache`, `DirectoryCache`). Responses are kept per endpoint for
+        the seconds in `cache_ttl`, merged over `cache.DEFAULT_TTL`. With
+        `offline=True` nothing is requested and only cached answers are returned.
+
+        Results of the sync and async methods share one in memory LRU cache
+        (`self.memory`), bounded by `memory_maxsize` entries and `memory_max_bytes`
+        of responses, whose entries expire with the same per endpoint TTL.
+        Concurrent awaits of the same request share a single HTTP call.
+
+        Every request goes through one layer: `rate_limit` requests per second
+        (token bucket, bursts of `rate_burst`, unlimited when None), and failed
+        connections, 429 and 5xx answers are retried following `retry`, a
+        `throttle.RetryPolicy` (exponential backoff with jitter, `Retry-After`,
+        per endpoint retry counts).
+
+        `hooks` are callables receiving an `instrumentation.RequestEvent` after
+        each call (endpoint, status, bytes, latency phases, cache hit or miss,
+        retries), e.g. an `instrumentation.Stats` aggregator.
+
+        Responses are decoded with orjson or msgspec when installed (see
+        `decoder`). With `models=True` package, version, dependencies, project
+        and advisory answers are returned as the slotted classes of `models`
+        (`PackageInfo`, `VersionInfo`, `DependencyGraph`, `ProjectInfo`,
+        `AdvisoryInfo`), which keep only the fields in use, errors are still
+        returned as dicts.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = httpx.Timeout(timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2 and HTTP2
+        self.transport = transport
+        self.cache = cache
+        self.cache_ttl = {**DEFAULT_TTL, **(cache_ttl or {})}
+        self.offline = offline
+        self.rate_limiter = TokenBucket(rate_limit, rate_burst) if rate_limit else None
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.hooks = list(hooks or [])
+        self.models = models
+        self.memory = MemoryCache(maxsize=memory_maxsize, max_bytes=memory_max_bytes)
+        self.__in_flight = {}
+        self.__client = None
+        self.__async_client = None
+        self.__async_loop = None
+        self.__async_closer = None
+
         self.systems = [
             "GO",
             "NPM",
@@ -30,6 +112,189 @@ class query:
             "SHA512"
         ]
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    @property
+    def client(self):
+        if self.__client is None:
+            self.__client = httpx.Client(http2=self.http2, limits=self.limits, timeout=self.timeout, transport=self.transport)
+        return self.__client
+
+    @property
+    def async_client(self):
+        # An AsyncClient is bound to the event loop that opened its connections,
+        # a new one is made when the query is reused under another loop, and
+        # each one is closed with its own loop
+        loop = asyncio.get_running_loop()
+        if self.__async_client is None or self.__async_loop is not loop:
+            self.__async_client = httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=self.timeout, transport=self.transport)
+            self.__async_loop = loop
+            self.__async_closer = loop.create_task(close_with_loop(self.__async_client))
+            self.__in_flight = {}
+        return self.__async_client
+
+    def close(self):
+        if self.__client is not None:
+            self.__client.close()
+            self.__client = None
+
+    async def aclose(self):
+        self.close()
+        if self.__async_client is not None:
+            if self.__async_loop is asyncio.get_running_loop():
+                self.__async_closer.cancel()
+                await asyncio.gather(self.__async_closer, return_exceptions=True)
+            await self.__async_client.aclose()
+            self.__async_client = None
+
+    def __cache_key(self, url, params=None):
+        return str(httpx.URL(url, params=sorted((params or {}).items())))
+
+    def __cache_get(self, endpoint, key):
+        if self.cache is None:
+            return None
+        # Offline runs accept any cached answer, however old
+        max_age = None if self.offline else self.cache_ttl.get(endpoint)
+        return self.cache.get(key, max_age=max_age)
+
+    def __cache_set(self, endpoint, key, r, r_json):
+        if r.is_success:
+            self.memory.set(key, r_json, size=len(r.content), ttl=self.cache_ttl.get(endpoint))
+            if self.cache is not None:
+                # The raw body is stored, whatever model the answer was decoded to
+                self.cache.set(key, r_json, raw=r.content)
+
+    def __emit(self, event, result=None):
+        if isinstance(result, dict) and result.get('error'):
+            event.error = result.get('error')
+        event.finish()
+        for hook in self.hooks:
+            hook(event)
+        return result
+
+    def __cached(self, event, key, memory=True):
+        memoized = self.memory.get(key) if memory else None
+        if memoized is not None:
+            event.cache = 'memory'
+            return memoized
+        cached = self.__cache_get(event.endpoint, key)
+        if cached is not None:
+            event.cache = 'disk'
+            size = len(decoder.dumps(cached))
+            model = self.__model(event.endpoint)
+            if model is not None:
+                cached = model.from_dict(cached)
+            self.memory.set(key, cached, size=size, ttl=self.cache_ttl.get(event.endpoint))
+            return cached
+
+    def __model(self, endpoint):
+        return RESPONSE_MODELS.get(endpoint) if self.models else None
+
+    def __parse(self, event, key, r):
+        if r is None:
+            return {"error": f"Connection with {event.url}"}
+        event.status = r.status_code
+        event.bytes = len(r.content)
+        if r.status_code in self.retry.statuses:
+            return {"error": f"Status {r.status_code} from {event.url} after retries", "status": r.status_code}
+
+        started = time.perf_counter()
+        try:
+            r_json = decoder.decode(r.content, self.__model(event.endpoint) if r.is_success else None)
+        except:
+            return {"error": "JSON returned from API is not serializable probably status 404"}
+        finally:
+            event.add_phase('decode', time.perf_counter() - started)
+
+        self.__cache_set(event.endpoint, key, r, r_json)
+        return r_json
+
+    def __get(self, endpoint, url, params=None):
+        event = RequestEvent(endpoint, url)
+        key = self.__cache_key(url, params)
+        cached = self.__cached(event, key)
+        if cached is not None:
+            return self.__emit(event, cached)
+        if self.offline:
+            return self.__emit(event, {"error": f"{key} not found in cache (offline)"})
+
+        extensions = {"trace": event.trace} if self.hooks else None
+        r = None
+        for attempt in range(self.retry.retries(endpoint) + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                r = self.client.get(url, params=params, extensions=extensions)
+            except httpx.TransportError:
+                r = None
+            except Exception:
+                return self.__emit(event, {"error": f"Connection with {url}"})
+            delay = self.retry.delay(endpoint, attempt, r)
+            if delay is None:
+                break
+            event.retries += 1
+            time.sleep(delay)
+
+        return self.__emit(event, self.__parse(event, key, r))
+
+    async def __async_get(self, endpoint, url, params=None):
+        key = self.__cache_key(url, params)
+        memoized = self.memory.get(key)
+        if memoized is not None:
+            if self.hooks:
+                event = RequestEvent(endpoint, url)
+                event.cache = 'memory'
+                self.__emit(event)
+            return memoized
+
+        # Single-flight: callers asking for a key already being fetched await
+        # the same task, shielded so one cancelled caller does not cancel the rest
+        client = self.async_client
+        task = self.__in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.__async_fetch(client, endpoint, key, url, params))
+            self.__in_flight[key] = task
+            task.add_done_callback(lambda done: self.__in_flight.get(key) is done and self.__in_flight.pop(key))
+        return await asyncio.shield(task)
+
+    async def __async_fetch(self, client, endpoint, key, url, params):
+        event = RequestEvent(endpoint, url)
+        # The memory tier was already looked up by `__async_get`, with no await since
+        cached = self.__cached(event, key, memory=False)
+        if cached is not None:
+            return self.__emit(event, cached)
+        if self.offline:
+            return self.__emit(event, {"error": f"{key} not found in cache (offline)"})
+
+        extensions = {"trace": event.async_trace} if self.hooks else None
+        r = None
+        for attempt in range(self.retry.retries(endpoint) + 1):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.async_acquire()
+            try:
+                r = await client.get(url, params=params, extensions=extensions)
+            except httpx.TransportError:
+                r = None
+            except Exception:
+                return self.__emit(event, {"error": f"Connection with {url}"})
+            delay = self.retry.delay(endpoint, attempt, r)
+            if delay is None:
+                break
+            event.retries += 1
+            await asyncio.sleep(delay)
+
+        return self.__emit(event, self.__parse(event, key, r))
+
     def __CheckSupportedSystem(self, system_repo):
         system_repo = system_repo.upper()
         flag = False
@@ -60,51 +325,28 @@ class query:
         
         return flag
 # Functions Syncs
-    @cache
     def GetPackage(self, system_repo, pkg_name):
         """GetPackage returns information about a package, including a list of its
         available versions, with the default version marked if known.
         """
         if self.__CheckSupportedSystem(system_repo):
             pkg_name = urllib.parse.quote_plus(pkg_name)
-            url = f'https://api.deps.dev/v3alpha/systems/{system_repo}/packages/{pkg_name}'
-            
-            try:
-                r = requests.get(url)
-            except:
-                return {"error": f"Connection with {url}"}
-            
-            try:
-                r_json = json.loads(r.content)
-            except:
-                return {"error": "JSON returned from API is not serializable probably status 404"}
+            url = f'{self.base_url}/systems/{system_repo}/packages/{pkg_name}'
             
-            return r_json
+            return self.__get('package', url)
         else:
             return {"error": "System repository not supported", "supported": self.systems}
-    @cache
     def GetVersion(self, system_repo, pkg_name, pkg_version):
         """GetVersion returns information about a specific package version, including
         its licenses and any security advisories known to affect it.
         """
         if self.__CheckSupportedSystem(system_repo):
             pkg_name = urllib.parse.quote_plus(pkg_name)
-            url = f'https://api.deps.dev/v3alpha/systems/{system_repo}/packages/{pkg_name}/versions/{pkg_version}'
+            url = f'{self.base_url}/systems/{system_repo}/packages/{pkg_name}/versions/{pkg_version}'
             
-            try:
-                r = requests.get(url)
-            except:
-                return {"error": f"Connection with {url}"}
-            
-            try:
-                r_json = json.loads(r.content)
-            except:
-                return {"error": "JSON returned from API is not serializable probably status 404"}
-            
-            return r_json
+            return self.__get('version', url)
         else:
             return {"error": "System repository not supported", "supported": self.systems}
-    @cache
     def GetRequirements(self, system_repo, pkg_name, pkg_version):
         """GetRequirements returns the requirements for a given version in a
         system-specific format. Requirements are currently only available for
@@ -114,22 +356,11 @@ class query:
         """
         if self.__CheckSupportedSystem(system_repo):
             pkg_name = urllib.parse.quote_plus(pkg_name)
-            url = f'https://api.deps.dev/v3alpha/systems/{system_repo}/packages/{pkg_name}/versions/{pkg_version}:requirements'
-            
-            try:
-                r = requests.get(url)
-            except:
-                return {"error": f"Connection with {url}"}
-
-            try:
-                r_json = json.loads(r.content)
-            except:
-                return {"error": "JSON returned from API is not serializable probably status 404"}
+            url = f'{self.base_url}/systems/{system_repo}/packages/{pkg_name}/versions/{pkg_version}:requirements'
             
-            return r_json
+            return self.__get('requirements', url)
         else:
             return {"error": "System repository not supported", "supported": self.systems}
-    @cache   
     def GetDependencies(self, system_repo, pkg_name, pkg_version):
         """GetDependencies returns a resolved dependency graph for the given package
         version. Dependencies are currently available for Go, npm, Cargo, Maven
@@ -145,22 +376,11 @@ class query:
         """
         if self.__CheckSupportedSystem(system_repo):
             pkg_name = urllib.parse.quote_plus(pkg_name)
-            url = f'https://api.deps.dev/v3alpha/systems/{system_repo}/packages/{pkg_name}/versions/{pkg_version}:dependencies'
-            
-            try:
-                r = requests.get(url)
-            except:
-                return {"error": f"Connection with {url}"}
+            url = f'{self.base_url}/systems/{system_repo}/packages/{pkg_name}/versions/{pkg_version}:dependencies'
             
-            try:
-                r_json = json.loads(r.content)
-            except:
-                return {"error": "JSON returned from API is not serializable probably status 404"}
-            
-            return r_json
+            return self.__get('dependencies', url)
         else:
             return {"error": "System repository not supported", "supported": self.systems}
-    @cache
     def GetProject(self, repo): # ex github.com/owner/pkg
         """GetProject returns information about projects hosted by GitHub, GitLab, or
         BitBucket, when known to us.
@@ -168,43 +388,21 @@ class query:
         if self.__CheckSupportedRepo(repo):
             repo = urllib.parse.quote_plus(repo)
             
-            url = f'https://api.deps.dev/v3alpha/projects/{repo.lower()}'
+            url = f'{self.base_url}/projects/{repo.lower()}'
 
-            try:
-                r = requests.get(url)
-            except:
-                return {"error": f"Connection with {url}"}
-
-            try:
-                r_json = json.loads(r.content)
-            except:
-                return {"error": "JSON returned from API is not serializable probably status 404"}
-            
-            return r_json
+            return self.__get('project', url)
         else:
             return {"error": "System repository not supported", "supported": self.systems}
-    @cache
     def GetAdvisory(self, advisor_id): # ex GHSA-xxxx-xxxx-xxxx
         """GetAdvisory returns information about security advisories hosted by OSV.
         """
         if advisor_id.split('-', 1)[0] == "GHSA":
             
-            url = f'https://api.deps.dev/v3alpha/advisories/{advisor_id}'
+            url = f'{self.base_url}/advisories/{advisor_id}'
 
-            try:
-                r = requests.get(url)
-            except:
-                return {"error": f"Connection with {url}"}
-
-            try:
-                r_json = json.loads(r.content)
-            except:
-                return {"error": "JSON returned from API is not serializable probably status 404"}
-            
-            return r_json
+            return self.__get('advisory', url)
         else:
             return {"error": "Advisor ID no supported", "example": "GHSA-xxxx-xxxx-xxxx"}
-    @cache 
     def Search(self, system_repo=None, pkg_name=None, pkg_version=None, hash_type=None, hash_value=None): # ex GHSA-xxxx-xxxx-xxxx
         """Query returns information about multiple package versions, which can be
         specified by name, content hash, or both.
@@ -214,10 +412,10 @@ class query:
         package versions, and any given artifact may appear in many package
         versions.
         """
-        url = f'https://api.deps.dev/v3alpha/query'
+        url = f'{self.base_url}/query'
 
         if hash_type != None and hash_value != None and self.__CheckSupportedHashs(hash_type):
-            hash_value = urllib.parse.quote_plus(hash_value)
+            # Base64 value, encoded once by httpx with the other params
             params = {
                 "hash.type": hash_type,
                 "hash.value": hash_value
@@ -233,22 +431,40 @@ class query:
             params = {}
 
         if len(params) != 0:
-            try:
-                r = requests.get(url, params=params)
-            except:
-                return {"error": f"Connection with {url} status invalid"}
-            
-            try:
-                r_json = json.loads(r.content)
-            except:
-                return {"error": "JSON returned from API is not serializable probably status 404", "response": r.content.decode('utf-8')}
+            return self.__get('query', url, params=params)
         else:
             return {"error": "Incomplete parameters"}
-        
-        return r_json
+
+    def GetVersionBatch(self, keys, concurrency=20):
+        """GetVersion for many (system, name, version) keys at once. Keys are
+        deduplicated and fetched by up to `concurrency` threads, the result maps
+        each key tuple to its GetVersion answer.
+        """
+        return batch(self.GetVersion, keys, concurrency)
+
+    def GetDependenciesBatch(self, keys, concurrency=20):
+        """GetDependencies for many (system, name, version) keys at once. Keys are
+        deduplicated and fetched by up to `concurrency` threads, the result maps
+        each key tuple to its GetDependencies answer.
+        """
+        return batch(self.GetDependencies, keys, concurrency)
+
+    def GetAdvisoryBatch(self, advisor_ids, concurrency=20):
+        """GetAdvisory for many advisory IDs at once. IDs are deduplicated and
+        fetched by up to `concurrency` threads, the result maps each ID to its
+        GetAdvisory answer.
+        """
+        answers = batch(self.GetAdvisory, [(advisor_id,) for advisor_id in advisor_ids], concurrency)
+        return {key[0]: answer for key, answer in answers.items()}
+
+    def SearchHashBatch(self, hashes, concurrency=20):
+        """Search by content hash for many (hash_type, hash_value) pairs at
+        once, values base64 encoded. Pairs are deduplicated and fetched by up
+        to `concurrency` threads, the result maps each pair to its Search answer.
+        """
+        return batch(lambda hash_type, hash_value: self.Search(hash_type=hash_type, hash_value=hash_value), hashes, concurrency)
 
 # Fuctions Asyncs
-    @cache
     async def async_GetPackage(self, system_repo, pkg_name):
         """Async method with HTTPX
         GetPackage returns information about a package, including a list of its
@@ -256,22 +472,11 @@ class query:
         """
         if self.__CheckSupportedSystem(system_repo):
             pkg_name = urllib.parse.quote_plus(pkg_name)
-            url = f'https://api.deps.dev/v3alpha/systems'
-            
-            async with AsyncClient(base_url=url) as client:
-                try:
-                    r = await client.get(f'/{system_repo}/packages/{pkg_name}', timeout=60)
-                except:
-                    return {"error": f"Connection with {url}/{system_repo}/packages/{pkg_name}"}
-                
-                try:
-                    r_json = r.json()
-                except:
-                    return {"error": "JSON returned from API is not serializable probably status 404"}
-                return r_json
+            url = f'{self.base_url}/systems/{system_repo}/packages/{pkg_name}'
+
+            return await self.__async_get('package', url)
         else:
             return {"error": "System repository not supported", "supported": self.systems}
-    @cache
     async def async_GetVersion(self, system_repo, pkg_name, pkg_version):
         """Async method with HTTPX
         GetVersion returns information about a specific package version, including
@@ -279,23 +484,11 @@ class query:
         """
         if self.__CheckSupportedSystem(system_repo):
             pkg_name = urllib.parse.quote_plus(pkg_name)
-            url = f'https://api.deps.dev/v3alpha/systems'
-            
-            async with AsyncClient(base_url=url) as client:
-                try:
-                    r = await client.get(f'/{system_repo}/packages/{pkg_name}/versions/{pkg_version}', timeout=60)
-                except:
-                    return {"error": f"Connection with {url}/{system_repo}/packages/{pkg_name}/versions/{pkg_version}"}
-
-                try:
-                    r_json = json.loads(r.content)
-                except:
-                    return {"error": "JSON returned from API is not serializable probably status 404"}
-                
-                return r_json
+            url = f'{self.base_url}/systems/{system_repo}/packages/{pkg_name}/versions/{pkg_version}'
+
+            return await self.__async_get('version', url)
         else:
             return {"error": "System repository not supported", "supported": self.systems}
-    @cache
     async def async_GetRequirements(self, system_repo, pkg_name, pkg_version):
         """Async method with HTTPX
         GetRequirements returns the requirements for a given version in a
@@ -306,23 +499,11 @@ class query:
         """
         if self.__CheckSupportedSystem(system_repo):
             pkg_name = urllib.parse.quote_plus(pkg_name)
-            url = f'https://api.deps.dev/v3alpha/systems' 
-            
-            async with AsyncClient(base_url=url) as client:
-                try:
-                    r = await client.get(f'/{system_repo}/packages/{pkg_name}/versions/{pkg_version}:requirements', timeout=60)
-                except:
-                    return {"error": f"Connection with {url}/{system_repo}/packages/{pkg_name}/versions/{pkg_version}:requirements"}
-                
-                try:
-                    r_json = json.loads(r.content)
-                except:
-                    return {"error": "JSON returned from API is not serializable probably status 404"}
-                
-                return r_json
+            url = f'{self.base_url}/systems/{system_repo}/packages/{pkg_name}/versions/{pkg_version}:requirements'
+
+            return await self.__async_get('requirements', url)
         else:
             return {"error": "System repository not supported", "supported": self.systems}
-    @cache
     async def async_GetDependencies(self, system_repo, pkg_name, pkg_version):
         """Async method with HTTPX
         GetDependencies returns a resolved dependency graph for the given package
@@ -339,22 +520,11 @@ class query:
         """
         if self.__CheckSupportedSystem(system_repo):
             pkg_name = urllib.parse.quote_plus(pkg_name)
-            url = f'https://api.deps.dev/v3alpha/systems'
-            async with AsyncClient(base_url=url) as client:
-                try:
-                    r = await client.get(f'/{system_repo}/packages/{pkg_name}/versions/{pkg_version}:dependencies', timeout=60)
-                except:
-                    return {"error": f"Connection with {url}/{system_repo}/packages/{pkg_name}/versions/{pkg_version}:dependencies"}
-                
-                try:
-                    r_json = json.loads(r.content)
-                except:
-                    return {"error": "JSON returned from API is not serializable probably status 404"}
-                
-                return r_json
+            url = f'{self.base_url}/systems/{system_repo}/packages/{pkg_name}/versions/{pkg_version}:dependencies'
+
+            return await self.__async_get('dependencies', url)
         else:
             return {"error": "System repository not supported", "supported": self.systems}
-    @cache
     async def async_GetProject(self, repo): # ex github.com/owner/pkg
         """Async method with HTTPX
         GetProject returns information about projects hosted by GitHub, GitLab, or
@@ -362,45 +532,23 @@ class query:
         """
         if self.__CheckSupportedRepo(repo):
             repo = urllib.parse.quote_plus(repo)
-            
-            url = f'https://api.deps.dev/v3alpha/projects'
-            async with AsyncClient(base_url=url) as client:
-                try:
-                    r = await client.get(f'/{repo}', timeout=60)
-                except:
-                    return {"error": f"Connection with {url}/{repo} status invalid"}
-                try:
-                    r_json = json.loads(r.content)
-                except:
-                    return {"error": "JSON returned from API is not serializable probably status 404"}
-                
-                return r_json
+
+            url = f'{self.base_url}/projects/{repo.lower()}'
+
+            return await self.__async_get('project', url)
         else:
             return {"error": "System repository not supported", "supported": self.systems}
-    @cache
     async def async_GetAdvisory(self, advisor_id): # ex GHSA-xxxx-xxxx-xxxx
         """Async method with HTTPX
         GetAdvisory returns information about security advisories hosted by OSV.
         """
         if advisor_id.split('-', 1)[0] == "GHSA":
 
-            url = f'https://api.deps.dev/v3alpha/advisories'
+            url = f'{self.base_url}/advisories/{advisor_id}'
 
-            
-            async with AsyncClient(base_url=url) as client:
-                try:
-                    r = await client.get(f'/{advisor_id}', timeout=60)
-                except:
-                    return {"error": f"Connection with {url}/{advisor_id} status invalid"}
-                
-                try:
-                    r_json = json.loads(r.content)
-                except:
-                    return {"error": "JSON returned from API is not serializable probably status 404"}
-                return r_json
+            return await self.__async_get('advisory', url)
         else:
             return {"error": "Advisor ID no supported", "example": "GHSA-xxxx-xxxx-xxxx"}
-    @cache
     async def async_Search(self, system_repo=None, pkg_name=None, pkg_version=None, hash_type=None, hash_value=None): # ex GHSA-xxxx-xxxx-xxxx
         """Query returns information about multiple package versions, which can be
         specified by name, content hash, or both.
@@ -410,10 +558,10 @@ class query:
         package versions, and any given artifact may appear in many package
         versions.
         """
-        url = f'https://api.deps.dev/v3alpha'
+        url = f'{self.base_url}/query'
 
         if hash_type != None and hash_value != None and self.__CheckSupportedHashs(hash_type):
-            hash_value = urllib.parse.quote_plus(hash_value)
+            # Base64 value, encoded once by httpx with the other params
             params = {
                 "hash.type": hash_type,
                 "hash.value": hash_value
@@ -429,17 +577,39 @@ class query:
             params = {}
 
         if len(params) != 0:
-            async with AsyncClient(base_url=url) as client:
-                try:
-                    r = await client.get('/query', params=params, timeout=60)
-                except:
-                    return {"error": f"Connection with {url} status invalid"}
-                
-                try:
-                    r_json = json.loads(r.content)
-                except:
-                    return {"error": "JSON returned from API is not serializable probably status 404", "response": r.content.decode('utf-8')}
+            return await self.__async_get('query', url, params=params)
         else:
             return {"error": "Incomplete parameters"}
-        
-        return r_json
\ No newline at end of file
+
+    async def async_GetVersionBatch(self, keys, concurrency=50):
+        """Async method with HTTPX
+        GetVersion for many (system, name, version) keys at once. Keys are
+        deduplicated and at most `concurrency` requests run together, the result
+        maps each key tuple to its GetVersion answer.
+        """
+        return await async_batch(self.async_GetVersion, keys, concurrency)
+
+    async def async_GetDependenciesBatch(self, keys, concurrency=50):
+        """Async method with HTTPX
+        GetDependencies for many (system, name, version) keys at once. Keys are
+        deduplicated and at most `concurrency` requests run together, the result
+        maps each key tuple to its GetDependencies answer.
+        """
+        return await async_batch(self.async_GetDependencies, keys, concurrency)
+
+    async def async_GetAdvisoryBatch(self, advisor_ids, concurrency=50):
+        """Async method with HTTPX
+        GetAdvisory for many advisory IDs at once. IDs are deduplicated and at
+        most `concurrency` requests run together, the result maps each ID to
+        its GetAdvisory answer.
+        """
+        answers = await async_batch(self.async_GetAdvisory, [(advisor_id,) for advisor_id in advisor_ids], concurrency)
+        return {key[0]: answer for key, answer in answers.items()}
+
+    async def async_SearchHashBatch(self, hashes, concurrency=50):
+        """Async method with HTTPX
+        Search by content hash for many (hash_type, hash_value) pairs at once.
+        Pairs are deduplicated and at most `concurrency` requests run together,
+        the result maps each pair to its Search answer.
+        """
+        return await async_batch(lambda hash_type, hash_value: self.async_Search(hash_type=hash_type, hash_value=hash_value), hashes, concurrency)
@@ -0,0 +1,76 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from open_source_insights_api.cache import open_cache
+from open_source_insights_api.os_insights import query
+
+# State of a worker process, set once by `_init_worker`
+_PROCESSOR = None
+_LOOP = None
+
+
+def worker_query(cache=None, cache_backend='sqlite', **options):
+    """`query` of a worker process, opening its own connection to the
+    persistent cache at `cache` (True for the default path). Use it with
+    `functools.partial` as the picklable `osi_factory` of `Sbom_Process_CLI`.
+    """
+    if cache is not None:
+        options['cache'] = open_cache(None if cache is True else cache, backend=cache_backend)
+    return query(models=True, **options)
+
+
+def shards(items, size):
+    """Lists of `size` consecutive items."""
+    shard = []
+    for item in items:
+        shard.append(item)
+        if len(shard) >= size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def _init_worker(osi_factory, options):
+    global _PROCESSOR, _LOOP
+    from open_source_insights_api.cli import Sbom_Process_CLI
+    osi = osi_factory() if osi_factory is not None else None
+    _PROCESSOR = Sbom_Process_CLI(components=[], osi=osi, progress=False, **options)
+    # One event loop per worker, so its AsyncClient keeps its connections between shards
+    _LOOP = asyncio.new_event_loop()
+
+
+async def _collect(concurrency):
+    return [model async for model in _PROCESSOR.async_iter_process(concurrency)]
+
+
+def _process_shard(components, concurrency):
+    _PROCESSOR.components = components
+    if concurrency:
+        return _LOOP.run_until_complete(_collect(concurrency))
+    return list(_PROCESSOR.iter_process())
+
+
+def iter_sharded(components, workers, osi_factory=None, options=None, concurrency=None, shard_size=50, window=None):
+    """Enrich `components` in `workers` processes, `shard_size` components at
+    a time, yielding the models in input order.
+
+    Each worker runs its own `Sbom_Process_CLI` (with `options`, e.g.
+    `transitive`) and its own `query` from `osi_factory`, fetching with
+    `concurrency` like the single process pipeline. Decoding, model building
+    and graph counting then use every core. At most `window` shards (default
+    2x `workers`) are in flight, so results are merged in order without
+    holding the whole SBOM.
+    """
+    window = window or workers * 2
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(osi_factory, options or {}))
+    pending = deque()
+    try:
+        for shard in shards(components, shard_size):
+            pending.append(pool.submit(_process_shard, shard, concurrency))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
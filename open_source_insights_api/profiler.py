@@ -0,0 +1,88 @@
+import contextvars
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+# Active stage names and component, per thread and per asyncio task
+_STACK = contextvars.ContextVar('osi_profiler_stack', default=())
+_COMPONENT = contextvars.ContextVar('osi_profiler_component', default=None)
+
+
+class NullProfiler:
+    """Profiler used when profiling is off, every stage is a no-op."""
+    enabled = False
+
+    def stage(self, name, component=None):
+        return nullcontext()
+
+
+class StageProfiler:
+    """Wall time of the pipeline stages of `Sbom_Process_CLI` (purl parsing,
+    fetches, link scanning, dependency counting, table, export, ...), in total
+    and per component.
+
+    Stages nest, `stage('fetch')` inside `stage('component')` is recorded under
+    the path component;fetch, which is also what `write_collapsed` emits for
+    flamegraph tools.
+    """
+    enabled = True
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.paths = {}
+        self.components = {}
+
+    @contextmanager
+    def stage(self, name, component=None):
+        path = _STACK.get() + (name,)
+        stack_token = _STACK.set(path)
+        component_token = _COMPONENT.set(component) if component is not None else None
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            entry = self.paths.setdefault(path, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+            current = _COMPONENT.get()
+            if current is not None:
+                stages = self.components.setdefault(current, {})
+                stages[name] = stages.get(name, 0.0) + elapsed
+            if component_token is not None:
+                _COMPONENT.reset(component_token)
+            _STACK.reset(stack_token)
+
+    def summary(self):
+        """Totals per stage name over every path: calls, seconds, mean and max."""
+        stages = {}
+        for path, (count, seconds, longest) in self.paths.items():
+            entry = stages.setdefault(path[-1], {"calls": 0, "seconds": 0.0, "max": 0.0})
+            entry["calls"] += count
+            entry["seconds"] += seconds
+            entry["max"] = max(entry["max"], longest)
+        for entry in stages.values():
+            entry["mean"] = entry["seconds"] / entry["calls"]
+        return dict(sorted(stages.items(), key=lambda item: item[1]["seconds"], reverse=True))
+
+    def wall_time(self):
+        return time.perf_counter() - self.started
+
+    def write_collapsed(self, path):
+        """Collapsed stacks (`a;b;c microseconds`) of self time per stage path,
+        the input format of flamegraph.pl, speedscope and inferno. Children of
+        concurrent async stages may overlap their parent, self time is then 0.
+        """
+        children = {}
+        for stage_path, entry in self.paths.items():
+            if len(stage_path) > 1:
+                children[stage_path[:-1]] = children.get(stage_path[:-1], 0.0) + entry[1]
+        with open(path, 'w') as file:
+            for stage_path, entry in sorted(self.paths.items()):
+                self_time = max(0.0, entry[1] - children.get(stage_path, 0.0))
+                file.write(f"{';'.join(stage_path)} {int(self_time * 1_000_000)}\n")
+
+    def write_json(self, path):
+        with open(path, 'w') as file:
+            file.write(json.dumps({"wall_seconds": self.wall_time(), "stages": self.summary(), "components": self.components}, indent=4))
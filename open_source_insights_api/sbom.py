@@ -0,0 +1,139 @@
+import json
+import re
+
+# Top level arrays holding the packages, CycloneDX `components` and SPDX `packages`
+COMPONENT_KEYS = ('components', 'packages')
+
+REGEX_STRUCTURE = re.compile(r'["{}\[\]]')
+REGEX_STRING_END = re.compile(r'["\\]')
+REGEX_SPACE = re.compile(r'\s*')
+REGEX_SEPARATOR = re.compile(r'[\s,]*')
+
+
+def spdx_component(package):
+    """Map an SPDX package to the CycloneDX fields used by the CLI (name,
+    version, purl and hashes).
+    """
+    component = {"name": package.get('name'), "version": package.get('versionInfo')}
+    for ref in package.get('externalRefs') or []:
+        if ref.get('referenceType') == 'purl':
+            component['purl'] = ref.get('referenceLocator')
+            break
+    if package.get('checksums'):
+        component['hashes'] = [{"alg": checksum.get('algorithm'), "content": checksum.get('checksumValue')} for checksum in package.get('checksums')]
+    return component
+
+
+def sbom_components(sbom):
+    """Components of an SBOM already loaded as a dict, CycloneDX or SPDX."""
+    if sbom.get('components') is not None:
+        return sbom.get('components')
+    return [spdx_component(package) for package in sbom.get('packages') or []]
+
+
+class ComponentReader:
+    """Incremental reader of the components of a CycloneDX or SPDX JSON file.
+
+    Only the top level `components` (or SPDX `packages`) array is decoded, one
+    element at a time, while the file is read in chunks of `chunk_size`
+    characters, so memory stays around the size of the biggest component no
+    matter the size of the SBOM.
+    """
+    def __init__(self, file, chunk_size=1 << 16) -> None:
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+
+    def __fill(self):
+        chunk = self.file.read(self.chunk_size)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return bool(chunk)
+
+    def __search(self, regex):
+        while True:
+            match = regex.search(self.buffer, self.pos)
+            if match:
+                return match
+            self.pos = len(self.buffer)
+            if not self.__fill():
+                return None
+
+    def __read_string(self):
+        # self.pos is just after the opening quote
+        start = self.pos
+        while True:
+            match = REGEX_STRING_END.search(self.buffer, self.pos)
+            if match is None or (match[0] == '\\' and match.end() >= len(self.buffer)):
+                offset = self.pos - start
+                self.pos = start
+                if not self.__fill():
+                    raise ValueError("Unterminated string in SBOM")
+                start, self.pos = 0, offset
+                continue
+            if match[0] == '\\':
+                self.pos = match.end() + 1
+                continue
+            self.pos = match.end()
+            return json.loads('"' + self.buffer[start:match.start()] + '"')
+
+    def __skip_space(self):
+        """Move past whitespace and return the next character, '' at the end."""
+        while True:
+            self.pos = REGEX_SPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.__fill():
+                return ''
+
+    def __find_array(self):
+        """Walk the top level object until a `components`/`packages` key whose
+        value is an array, skipping every other value without decoding it.
+        """
+        depth = 0
+        while True:
+            match = self.__search(REGEX_STRUCTURE)
+            if match is None:
+                return None
+            char = match[0]
+            self.pos = match.end()
+            if char == '"':
+                text = self.__read_string()
+                # Only a string followed by ':' is a key
+                if depth == 1 and text in COMPONENT_KEYS and self.__skip_space() == ':':
+                    self.pos += 1
+                    if self.__skip_space() == '[':
+                        self.pos += 1
+                        return text
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+
+    def __iter__(self):
+        key = self.__find_array()
+        if key is None:
+            return
+        while True:
+            self.pos = REGEX_SEPARATOR.match(self.buffer, self.pos).end()
+            if self.pos >= len(self.buffer):
+                if not self.__fill():
+                    raise ValueError(f"Unterminated {key} array in SBOM")
+                continue
+            if self.buffer[self.pos] == ']':
+                return
+            try:
+                item, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.__fill():
+                    raise
+                continue
+            self.pos = end
+            yield spdx_component(item) if key == 'packages' else item
+
+
+def iter_components(file, chunk_size=1 << 16):
+    """Yield the components of an open CycloneDX/SPDX JSON file one by one."""
+    return iter(ComponentReader(file, chunk_size))
@@ -0,0 +1,314 @@
+import asyncio
+import time
+import urllib.parse
+import httpx
+from open_source_insights_api import decoder
+from open_source_insights_api.batch import async_batch, batch
+from open_source_insights_api.models import RESPONSE_MODELS
+from open_source_insights_api.os_insights import close_with_loop, query
+
+# Operations served by `InsightsService`, with the endpoint of their answer
+OPERATIONS = {
+    "GetPackage": "package",
+    "GetVersion": "version",
+    "GetRequirements": "requirements",
+    "GetDependencies": "dependencies",
+    "GetProject": "project",
+    "GetAdvisory": "advisory",
+    "Search": "query",
+}
+DEFAULT_ADDRESS = 'http://127.0.0.1:8765'
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 502: 'Bad Gateway'}
+# HTTP status of the error answers of deps.dev, a google.rpc.Status with its code
+RPC_STATUS = {3: 400, 5: 404, 11: 400}
+
+
+def answer_status(answer):
+    """HTTP status of an answer of `query`: 400 for the parameters it rejects
+    before asking deps.dev, 404 for what deps.dev or the offline cache do not
+    know, 502 for upstream failures (connection, status after retries).
+    """
+    if not isinstance(answer, dict):
+        return 200
+    error = answer.get('error')
+    if error:
+        if 'supported' in answer or 'example' in answer or error == 'Incomplete parameters':
+            return 400
+        if error.endswith('not found in cache (offline)'):
+            return 404
+        return 502
+    if isinstance(answer.get('code'), int) and answer['code'] and 'message' in answer:
+        return RPC_STATUS.get(answer['code'], 502)
+    return 200
+
+
+def parse_address(address):
+    """Base URL and Unix socket path of a service address, `http://host:port`
+    or `unix:/path/to/socket`.
+    """
+    if address.startswith('unix:'):
+        return 'http://localhost', address[len('unix:'):]
+    return address.rstrip('/'), None
+
+
+class InsightsService:
+    """Local daemon answering the operations of `query` over HTTP/1.1, on a
+    TCP port or a Unix socket, e.g. `GET /GetVersion?system_repo=npm&pkg_name=lodash&pkg_version=4.17.21`.
+
+    Every client shares the one `osi`: its pooled upstream connections, its
+    memory and persistent caches, and its single-flight of concurrent
+    requests for the same key. Answers are the JSON of `query`, with the
+    status of `answer_status` for errors. `GET /health` answers `{"status": "ok"}` and
+    `GET /stats` the summary of `stats`, an `instrumentation.Stats` hook of
+    `osi`, when given.
+    """
+    def __init__(self, osi=None, stats=None) -> None:
+        self.osi = osi if osi is not None else query()
+        self.stats = stats
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        """Listen on `path` (Unix socket) or on `host`:`port`, port 0 picks a
+        free one. Returns the address to give to `RemoteQuery`.
+        """
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path=path)
+            return f'unix:{path}'
+        self.server = await asyncio.start_server(self.handle, host=host, port=port)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f'http://{host}:{port}'
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await self.osi.aclose()
+
+    async def handle(self, reader, writer):
+        # One connection, requests are answered in turn while it is kept alive
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if headers.get('content-length'):
+                    await reader.readexactly(int(headers['content-length']))
+
+                status, answer = await self.respond(method, target)
+                body = decoder.dumps(answer)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write((
+                    f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                    f'Content-Type: application/json\r\n'
+                    f'Content-Length: {len(body)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+                ).encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target):
+        """Status and JSON answer of one request."""
+        url = urllib.parse.urlsplit(target)
+        operation = url.path.strip('/')
+        if operation == 'health':
+            return 200, {"status": "ok"}
+        if operation == 'stats':
+            return 200, self.stats.summary() if self.stats is not None else {}
+        if operation not in OPERATIONS:
+            return 404, {"error": f"Unknown operation {operation}", "supported": list(OPERATIONS)}
+        if method != 'GET':
+            return 405, {"error": f"Method {method} not allowed"}
+        try:
+            answer = await getattr(self.osi, f'async_{operation}')(**dict(urllib.parse.parse_qsl(url.query)))
+        except TypeError as error:
+            return 400, {"error": str(error)}
+        return answer_status(answer), answer
+
+
+class RemoteQuery:
+    """Thin client of an `InsightsService` (`sbom_insights serve`), with the
+    methods of `query`, sync, async and batch. Nothing is cached here, the
+    daemon holds the warm caches shared by every client.
+
+    `address` is `http://host:port` or `unix:/path/to/socket`. With
+    `models=True` answers are the classes of `models`, as with `query`.
+    """
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=60, models=False) -> None:
+        self.address = address
+        self.base_url, self.socket = parse_address(address)
+        self.timeout = httpx.Timeout(timeout)
+        self.models = models
+        self.__client = None
+        self.__async_client = None
+        self.__async_loop = None
+        self.__async_closer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    @property
+    def client(self):
+        if self.__client is None:
+            transport = httpx.HTTPTransport(uds=self.socket) if self.socket else None
+            self.__client = httpx.Client(base_url=self.base_url, timeout=self.timeout, transport=transport)
+        return self.__client
+
+    @property
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        if self.__async_client is None or self.__async_loop is not loop:
+            transport = httpx.AsyncHTTPTransport(uds=self.socket) if self.socket else None
+            self.__async_client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, transport=transport)
+            self.__async_loop = loop
+            self.__async_closer = loop.create_task(close_with_loop(self.__async_client))
+        return self.__async_client
+
+    def close(self):
+        if self.__client is not None:
+            self.__client.close()
+            self.__client = None
+
+    async def aclose(self):
+        self.close()
+        if self.__async_client is not None:
+            if self.__async_loop is asyncio.get_running_loop():
+                self.__async_closer.cancel()
+                await asyncio.gather(self.__async_closer, return_exceptions=True)
+            await self.__async_client.aclose()
+            self.__async_client = None
+
+    def __decode(self, operation, r):
+        model = RESPONSE_MODELS.get(OPERATIONS[operation]) if self.models and r.is_success else None
+        try:
+            return decoder.decode(r.content, model)
+        except decoder.DECODE_ERRORS:
+            return {"error": f"Status {r.status_code} from {self.address}"}
+
+    def __params(self, params):
+        return {name: value for name, value in params.items() if value is not None}
+
+    def call(self, operation, **params):
+        """Run `operation` (a `query` method name) on the daemon."""
+        try:
+            r = self.client.get(f'/{operation}', params=self.__params(params))
+        except httpx.TransportError:
+            return {"error": f"Connection with {self.address}"}
+        return self.__decode(operation, r)
+
+    async def async_call(self, operation, **params):
+        try:
+            r = await self.async_client.get(f'/{operation}', params=self.__params(params))
+        except httpx.TransportError:
+            return {"error": f"Connection with {self.address}"}
+        return self.__decode(operation, r)
+
+    def GetPackage(self, system_repo, pkg_name):
+        return self.call('GetPackage', system_repo=system_repo, pkg_name=pkg_name)
+
+    def GetVersion(self, system_repo, pkg_name, pkg_version):
+        return self.call('GetVersion', system_repo=system_repo, pkg_name=pkg_name, pkg_version=pkg_version)
+
+    def GetRequirements(self, system_repo, pkg_name, pkg_version):
+        return self.call('GetRequirements', system_repo=system_repo, pkg_name=pkg_name, pkg_version=pkg_version)
+
+    def GetDependencies(self, system_repo, pkg_name, pkg_version):
+        return self.call('GetDependencies', system_repo=system_repo, pkg_name=pkg_name, pkg_version=pkg_version)
+
+    def GetProject(self, repo):
+        return self.call('GetProject', repo=repo)
+
+    def GetAdvisory(self, advisor_id):
+        return self.call('GetAdvisory', advisor_id=advisor_id)
+
+    def Search(self, system_repo=None, pkg_name=None, pkg_version=None, hash_type=None, hash_value=None):
+        return self.call('Search', system_repo=system_repo, pkg_name=pkg_name, pkg_version=pkg_version, hash_type=hash_type, hash_value=hash_value)
+
+    async def async_GetPackage(self, system_repo, pkg_name):
+        return await self.async_call('GetPackage', system_repo=system_repo, pkg_name=pkg_name)
+
+    async def async_GetVersion(self, system_repo, pkg_name, pkg_version):
+        return await self.async_call('GetVersion', system_repo=system_repo, pkg_name=pkg_name, pkg_version=pkg_version)
+
+    async def async_GetRequirements(self, system_repo, pkg_name, pkg_version):
+        return await self.async_call('GetRequirements', system_repo=system_repo, pkg_name=pkg_name, pkg_version=pkg_version)
+
+    async def async_GetDependencies(self, system_repo, pkg_name, pkg_version):
+        return await self.async_call('GetDependencies', system_repo=system_repo, pkg_name=pkg_name, pkg_version=pkg_version)
+
+    async def async_GetProject(self, repo):
+        return await self.async_call('GetProject', repo=repo)
+
+    async def async_GetAdvisory(self, advisor_id):
+        return await self.async_call('GetAdvisory', advisor_id=advisor_id)
+
+    async def async_Search(self, system_repo=None, pkg_name=None, pkg_version=None, hash_type=None, hash_value=None):
+        return await self.async_call('Search', system_repo=system_repo, pkg_name=pkg_name, pkg_version=pkg_version, hash_type=hash_type, hash_value=hash_value)
+
+    def GetVersionBatch(self, keys, concurrency=20):
+        return batch(self.GetVersion, keys, concurrency)
+
+    def GetDependenciesBatch(self, keys, concurrency=20):
+        return batch(self.GetDependencies, keys, concurrency)
+
+    def GetAdvisoryBatch(self, advisor_ids, concurrency=20):
+        answers = batch(self.GetAdvisory, [(advisor_id,) for advisor_id in advisor_ids], concurrency)
+        return {key[0]: answer for key, answer in answers.items()}
+
+    def SearchHashBatch(self, hashes, concurrency=20):
+        return batch(lambda hash_type, hash_value: self.Search(hash_type=hash_type, hash_value=hash_value), hashes, concurrency)
+
+    async def async_GetVersionBatch(self, keys, concurrency=50):
+        return await async_batch(self.async_GetVersion, keys, concurrency)
+
+    async def async_GetDependenciesBatch(self, keys, concurrency=50):
+        return await async_batch(self.async_GetDependencies, keys, concurrency)
+
+    async def async_GetAdvisoryBatch(self, advisor_ids, concurrency=50):
+        answers = await async_batch(self.async_GetAdvisory, [(advisor_id,) for advisor_id in advisor_ids], concurrency)
+        return {key[0]: answer for key, answer in answers.items()}
+
+    async def async_SearchHashBatch(self, hashes, concurrency=50):
+        return await async_batch(lambda hash_type, hash_value: self.async_Search(hash_type=hash_type, hash_value=hash_value), hashes, concurrency)
+
+
+def wait_until_ready(address, timeout=10.0):
+    """Block until the daemon at `address` answers `/health`, e.g. after
+    starting `sbom_insights serve` in the background.
+    """
+    deadline = time.monotonic() + timeout
+    with RemoteQuery(address) as remote:
+        while True:
+            try:
+                if remote.client.get('/health').is_success:
+                    return True
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
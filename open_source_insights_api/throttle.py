@@ -0,0 +1,89 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+
+# Status codes worth another attempt, everything else is answered as is
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Token bucket rate limiter shared by threads and coroutines. Allows
+    `rate` requests per second on average with bursts up to `burst`.
+
+    Callers reserve a token first and then wait for it, so the waiting order
+    follows the arrival order and no caller is starved.
+    """
+    def __init__(self, rate, burst=None) -> None:
+        self.rate = rate
+        self.capacity = burst if burst else max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def __reserve(self):
+        with self.__lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self.__reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def async_acquire(self):
+        wait = self.__reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for failed requests.
+
+    `max_retries` is the default number of extra attempts per request and
+    `endpoint_retries` overrides it by endpoint (package, version, project, ...).
+    A `Retry-After` header on 429/503 answers is honoured, up to `retry_after_max`
+    seconds.
+    """
+    def __init__(self, max_retries=3, endpoint_retries=None, backoff_base=0.5, backoff_max=30, retry_after_max=120, statuses=RETRY_STATUSES) -> None:
+        self.max_retries = max_retries
+        self.endpoint_retries = endpoint_retries or {}
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.statuses = statuses
+
+    def retries(self, endpoint):
+        return self.endpoint_retries.get(endpoint, self.max_retries)
+
+    def retry_after(self, response):
+        value = response.headers.get('Retry-After') if response is not None else None
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(seconds, 0), self.retry_after_max)
+
+    def delay(self, endpoint, attempt, response=None):
+        """Seconds to wait before retrying `attempt` (0 based), or None when the
+        request should not be retried.
+        """
+        if attempt >= self.retries(endpoint):
+            return None
+        if response is not None and response.status_code not in self.statuses:
+            return None
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
@@ -0,0 +1,62 @@
+import asyncio
+
+
+class FakeQuery:
+    """Answers like deps.dev for any package, counting the calls made."""
+    def __init__(self) -> None:
+        self.calls = []
+
+    def GetPackage(self, system_repo, pkg_name):
+        self.calls.append(('GetPackage', system_repo, pkg_name))
+        return {"versions": [{"isDefault": True, "versionKey": {"version": "9.9.9"}, "publishedAt": "2023-01-01T00:00:00Z"}]}
+
+    def GetVersion(self, system_repo, pkg_name, pkg_version):
+        self.calls.append(('GetVersion', system_repo, pkg_name, pkg_version))
+        return {
+            "advisoryKeys": [{"id": "GHSA-aaaa-bbbb-cccc"}] if pkg_name.endswith('vuln') else [],
+            "licenses": [],
+            "links": [{"label": "SOURCE_REPO", "url": f"https://github.com/owner/{pkg_name.rsplit('/', 1)[-1]}"}]
+        }
+
+    def GetDependencies(self, system_repo, pkg_name, pkg_version):
+        self.calls.append(('GetDependencies', system_repo, pkg_name, pkg_version))
+        key = lambda name, version: {"system": system_repo.upper(), "name": name, "version": version}
+        return {
+            "nodes": [
+                {"versionKey": key(pkg_name, pkg_version), "relation": "SELF"},
+                {"versionKey": key("shared", "1.0.0"), "relation": "DIRECT"},
+                {"versionKey": key("leaf-vuln", "0.1.0"), "relation": "INDIRECT"},
+                {"versionKey": key("leaf", "0.1.0"), "relation": "INDIRECT"}
+            ],
+            "edges": [{"fromNode": 0, "toNode": 1}, {"fromNode": 1, "toNode": 2}, {"fromNode": 1, "toNode": 3}]
+        }
+
+    def GetVersionBatch(self, keys):
+        return {tuple(key): self.GetVersion(*key) for key in dict.fromkeys(map(tuple, keys))}
+
+    def GetAdvisory(self, advisor_id):
+        self.calls.append(('GetAdvisory', advisor_id))
+        return {"advisoryKey": {"id": advisor_id}, "aliases": ["CVE-2023-0001"], "cvss3Score": 9.8}
+
+    def GetAdvisoryBatch(self, advisor_ids):
+        return {advisor_id: self.GetAdvisory(advisor_id) for advisor_id in dict.fromkeys(advisor_ids)}
+
+    def GetProject(self, repo):
+        self.calls.append(('GetProject', repo))
+        return {"license": "MIT", "scorecard": {"overallScore": 5.5, "checks": [{"name": "Maintained", "score": 10}]}}
+
+    async def async_GetPackage(self, system_repo, pkg_name):
+        await asyncio.sleep(0.01 if pkg_name == 'slow' else 0)
+        return self.GetPackage(system_repo, pkg_name)
+
+    async def async_GetVersion(self, system_repo, pkg_name, pkg_version):
+        return self.GetVersion(system_repo, pkg_name, pkg_version)
+
+    async def async_GetDependencies(self, system_repo, pkg_name, pkg_version):
+        return self.GetDependencies(system_repo, pkg_name, pkg_version)
+
+    async def async_GetAdvisory(self, advisor_id):
+        return self.GetAdvisory(advisor_id)
+
+    async def async_GetProject(self, repo):
+        return self.GetProject(repo)
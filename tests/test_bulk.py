@@ -0,0 +1,30 @@
+from open_source_insights_api.bulk import BulkInventory, sbom_files
+from open_source_insights_api.cli import Sbom_Process_CLI
+from tests.fakes import FakeQuery
+import json
+
+
+def test_bulk_enriches_each_purl_once(tmp_path):
+    sboms = tmp_path / 'sboms'
+    (sboms / 'team').mkdir(parents=True)
+    (sboms / 'api.json').write_text(json.dumps({"components": [{"purl": "pkg:pypi/shared@1.0.0"}, {"name": "no-purl"}, {"purl": "pkg:pypi/api-only@2.0.0"}]}))
+    (sboms / 'team' / 'api.json').write_text(json.dumps({"components": [{"purl": "pkg:pypi/shared@1.0.0"}, {"purl": "pkg:pypi/shared@1.0.0"}]}))
+    (sboms / 'worker.json').write_text(json.dumps({"packages": [{"name": "shared", "externalRefs": [{"referenceType": "purl", "referenceLocator": "pkg:pypi/shared@1.0.0"}]}]}))
+    paths = sbom_files(str(sboms / '**' / '*.json'))
+    assert len(paths) == 3 and sbom_files(str(sboms)) == [str(sboms / 'api.json'), str(sboms / 'worker.json')]
+
+    inventory = BulkInventory()
+    assert [inventory.add_file(path) for path in paths] == [2, 2, 1]
+    assert inventory.stats() == {"sboms": 3, "components": 5, "unique_purls": 2}
+
+    osi = FakeQuery()
+    sbom_process = Sbom_Process_CLI(components=inventory.components(), osi=osi)
+    results = {model.purl: model for model in sbom_process.iter_process()}
+    assert len([call for call in osi.calls if call[0] == 'GetVersion']) == 2
+
+    written = inventory.write(results, str(tmp_path / 'reports'))
+    assert [path.rsplit('/', 1)[-1] for path in written] == ['api.json', 'api-2.json', 'worker.json', 'inventory.json']
+    assert [record['pkg_name'] for record in json.loads(open(written[0]).read())] == ['shared', 'api-only']
+    assert [record['pkg_name'] for record in json.loads(open(written[1]).read())] == ['shared', 'shared']
+    records = json.loads(open(written[-1]).read())
+    assert [(record['purl'], len(record['sboms'])) for record in records] == [('pkg:pypi/shared@1.0.0', 3), ('pkg:pypi/api-only@2.0.0', 1)]
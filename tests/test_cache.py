@@ -0,0 +1,44 @@
+from open_source_insights_api.cache import MemoryCache, SQLiteCache
+import sqlite3
+import time
+
+
+def test_memory_cache_lru_and_budget():
+    memory = MemoryCache(maxsize=2, max_bytes=100)
+    memory.set('a', {"v": 1}, size=10)
+    memory.set('b', {"v": 2}, size=10)
+    assert memory.get('a') == {"v": 1}
+    memory.set('c', {"v": 3}, size=10)
+    assert memory.get('b') is None
+    memory.set('d', {"v": 4}, size=95)
+    assert len(memory) == 1
+    assert memory.stats() == {"hits": 1, "misses": 1, "evictions": 3, "entries": 1, "bytes": 95}
+    memory.clear()
+    assert len(memory) == 0 and memory.bytes == 0
+
+
+def test_memory_cache_ttl():
+    memory = MemoryCache()
+    memory.set('a', {"v": 1}, ttl=0.01)
+    memory.set('b', {"v": 2})
+    time.sleep(0.02)
+    assert memory.get('a') is None
+    assert memory.get('b') == {"v": 2}
+
+
+def test_sqlite_cache_write_waits_then_gives_up(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = SQLiteCache(path, timeout=0.1)
+    cache.set('kept', {"a": 1})
+
+    # Another worker holds the write lock for longer than the timeout
+    other = sqlite3.connect(path)
+    other.execute("BEGIN IMMEDIATE")
+    cache.set('dropped', {"b": 2})
+    assert cache.get('kept') == {"a": 1}
+    other.rollback()
+    other.close()
+
+    assert cache.get('dropped') is None
+    cache.set('dropped', {"b": 2})
+    assert cache.get('dropped') == {"b": 2}
@@ -0,0 +1,273 @@
+from open_source_insights_api.cli import Sbom_Process_CLI
+from open_source_insights_api.profiler import StageProfiler
+from tests.fakes import FakeQuery
+import asyncio
+
+
+SBOM = {
+    "components": [
+        {"purl": "pkg:pypi/slow@1.0.0"},
+        {"name": "no-purl"},
+        {"purl": "pkg:npm/%40scope/vuln@2.0.0"},
+        {"purl": "pkg:pypi/fast@3.0.0"},
+    ]
+}
+
+
+def run_process(concurrency=None):
+    sbom_process = Sbom_Process_CLI(sbom_json=SBOM, osi=FakeQuery())
+    sbom_process.process(concurrency=concurrency)
+    return sbom_process
+
+
+def test_process_sequential():
+    results = run_process().all_pkgs_info
+    assert [pkg['pkg_name'] for pkg in results] == ['slow', '@scope/vuln', 'fast']
+    assert results[1].to_dict() == {
+        "pkg_name": "@scope/vuln",
+        "system": "npm",
+        "recv_version": "2.0.0",
+        "latest": "9.9.9",
+        "publishedAt": "2023-01-01T00:00:00Z",
+        "dep_dir": 1,
+        "dep_indir": 2,
+        "vulnerabilities": 1,
+        "openssf_score": 5.5,
+        "maintained": 10.0,
+        "license": "MIT",
+        "purl": "pkg:npm/%40scope/vuln@2.0.0"
+    }
+
+
+def test_process_concurrent_keeps_order():
+    assert run_process(concurrency=3).all_pkgs_info == run_process().all_pkgs_info
+
+
+def test_projects_are_fetched_once_per_repository():
+    sbom_process = Sbom_Process_CLI(sbom_json={"components": [
+        {"purl": "pkg:npm/%40babel/core@7.0.0"},
+        {"purl": "pkg:npm/%40babel/core@7.1.0"},
+        {"purl": "pkg:npm/%40other/core@1.0.0"},
+    ]}, osi=FakeQuery())
+    sbom_process.process()
+    assert [call for call in sbom_process.osi.calls if call[0] == 'GetProject'] == [('GetProject', 'github.com/owner/core')]
+    assert [pkg['license'] for pkg in sbom_process.all_pkgs_info] == ['MIT', 'MIT', 'MIT']
+
+
+def test_maven_packages_are_named_group_artifact():
+    sbom_process = Sbom_Process_CLI(sbom_json={"components": [{"purl": "pkg:maven/org.apache.commons/commons-lang3@3.12.0"}, {"purl": "pkg:npm/%40scope/vuln@2.0.0"}]}, osi=FakeQuery())
+    sbom_process.process()
+    assert [call[2] for call in sbom_process.osi.calls if call[0] == 'GetVersion'] == ['org.apache.commons:commons-lang3', '@scope/vuln']
+    assert sbom_process.all_pkgs_info[0]['pkg_name'] == 'org.apache.commons:commons-lang3'
+
+
+def test_streamed_components_and_json_output(tmp_path):
+    import io
+    import json
+    from rich.console import Console
+    from open_source_insights_api.export import write_json
+    from open_source_insights_api.sbom import iter_components
+
+    sbom_process = Sbom_Process_CLI(components=iter_components(io.StringIO(json.dumps(SBOM)), chunk_size=8), osi=FakeQuery())
+    output = tmp_path / 'output.json'
+    write_json(sbom_process.iter_process(concurrency=2, window=2), Console(file=io.StringIO()), str(output))
+    assert output.read_text() == json.dumps([pkg.to_dict() for pkg in run_process().all_pkgs_info], indent=4)
+
+    write_json([], Console(file=io.StringIO()), str(output))
+    assert output.read_text() == json.dumps([], indent=4)
+
+
+def test_ndjson_resume(tmp_path):
+    import json
+    from open_source_insights_api.export import NDJSONWriter
+
+    output = tmp_path / 'output.ndjson'
+    first = [pkg.to_dict() for pkg in run_process().all_pkgs_info]
+    output.write_text(json.dumps(first[0]) + '\n' + json.dumps(first[1])[:20])
+
+    writer = NDJSONWriter(str(output), resume=True, flush_every=1)
+    assert writer.done == 1
+    sbom_process = Sbom_Process_CLI(sbom_json=SBOM, osi=FakeQuery(), start=writer.done)
+    with writer:
+        for model in sbom_process.iter_process():
+            writer.write(model)
+    assert [call[2] for call in sbom_process.osi.calls if call[0] == 'GetPackage'] == ['@scope/vuln', 'fast']
+    assert [json.loads(line) for line in output.read_text().splitlines()] == first
+
+
+def test_ndjson_resume_keeps_repeated_purls(tmp_path):
+    from open_source_insights_api.export import NDJSONWriter
+
+    sbom = {"components": [{"purl": "pkg:pypi/a@1.0.0"}, {"purl": "pkg:pypi/b@1.0.0"}, {"purl": "pkg:pypi/a@1.0.0"}, {"purl": "pkg:pypi/c@1.0.0"}, {"purl": "pkg:pypi/b@1.0.0"}]}
+    output = tmp_path / 'output.ndjson'
+    with NDJSONWriter(str(output)) as writer:
+        for model in Sbom_Process_CLI(sbom_json=sbom, osi=FakeQuery()).iter_process():
+            writer.write(model)
+    fresh = output.read_text().splitlines()
+    output.write_text('\n'.join(fresh[:2]) + '\n')
+
+    writer = NDJSONWriter(str(output), resume=True)
+    with writer:
+        for model in Sbom_Process_CLI(sbom_json=sbom, osi=FakeQuery(), start=writer.done).iter_process():
+            writer.write(model)
+    assert output.read_text().splitlines() == fresh and len(fresh) == 5
+
+
+def test_profiler_records_stages(tmp_path):
+    for concurrency in (1, 3):
+        profiler = StageProfiler()
+        Sbom_Process_CLI(sbom_json=SBOM, osi=FakeQuery(), profiler=profiler).process(concurrency=concurrency)
+        summary = profiler.summary()
+        assert summary['component']['calls'] == 3
+        assert summary['fetch']['calls'] == 3
+        assert summary['build_model']['calls'] == 3
+        assert set(profiler.components) == {'pkg:pypi/slow@1.0.0', 'pkg:npm/%40scope/vuln@2.0.0', 'pkg:pypi/fast@3.0.0'}
+    profiler.write_collapsed(tmp_path / 'profile.collapsed')
+    assert 'component;fetch ' in (tmp_path / 'profile.collapsed').read_text()
+
+
+def test_transitive_fetches_each_unique_version_once():
+    for concurrency in (None, 3):
+        sbom_process = Sbom_Process_CLI(sbom_json=SBOM, osi=FakeQuery(), transitive=True)
+        sbom_process.process(concurrency=concurrency)
+        assert [pkg.transitive_vulnerabilities for pkg in sbom_process.all_pkgs_info] == [1, 1, 1]
+        assert sbom_process.all_pkgs_info[0].to_dict()['transitive_vulnerabilities'] == 1
+        versions = [call[1:] for call in sbom_process.osi.calls if call[0] == 'GetVersion']
+        # 3 components, then the 3 dependencies shared by the 2 PyPI trees and those of the npm tree
+        assert len(versions) == len(set(versions)) == 9
+        assert sbom_process.graph.stats()["unique_edges"] == 7
+    assert 'transitive_vulnerabilities' not in run_process().all_pkgs_info[0].to_dict()
+
+
+def test_advisories_are_fetched_once_per_sbom():
+    for concurrency in (None, 3):
+        sbom_process = Sbom_Process_CLI(sbom_json=SBOM, osi=FakeQuery(), transitive=True, advisories=True)
+        sbom_process.process(concurrency=concurrency)
+        assert [call for call in sbom_process.osi.calls if call[0] == 'GetAdvisory'] == [('GetAdvisory', 'GHSA-aaaa-bbbb-cccc')]
+        vulnerable = sbom_process.all_pkgs_info[1]
+        assert vulnerable.max_cvss == 9.8
+        assert vulnerable.to_dict()['advisories'] == [{"id": "GHSA-aaaa-bbbb-cccc", "severity": "CRITICAL", "cvss3Score": 9.8, "aliases": ["CVE-2023-0001"]}]
+        assert [len(pkg.transitive_advisories) for pkg in sbom_process.all_pkgs_info] == [1, 1, 1]
+        assert sbom_process.all_pkgs_info[0].advisories == () and sbom_process.all_pkgs_info[0].max_cvss is None
+
+
+def test_sharded_workers_keep_order():
+    expected = [pkg.to_dict() for pkg in run_process().all_pkgs_info]
+    for concurrency in (None, 2):
+        sbom_process = Sbom_Process_CLI(sbom_json=SBOM, osi=FakeQuery(), osi_factory=FakeQuery, transitive=True)
+        results = list(sbom_process.iter_process(concurrency=concurrency, workers=2, shard_size=1))
+        assert [pkg.to_dict() for pkg in results] == [dict(record, transitive_vulnerabilities=1) for record in expected]
+        # Nothing was fetched by the parent
+        assert sbom_process.osi.calls == []
+
+
+def test_export_formats(tmp_path):
+    import csv
+    import json
+    from openpyxl import load_workbook
+
+    sbom_process = Sbom_Process_CLI(sbom_json=SBOM, osi=FakeQuery(), transitive=True, advisories=True)
+    sbom_process.process()
+    sbom_process.export(str(tmp_path / 'report.csv'), 'csv')
+    rows = list(csv.DictReader(open(tmp_path / 'report.csv', newline='')))
+    assert [row['pkg_name'] for row in rows] == ['slow', '@scope/vuln', 'fast']
+    assert json.loads(rows[1]['advisories'])[0]['severity'] == 'CRITICAL'
+
+    sbom_process.export(str(tmp_path / 'report.xlsx'))
+    sheet = load_workbook(tmp_path / 'report.xlsx', read_only=True)['SBOM_INSIGHTS']
+    values = list(sheet.values)
+    assert values[0][:3] == ('pkg_name', 'system', 'recv_version')
+    assert [row[0] for row in values[1:]] == ['slow', '@scope/vuln', 'fast']
+
+
+def test_concurrent_run_closes_its_async_client(monkeypatch):
+    import httpx
+    from open_source_insights_api.os_insights import query
+
+    clients = []
+
+    class RecordingClient(httpx.AsyncClient):
+        def __init__(self, **options) -> None:
+            super().__init__(**options)
+            clients.append(self)
+
+    monkeypatch.setattr(httpx, 'AsyncClient', RecordingClient)
+    osi = query(models=True, transport=httpx.MockTransport(lambda request: httpx.Response(200, json={})))
+    for _ in range(2):
+        osi.memory.clear()
+        sbom_process = Sbom_Process_CLI(sbom_json=SBOM, osi=osi, progress=False)
+        assert len(list(sbom_process.iter_process(concurrency=2))) == 3
+    assert len(clients) == 2 and all(client.is_closed for client in clients)
+
+
+class WideQuery(FakeQuery):
+    """FakeQuery whose components depend on many versions, each with its own
+    advisory, recording the peak of their requests in flight.
+    """
+    def __init__(self, width=30) -> None:
+        super().__init__()
+        self.width = width
+        self.in_flight = 0
+        self.peak = 0
+
+    def GetDependencies(self, system_repo, pkg_name, pkg_version):
+        self.calls.append(('GetDependencies', system_repo, pkg_name, pkg_version))
+        key = lambda name: {"system": system_repo.upper(), "name": name, "version": "1.0.0"}
+        nodes = [{"versionKey": key(pkg_name), "relation": "SELF"}] + [{"versionKey": key(f"dep-{index}"), "relation": "DIRECT"} for index in range(self.width)]
+        return {"nodes": nodes, "edges": [{"fromNode": 0, "toNode": index} for index in range(1, len(nodes))]}
+
+    async def tracked(self, answer):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        return answer
+
+    def GetVersion(self, system_repo, pkg_name, pkg_version):
+        answer = super().GetVersion(system_repo, pkg_name, pkg_version)
+        if pkg_name.startswith('dep-'):
+            answer["advisoryKeys"] = [{"id": f"GHSA-{system_repo}-{pkg_name}"}]
+        return answer
+
+    async def async_GetAdvisory(self, advisor_id):
+        return await self.tracked(self.GetAdvisory(advisor_id))
+
+    async def async_GetVersion(self, system_repo, pkg_name, pkg_version):
+        if pkg_name.startswith('dep-'):
+            return await self.tracked(self.GetVersion(system_repo, pkg_name, pkg_version))
+        return self.GetVersion(system_repo, pkg_name, pkg_version)
+
+
+def test_tree_fetches_are_bounded_by_concurrency():
+    for concurrency in (1, 3):
+        osi = WideQuery()
+        sbom_process = Sbom_Process_CLI(sbom_json=SBOM, osi=osi, transitive=True)
+        sbom_process.process(concurrency=concurrency)
+        # The 30 dependencies of the PyPI and of the npm trees, each fetched once
+        assert len([call for call in osi.calls if call[0] == 'GetVersion' and call[2].startswith('dep-')]) == 60
+        assert 0 < osi.peak <= concurrency
+
+
+def test_advisory_fetches_are_bounded_by_concurrency():
+    for concurrency in (1, 3):
+        osi = WideQuery()
+        sbom_process = Sbom_Process_CLI(sbom_json=SBOM, osi=osi, transitive=True, advisories=True)
+        sbom_process.process(concurrency=concurrency)
+        advisories = [call[1] for call in osi.calls if call[0] == 'GetAdvisory']
+        assert len(advisories) == len(set(advisories)) == 61
+        assert [len(pkg.transitive_advisories) for pkg in sbom_process.all_pkgs_info] == [30, 30, 30]
+        assert 0 < osi.peak <= concurrency
+
+
+def test_export_needs_its_extra_before_the_scan(monkeypatch, capsys):
+    import pytest
+    from open_source_insights_api import cli, export
+
+    monkeypatch.setattr(export, 'EXPORT_EXTRAS', {'parquet': ('not_installed_pyarrow', 'parquet')})
+    monkeypatch.setattr(cli, 'Sbom_Process_CLI', None)
+    monkeypatch.setattr('sys.argv', ['sbom_insights', '--export', 'parquet'])
+    with pytest.raises(SystemExit):
+        cli.cli()
+    assert "--export parquet requires the 'parquet' extra (not_installed_pyarrow)" in capsys.readouterr().err
+    monkeypatch.setattr('sys.argv', ['sbom_insights', '--export', 'csv'])
+    assert cli.args().export == 'csv'
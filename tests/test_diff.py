@@ -0,0 +1,78 @@
+from open_source_insights_api.cli import Sbom_Process_CLI
+from open_source_insights_api.diff import DifferentialScan, load_results
+from open_source_insights_api.export import as_record
+from tests.fakes import FakeQuery
+import json
+
+
+def scan(components, diff=None, concurrency=None):
+    osi = FakeQuery()
+    if diff is None:
+        return osi, list(Sbom_Process_CLI(components=components, osi=osi).iter_process())
+    sbom_process = Sbom_Process_CLI(components=diff.track(components), osi=osi, skip=diff.carried)
+    return osi, list(diff.merge(sbom_process.iter_process(concurrency=concurrency)))
+
+
+def previous_results():
+    _, models = scan([{"purl": "pkg:npm/kept@1.0.0"}, {"purl": "pkg:npm/upgraded@1.0.0"}, {"purl": "pkg:npm/expired@1.0.0"}, {"purl": "pkg:npm/gone@1.0.0"}])
+    previous = [as_record(model) for model in models]
+    previous[0]['scanned_at'] = previous[1]['scanned_at'] = '2100-01-01T00:00:00+00:00'
+    previous[2].update(scanned_at='2000-01-01T00:00:00+00:00', latest='1.0.0', openssf_score=4.0)
+    return previous
+
+
+def test_only_changed_and_expired_components_are_enriched():
+    components = [{"purl": "pkg:npm/added-vuln@1.0.0"}, {"purl": "pkg:npm/kept@1.0.0"}, {"purl": "pkg:npm/upgraded@2.0.0"}, {"purl": "pkg:npm/expired@1.0.0"}, {"purl": "pkg:npm/kept@1.0.0"}]
+    for concurrency in (None, 2):
+        diff = DifferentialScan(previous_results())
+        osi, models = scan(components, diff, concurrency)
+        assert sorted(call[2] for call in osi.calls if call[0] == 'GetVersion') == ['added-vuln', 'expired', 'upgraded']
+        assert [model.purl for model in models] == [comp['purl'] for comp in components]
+        assert models[1].scanned_at == '2100-01-01T00:00:00+00:00' and models[0].scanned_at > '2000'
+
+        summary = diff.summary()
+        assert (summary['carried_over'], summary['enriched']) == (2, 3)
+        assert summary['added'] == ['pkg:npm/added-vuln@1.0.0'] and summary['removed'] == ['pkg:npm/gone@1.0.0']
+        assert summary['changed'] == [{"purl": "pkg:npm/upgraded@2.0.0", "from": "1.0.0", "to": "2.0.0"}]
+        assert summary['new_vulnerabilities'] == [{"purl": "pkg:npm/added-vuln@1.0.0", "from": None, "to": 1}]
+        assert summary['latest_drift'] == [{"purl": "pkg:npm/expired@1.0.0", "from": "1.0.0", "to": "9.9.9"}]
+        assert summary['score_changes'] == [{"purl": "pkg:npm/expired@1.0.0", "from": 4.0, "to": 5.5}]
+
+
+def test_merge_streams_in_sbom_order():
+    diff = DifferentialScan(previous_results())
+    read = []
+
+    def components():
+        for purl in ("pkg:npm/kept@1.0.0", "pkg:npm/added@1.0.0", "pkg:npm/kept@1.0.0", "pkg:npm/upgraded@1.0.0", "pkg:npm/other@1.0.0"):
+            read.append(purl)
+            yield {"purl": purl}
+
+    sbom_process = Sbom_Process_CLI(components=diff.track(components()), osi=FakeQuery(), skip=diff.carried)
+    results = diff.merge(sbom_process.iter_process())
+    # Records come out as soon as their turn is reached, without reading the whole SBOM
+    assert [next(results).purl for _ in range(2)] == ["pkg:npm/kept@1.0.0", "pkg:npm/added@1.0.0"]
+    assert len(read) == 2
+    assert [model.purl for model in results] == ["pkg:npm/kept@1.0.0", "pkg:npm/upgraded@1.0.0", "pkg:npm/other@1.0.0"]
+
+    # Components already written by a resumed scan are neither enriched nor merged
+    diff = DifferentialScan(previous_results())
+    components = [{"purl": "pkg:npm/added@1.0.0"}, {"purl": "pkg:npm/kept@1.0.0"}, {"purl": "pkg:npm/other@1.0.0"}]
+    sbom_process = Sbom_Process_CLI(components=diff.track(components, start=1), osi=FakeQuery(), skip=diff.carried, start=1)
+    assert [model.purl for model in diff.merge(sbom_process.iter_process())] == ["pkg:npm/kept@1.0.0", "pkg:npm/other@1.0.0"]
+    assert 'pkg:npm/added@1.0.0' not in diff.summary()['removed']
+
+
+def test_previous_results_files(tmp_path):
+    records = [{"purl": "pkg:pypi/requests@2.31.0", "pkg_name": "requests"}, {"purl": "pkg:pypi/idna@3.4", "pkg_name": "idna"}]
+    (tmp_path / 'output.json').write_text(json.dumps(records))
+    (tmp_path / 'output.ndjson').write_text("\n".join(json.dumps(record) for record in records) + '\n{"purl": "pkg:pypi/cut')
+    assert load_results(str(tmp_path / 'output.json')) == load_results(str(tmp_path / 'output.ndjson')) == records
+
+    # Records without scanned_at date from the file, just written
+    diff = DifferentialScan.from_file(str(tmp_path / 'output.ndjson'))
+    diff.track([{"purl": "pkg:pypi/requests@2.31.0"}, {"purl": "pkg:pypi/idna@3.7"}])
+    assert diff.carried == {"pkg:pypi/requests@2.31.0"}
+    expired = DifferentialScan.from_file(str(tmp_path / 'output.json'), max_age=0)
+    expired.track(records)
+    assert expired.carried == set()
@@ -0,0 +1,59 @@
+from open_source_insights_api.graph import Graph, SBOMGraph
+from open_source_insights_api.models import DependencyGraph
+
+
+def node(name, version, relation):
+    return {"versionKey": {"system": "NPM", "name": name, "version": version}, "relation": relation}
+
+
+def edge(from_node, to_node):
+    return {"fromNode": from_node, "toNode": to_node, "requirement": "*"}
+
+
+# app -> express -> qs -> side-channel, app -> lodash, express -> lodash
+APP = {
+    "nodes": [node("app", "1.0.0", "SELF"), node("express", "4.18.2", "DIRECT"), node("lodash", "4.17.21", "DIRECT"), node("qs", "6.11.0", "INDIRECT"), node("side-channel", "1.0.4", "INDIRECT")],
+    "edges": [edge(0, 1), edge(0, 2), edge(1, 3), edge(1, 2), edge(3, 4)]
+}
+# tool -> chalk -> lodash
+TOOL = {
+    "nodes": [node("tool", "2.0.0", "SELF"), node("chalk", "5.0.0", "DIRECT"), node("lodash", "4.17.21", "INDIRECT")],
+    "edges": [edge(0, 1), edge(1, 2)]
+}
+
+
+def test_graph_queries():
+    graph = Graph(APP)
+    assert list(graph.children(0)) == [1, 2]
+    assert graph.depth_histogram() == {1: 2, 2: 1, 3: 1}
+    assert graph.closure(("NPM", "express", "4.18.2")) == {("NPM", "qs", "6.11.0"), ("NPM", "side-channel", "1.0.4"), ("NPM", "lodash", "4.17.21")}
+    assert len(graph.closure()) == 4
+    assert graph.shortest_path([("NPM", "side-channel", "1.0.4")]) == [
+        ("NPM", "app", "1.0.0"), ("NPM", "express", "4.18.2"), ("NPM", "qs", "6.11.0"), ("NPM", "side-channel", "1.0.4")
+    ]
+    assert graph.shortest_path(lambda key: key[1] == "missing") is None
+    assert len(Graph(DependencyGraph.from_dict(APP))) == 5
+
+
+def test_sbom_graph_fan_in_and_dependents():
+    sbom = SBOMGraph()
+    sbom.add("pkg:npm/app@1.0.0", APP)
+    sbom.add("pkg:npm/tool@2.0.0", TOOL)
+    # Shared keys are interned once
+    assert len(sbom.keys) == 7
+    assert sbom.fan_in(top=1) == [(("NPM", "lodash", "4.17.21"), 2)]
+    assert sbom.dependents("lodash") == {
+        "pkg:npm/app@1.0.0": [("NPM", "app", "1.0.0"), ("NPM", "lodash", "4.17.21")],
+        "pkg:npm/tool@2.0.0": [("NPM", "tool", "2.0.0"), ("NPM", "chalk", "5.0.0"), ("NPM", "lodash", "4.17.21")]
+    }
+    assert list(sbom.dependents("qs", "6.11.0")) == ["pkg:npm/app@1.0.0"]
+    assert sbom.dependents("qs", "0.0.1") == {}
+    assert sbom.depth_histogram() == {1: 3, 2: 2, 3: 1}
+
+
+def test_sbom_graph_stores_shared_nodes_and_edges_once():
+    sbom = SBOMGraph()
+    sbom.add("pkg:npm/app@1.0.0", APP)
+    assert list(sbom.add("pkg:npm/app-copy@1.0.0", APP)) == list(sbom.members[0])
+    assert sbom.stats() == {"components": 2, "nodes": 10, "unique_nodes": 5, "unique_edges": 5}
+    assert sbom.closure("pkg:npm/app-copy@1.0.0") == Graph(APP).closure()
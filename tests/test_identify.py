@@ -0,0 +1,71 @@
+from open_source_insights_api.cli import Sbom_Process_CLI
+from open_source_insights_api.identify import HashIdentifier, best_candidate, component_hashes, hash_value, version_purl
+from open_source_insights_api.os_insights import query
+from tests.fakes import FakeQuery
+import base64
+import httpx
+
+SHA1 = 'a9993e364706816aba3e25717850c26c9cd0d89d'
+SHA256 = 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad'
+KNOWN = base64.b64encode(bytes.fromhex(SHA256)).decode()
+
+
+def result(system, name, version, default=False):
+    return {"version": {"versionKey": {"system": system, "name": name, "version": version}, "isDefault": default}}
+
+
+class HashQuery(FakeQuery):
+    """FakeQuery whose query endpoint knows one SHA256."""
+    def SearchHashBatch(self, hashes, concurrency=20):
+        answers = {}
+        for key in dict.fromkeys(hashes):
+            self.calls.append(('Search',) + key)
+            answers[key] = {"results": [
+                result("MAVEN", "org.other:fork", "1.0.0", default=True),
+                result("MAVEN", "org.example:lib", "2.0.0"),
+                result("MAVEN", "org.example:lib", "2.1.0")
+            ]} if key == ('SHA256', KNOWN) else {"results": []}
+        return answers
+
+
+def test_hashes_and_candidates():
+    assert hash_value(SHA256) == KNOWN and hash_value(KNOWN) == KNOWN and hash_value('not a hash!') is None
+    assert hash_value('') is None and hash_value('  ') is None and hash_value(None) is None
+    assert component_hashes({"hashes": [{"alg": "SHA-1", "content": " "}, {"alg": "SHA-256", "content": SHA256}]}) == [('SHA256', KNOWN)]
+    component = {"name": "lib", "version": "2.1.0", "hashes": [{"alg": "SHA-256", "content": SHA256}, {"alg": "SHA-1", "content": SHA1}, {"alg": "SHA-384", "content": SHA1}]}
+    assert [hash_type for hash_type, _ in component_hashes(component)] == ['SHA1', 'SHA256']
+    answer = HashQuery().SearchHashBatch([('SHA256', KNOWN)])[('SHA256', KNOWN)]
+    assert best_candidate(answer, component) == ("MAVEN", "org.example:lib", "2.1.0")
+    # Without a name or version the default version wins
+    assert best_candidate(answer) == ("MAVEN", "org.other:fork", "1.0.0")
+    assert best_candidate({"results": []}) is None and best_candidate({"error": "x"}) is None
+    assert version_purl("MAVEN", "org.example:lib", "2.1.0") == 'pkg:maven/org.example/lib@2.1.0'
+    assert version_purl("NPM", "@scope/pkg", "1.0.0") == 'pkg:npm/%40scope/pkg@1.0.0'
+
+
+def test_components_identified_by_hash_are_enriched():
+    component = {"name": "lib", "version": "2.0.0", "hashes": [{"alg": "SHA-1", "content": SHA1}, {"alg": "SHA-256", "content": SHA256}]}
+    sbom = {"components": [component, dict(component), {"name": "unknown", "hashes": [{"alg": "MD5", "content": "00" * 16}]}, {"purl": "pkg:pypi/fast@3.0.0"}]}
+    osi = HashQuery()
+    sbom_process = Sbom_Process_CLI(sbom_json=sbom, osi=osi, identify_hashes=True)
+    sbom_process.process()
+    # Every distinct hash is asked once, the SHA256 only for components the SHA1 did not identify
+    assert [call[1] for call in osi.calls if call[0] == 'Search'] == ['SHA1', 'MD5', 'SHA256']
+    assert [pkg.purl for pkg in sbom_process.all_pkgs_info] == ['pkg:maven/org.example/lib@2.0.0', 'pkg:maven/org.example/lib@2.0.0', 'pkg:pypi/fast@3.0.0']
+    assert ('GetVersion', 'maven', 'org.example:lib', '2.0.0') in osi.calls
+    assert (sbom_process.identifier.identified, sbom_process.identifier.unknown) == (2, 1)
+
+    streamed = HashIdentifier(HashQuery(), chunk_size=1).fill(iter(sbom["components"]))
+    assert [comp.get('purl') for comp in streamed] == ['pkg:maven/org.example/lib@2.0.0', 'pkg:maven/org.example/lib@2.0.0', None, 'pkg:pypi/fast@3.0.0']
+
+
+def test_search_hash_batch_encodes_values_once():
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.params['hash.value'])
+        return httpx.Response(200, json={"results": []})
+
+    answers = query(transport=httpx.MockTransport(handler)).SearchHashBatch([('SHA256', KNOWN), ('SHA256', KNOWN)])
+    assert answers == {('SHA256', KNOWN): {"results": []}}
+    assert seen == [KNOWN]
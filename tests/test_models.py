@@ -0,0 +1,112 @@
+from open_source_insights_api import decoder
+from open_source_insights_api.cache import SQLiteCache
+from open_source_insights_api.models import AdvisoryInfo, ComponentInsight, cvss_severity, DependencyGraph, PackageInfo, ProjectInfo, VersionInfo
+from open_source_insights_api.os_insights import query
+import httpx
+import json
+import pytest
+
+DEPENDENCIES = {
+    "nodes": [
+        {"versionKey": {"system": "NPM", "name": "app", "version": "1.0.0"}, "bundled": False, "relation": "SELF", "errors": []},
+        {"versionKey": {"system": "NPM", "name": "left-pad", "version": "1.3.0"}, "bundled": False, "relation": "DIRECT", "errors": []},
+        {"versionKey": {"system": "NPM", "name": "tiny", "version": "0.1.0"}, "bundled": False, "relation": "INDIRECT", "errors": []}
+    ],
+    "edges": [{"fromNode": 0, "toNode": 1, "requirement": "^1.3.0"}, {"fromNode": 1, "toNode": 2, "requirement": "~0.1.0"}],
+    "error": ""
+}
+PROJECT = {
+    "projectKey": {"id": "github.com/owner/app"},
+    "openIssuesCount": 3,
+    "license": "MIT",
+    "scorecard": {"overallScore": 6.1, "checks": [{"name": "Maintained", "score": 10, "reason": "active"}]}
+}
+
+
+@pytest.fixture(params=['msgspec', 'orjson', 'json'])
+def backend(request, monkeypatch):
+    # Run with every backend, forcing the fallbacks even when all are installed
+    if request.param == 'json':
+        monkeypatch.setattr(decoder, 'orjson', None)
+    if request.param != 'msgspec':
+        monkeypatch.setattr(decoder, 'msgspec', None)
+    elif decoder.msgspec is None:
+        pytest.skip("msgspec not installed")
+    return request.param
+
+
+def test_typed_decoding_keeps_used_fields(backend):
+    graph = decoder.decode(json.dumps(DEPENDENCIES).encode(), DependencyGraph)
+    assert graph == DependencyGraph(
+        nodes=(('NPM', 'app', '1.0.0', 'SELF'), ('NPM', 'left-pad', '1.3.0', 'DIRECT'), ('NPM', 'tiny', '0.1.0', 'INDIRECT')),
+        edges=((0, 1, '^1.3.0'), (1, 2, '~0.1.0'))
+    )
+    assert DependencyGraph.from_dict(graph.to_dict()) == graph
+
+    project = decoder.decode(json.dumps(PROJECT), ProjectInfo)
+    assert project == ProjectInfo(id='github.com/owner/app', license='MIT', score=6.1, checks=(('Maintained', 10),))
+    assert decoder.decode(b'{"packageKey": {"system": "NPM", "name": "app"}}', PackageInfo) == PackageInfo('NPM', 'app', ())
+    assert decoder.loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+
+
+def test_query_returns_models_and_caches_raw_bodies(tmp_path):
+    def handler(request):
+        if request.url.path.endswith(':dependencies'):
+            return httpx.Response(200, json=DEPENDENCIES)
+        return httpx.Response(404, json={"code": 5, "message": "not found"})
+
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    with query(transport=httpx.MockTransport(handler), cache=cache, models=True) as osi:
+        graph = osi.GetDependencies('npm', 'app', '1.0.0')
+        assert isinstance(graph, DependencyGraph) and len(graph.nodes) == 3
+        assert osi.GetVersion('npm', 'app', '9.9.9') == {"code": 5, "message": "not found"}
+
+    # The persistent cache keeps the whole body, untyped clients read it too
+    with query(transport=httpx.MockTransport(handler), cache=cache, offline=True) as osi:
+        assert osi.GetDependencies('npm', 'app', '1.0.0') == DEPENDENCIES
+    with query(transport=httpx.MockTransport(handler), cache=cache, offline=True, models=True) as osi:
+        assert osi.GetDependencies('npm', 'app', '1.0.0') == graph
+    cache.close()
+
+
+def test_component_insight_derives_fields_once():
+    package = {"versions": [
+        {"versionKey": {"version": "1.0.0"}, "publishedAt": "2022-01-01T00:00:00Z"},
+        {"versionKey": {"version": "2.0.0"}, "publishedAt": "2023-01-01T00:00:00Z", "isDefault": True}
+    ]}
+    version = {"licenses": [], "advisoryKeys": [{"id": "GHSA-aaaa-bbbb-cccc"}], "links": [{"label": "SOURCE_REPO", "url": "https://github.com/owner/app"}]}
+    typed = ComponentInsight.from_responses(
+        'app', 'npm', '1.0.0', 'pkg:npm/app@1.0.0',
+        PackageInfo.from_dict(package), VersionInfo.from_dict(version), DependencyGraph.from_dict(DEPENDENCIES), ProjectInfo.from_dict(PROJECT)
+    )
+    assert typed == ComponentInsight.from_responses('app', 'npm', '1.0.0', 'pkg:npm/app@1.0.0', package, version, DEPENDENCIES, PROJECT)
+    assert typed.to_dict() == {
+        "pkg_name": "app",
+        "system": "npm",
+        "recv_version": "1.0.0",
+        "latest": "2.0.0",
+        "publishedAt": "2023-01-01T00:00:00Z",
+        "dep_dir": 1,
+        "dep_indir": 1,
+        "vulnerabilities": 1,
+        "openssf_score": 6.1,
+        "maintained": 10.0,
+        "license": "MIT",
+        "purl": "pkg:npm/app@1.0.0"
+    }
+    assert typed['publishedAt'] == typed.get('publishedAt') == "2023-01-01T00:00:00Z"
+    assert ComponentInsight.from_dict(typed.to_dict()) == typed
+    assert VersionInfo.from_dict(version).source_repo == "https://github.com/owner/app"
+    # Error answers read as empty ones
+    assert ComponentInsight.from_responses('app', 'npm', '1.0.0', None, {"error": "x"}, {"error": "x"}, {"error": "x"}, {}).dep_dir == 0
+
+
+def test_advisory_severity(backend):
+    body = {
+        "advisoryKey": {"id": "GHSA-aaaa-bbbb-cccc"}, "url": "https://osv.dev/GHSA-aaaa-bbbb-cccc", "title": "ReDoS",
+        "aliases": ["CVE-2023-0001"], "cvss3Score": 5.3, "cvss3Vector": "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:N/I:N/A:L"
+    }
+    advisory = decoder.decode(json.dumps(body).encode(), AdvisoryInfo)
+    assert advisory == AdvisoryInfo.from_dict(body)
+    assert (advisory.id, advisory.aliases, advisory.severity) == ("GHSA-aaaa-bbbb-cccc", ("CVE-2023-0001",), "MEDIUM")
+    assert [cvss_severity(score) for score in (None, 0, 3.9, 4.0, 7.0, 9.0)] == [None, "NONE", "LOW", "MEDIUM", "HIGH", "CRITICAL"]
@@ -0,0 +1,196 @@
+from open_source_insights_api.os_insights import query
+from open_source_insights_api.throttle import RetryPolicy
+import asyncio
+import httpx
+
+
+def make_query(requests_seen):
+    def handler(request):
+        requests_seen.append(request)
+        return httpx.Response(200, json={"path": request.url.path})
+    return query(transport=httpx.MockTransport(handler))
+
+
+def test_sync_methods_share_one_client():
+    seen = []
+    with make_query(seen) as osi:
+        client = osi.client
+        assert osi.GetPackage('pypi', 'requests') == {"path": "/v3alpha/systems/pypi/packages/requests"}
+        assert osi.GetVersion('pypi', 'requests', '2.30.0') == {"path": "/v3alpha/systems/pypi/packages/requests/versions/2.30.0"}
+        assert osi.client is client
+    assert len(seen) == 2
+
+
+def test_async_methods_share_one_client():
+    seen = []
+
+    async def main():
+        async with make_query(seen) as osi:
+            client = osi.async_client
+            results = await asyncio.gather(
+                osi.async_GetPackage('npm', 'braces'),
+                osi.async_GetProject('github.com/micromatch/braces')
+            )
+            assert osi.async_client is client
+            return results
+
+    assert asyncio.run(main()) == [
+        {"path": "/v3alpha/systems/npm/packages/braces"},
+        {"path": "/v3alpha/projects/github.com/micromatch/braces"}
+    ]
+    assert len(seen) == 2
+
+
+def test_connection_error_is_reported():
+    def handler(request):
+        raise httpx.ConnectError("offline", request=request)
+
+    osi = query(transport=httpx.MockTransport(handler), retry=RetryPolicy(max_retries=0))
+    assert osi.GetAdvisory('GHSA-xxxx-xxxx-xxxx') == {"error": "Connection with https://api.deps.dev/v3alpha/advisories/GHSA-xxxx-xxxx-xxxx"}
+
+
+def test_persistent_cache_and_offline(tmp_path):
+    from open_source_insights_api.cache import SQLiteCache, DirectoryCache
+
+    for backend in (SQLiteCache(str(tmp_path / 'cache.sqlite3')), DirectoryCache(str(tmp_path / 'responses'))):
+        seen = []
+        osi = make_query(seen)
+        osi.cache = backend
+        assert osi.GetVersion('pypi', 'requests', '2.30.0') == {"path": "/v3alpha/systems/pypi/packages/requests/versions/2.30.0"}
+        assert query(transport=osi.transport, cache=backend).GetVersion('pypi', 'requests', '2.30.0') == {"path": "/v3alpha/systems/pypi/packages/requests/versions/2.30.0"}
+        assert len(seen) == 1
+
+        offline = query(transport=osi.transport, cache=backend, offline=True)
+        assert offline.Search(system_repo='pypi', pkg_name='requests', pkg_version='2.30.0')['error'].endswith('not found in cache (offline)')
+        assert len(seen) == 1
+
+        expired = query(transport=osi.transport, cache=backend, cache_ttl={"version": -1})
+        expired.GetVersion('pypi', 'requests', '2.30.0')
+        assert len(seen) == 2
+        backend.close()
+
+
+def test_async_lookups_are_coalesced_and_reusable():
+    seen = []
+
+    async def handler(request):
+        seen.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"path": request.url.path})
+
+    osi = query(transport=httpx.MockTransport(handler))
+    versions = ['1.8.0', '1.8.1', '2.0.0']
+
+    async def main():
+        first = await asyncio.gather(*[osi.async_GetDependencies('npm', 'braces', v) for v in versions * 50])
+        again = await osi.async_GetDependencies('npm', 'braces', '1.8.0')
+        return first, again
+
+    first, again = asyncio.run(main())
+    assert len(first) == 150
+    assert again == first[0]
+    assert len(seen) == 3
+
+
+def test_sync_and_async_share_memory_cache():
+    seen = []
+    osi = make_query(seen)
+    sync_result = osi.GetProject('github.com/micromatch/braces')
+    assert asyncio.run(osi.async_GetProject('github.com/micromatch/braces')) is sync_result
+    assert len(seen) == 1
+    assert osi.memory.stats()["hits"] == 1
+    osi.memory.clear()
+    osi.GetProject('github.com/micromatch/braces')
+    assert len(seen) == 2
+
+
+def test_version_batch():
+    seen = []
+    osi = make_query(seen)
+    keys = [('npm', 'braces', '2.0.0'), ('npm', 'braces', '1.8.0'), ['npm', 'braces', '2.0.0']]
+    results = osi.GetVersionBatch(keys)
+    assert list(results) == [('npm', 'braces', '2.0.0'), ('npm', 'braces', '1.8.0')]
+    assert results[('npm', 'braces', '1.8.0')] == {"path": "/v3alpha/systems/npm/packages/braces/versions/1.8.0"}
+    assert asyncio.run(osi.async_GetDependenciesBatch(keys, concurrency=2)) == {
+        key: {"path": f"/v3alpha/systems/npm/packages/braces/versions/{key[2]}:dependencies"} for key in results
+    }
+    assert len(seen) == 4
+
+
+def test_retries_throttled_and_failing_requests():
+    statuses = [429, 503, 200]
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        status = statuses.pop(0) if statuses else 500
+        return httpx.Response(status, json={"status": status}, headers={"Retry-After": "0"})
+
+    osi = query(transport=httpx.MockTransport(handler), retry=RetryPolicy(max_retries=2, endpoint_retries={"project": 1}, backoff_base=0), rate_limit=1000)
+    assert osi.GetPackage('npm', 'braces') == {"status": 200}
+    assert len(seen) == 3
+    assert osi.GetProject('github.com/micromatch/braces') == {
+        "error": "Status 500 from https://api.deps.dev/v3alpha/projects/github.com%2fmicromatch%2fbraces after retries",
+        "status": 500
+    }
+    assert len(seen) == 5
+    assert len(osi.memory) == 1
+
+
+def test_request_hooks_and_stats():
+    from open_source_insights_api.instrumentation import Stats
+
+    stats = Stats()
+    events = []
+    seen = []
+    osi = make_query(seen)
+    osi.hooks += [stats, events.append]
+    osi.GetPackage('npm', 'braces')
+    osi.GetPackage('npm', 'braces')
+    asyncio.run(osi.async_GetVersion('npm', 'braces', '2.0.0'))
+
+    assert [(event.endpoint, event.cache, event.status) for event in events] == [('package', 'miss', 200), ('package', 'memory', None), ('version', 'miss', 200)]
+    assert 'decode' in events[0].phases
+    summary = stats.summary()
+    assert summary['package']['requests'] == 2 and summary['package']['cache_hits'] == 1
+    assert summary['version']['bytes'] == events[2].bytes > 0
+    assert 'osi_requests_total{endpoint="package"} 2' in stats.to_prometheus()
+
+
+def test_async_lookups_count_one_memory_lookup():
+    from open_source_insights_api.instrumentation import Stats
+
+    stats = Stats()
+    osi = make_query([])
+    osi.hooks.append(stats)
+
+    async def main():
+        await osi.async_GetPackage('npm', 'braces')
+        assert (osi.memory.stats()["hits"], osi.memory.stats()["misses"]) == (0, 1)
+        await osi.async_GetPackage('npm', 'braces')
+
+    asyncio.run(main())
+    assert (osi.memory.stats()["hits"], osi.memory.stats()["misses"]) == (1, 1)
+    summary = stats.summary()['package']
+    assert (summary['requests'], summary['cache_hits']) == (2, 1)
+
+
+def test_async_client_is_closed_with_its_event_loop():
+    osi = make_query([])
+
+    async def lookup():
+        await osi.async_GetPackage('npm', 'braces')
+        return osi.async_client
+
+    first = asyncio.run(lookup())
+    # The client of a finished loop is closed, not just replaced
+    assert first.is_closed
+    second = asyncio.run(lookup())
+    assert second is not first and second.is_closed
+
+    async def closed_by_aclose():
+        client = await lookup()
+        await osi.aclose()
+        assert client.is_closed and not asyncio.all_tasks() - {asyncio.current_task()}
+
+    asyncio.run(closed_by_aclose())
@@ -0,0 +1,31 @@
+from open_source_insights_api.sbom import iter_components, sbom_components
+import io
+import json
+
+
+def test_iter_components_skips_other_keys():
+    sbom = {
+        "bomFormat": "CycloneDX",
+        "metadata": {"component": {"name": "app"}, "components": [{"purl": "pkg:pypi/nested@1"}]},
+        "note": "\"components\": [",
+        "serialNumber": 5,
+        "components": [{"purl": "pkg:pypi/anyio@4.0.0", "name": "é\"x"}] * 20 + [{"purl": "pkg:npm/braces@2.0.0"}],
+        "dependencies": [{"ref": "a"}]
+    }
+    text = json.dumps(sbom, indent=2)
+    for chunk_size in (1, 7, 1 << 16):
+        assert list(iter_components(io.StringIO(text), chunk_size)) == sbom["components"]
+    assert list(iter_components(io.StringIO('{"components": []}'))) == []
+    assert list(iter_components(io.StringIO('{"metadata": {}}'))) == []
+
+
+def test_spdx_packages():
+    sbom = {"spdxVersion": "SPDX-2.3", "packages": [{
+        "name": "requests",
+        "versionInfo": "2.30.0",
+        "externalRefs": [{"referenceType": "purl", "referenceLocator": "pkg:pypi/requests@2.30.0"}],
+        "checksums": [{"algorithm": "SHA1", "checksumValue": "abcd"}]
+    }]}
+    expected = [{"name": "requests", "version": "2.30.0", "purl": "pkg:pypi/requests@2.30.0", "hashes": [{"alg": "SHA1", "content": "abcd"}]}]
+    assert list(iter_components(io.StringIO(json.dumps(sbom)), 3)) == expected
+    assert sbom_components(sbom) == expected
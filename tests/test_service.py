@@ -0,0 +1,73 @@
+from open_source_insights_api.models import VersionInfo
+from open_source_insights_api.os_insights import query
+from open_source_insights_api.service import InsightsService, RemoteQuery, wait_until_ready
+from open_source_insights_api.throttle import RetryPolicy
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import httpx
+import threading
+import time
+
+
+def run_service(path=None, statuses=None):
+    """Start an InsightsService over a fake deps.dev in a background thread,
+    returning its address and the upstream requests seen. `statuses` maps
+    package names to the error status deps.dev answers for them.
+    """
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.path)
+        status = (statuses or {}).get(request.url.path.split('/')[5])
+        if status is not None:
+            return httpx.Response(status, json={"code": {400: 3, 404: 5}.get(status, 13), "message": "error"})
+        time.sleep(0.05)
+        return httpx.Response(200, json={"licenses": ["MIT"], "advisoryKeys": [], "links": [], "path": request.url.path})
+
+    loop = asyncio.new_event_loop()
+    service = InsightsService(query(transport=httpx.MockTransport(handler), retry=RetryPolicy(max_retries=0)))
+    address = loop.run_until_complete(service.start(port=0, path=path))
+    threading.Thread(target=loop.run_until_complete, args=(service.serve_forever(),), daemon=True).start()
+    assert wait_until_ready(address)
+    return address, seen
+
+
+def test_clients_share_one_upstream_request(tmp_path):
+    for path in (None, str(tmp_path / 'osi.sock')):
+        address, seen = run_service(path)
+        with RemoteQuery(address) as remote:
+            with ThreadPoolExecutor(8) as executor:
+                answers = list(executor.map(lambda _: remote.GetVersion('npm', 'lodash', '4.17.21'), range(8)))
+            assert answers == [answers[0]] * 8
+            assert answers[0]["path"] == "/v3alpha/systems/npm/packages/lodash/versions/4.17.21"
+            # Concurrent callers were coalesced, later ones hit the warm memory cache
+            assert seen == ["/v3alpha/systems/npm/packages/lodash/versions/4.17.21"]
+            assert remote.GetVersion('nope', 'lodash', '1') == {"error": "System repository not supported", "supported": query().systems}
+            assert remote.call('GetVersion', system_repo='npm') == {"error": "query.async_GetVersion() missing 2 required positional arguments: 'pkg_name' and 'pkg_version'"}
+
+
+def test_async_batch_and_models():
+    address, seen = run_service()
+
+    async def main():
+        async with RemoteQuery(address, models=True) as remote:
+            return await remote.async_GetVersionBatch([('npm', 'a', '1'), ('npm', 'b', '1'), ('npm', 'a', '1')])
+
+    answers = asyncio.run(main())
+    assert list(answers) == [('npm', 'a', '1'), ('npm', 'b', '1')]
+    assert all(isinstance(answer, VersionInfo) and answer.license == "MIT" for answer in answers.values())
+    assert len(seen) == 2
+
+
+def test_error_statuses():
+    address, seen = run_service(statuses={"missing": 404, "bad": 400, "broken": 503})
+    with RemoteQuery(address) as remote:
+        status = lambda path: remote.client.get(path).status_code
+        assert status('/GetPackage?system_repo=npm&pkg_name=lodash') == 200
+        assert status('/GetPackage?system_repo=nope&pkg_name=lodash') == 400
+        assert status('/GetAdvisory?advisor_id=nope') == 400
+        assert status('/GetPackage?system_repo=npm') == 400
+        assert status('/GetPackage?system_repo=npm&pkg_name=missing') == 404
+        assert status('/GetPackage?system_repo=npm&pkg_name=bad') == 400
+        assert status('/GetPackage?system_repo=npm&pkg_name=broken') == 502
+        assert remote.GetPackage('npm', 'missing') == {"code": 5, "message": "error"}
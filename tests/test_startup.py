@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+# Cumulative import time budget of the CLI module, in microseconds
+CLI_IMPORT_BUDGET = 100_000
+HEAVY_MODULES = {'asyncio', 'httpx', 'rich', 'packageurl', 'pandas', 'openpyxl', 'msgspec', 'orjson'}
+
+
+def imported(module):
+    """Modules loaded by `import module` in a fresh interpreter, and the
+    cumulative import time of `module` reported by -X importtime.
+    """
+    code = f"import sys; import {module}; print(' '.join(sys.modules))"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+    cumulative = next(int(line.split('|')[1]) for line in result.stderr.splitlines() if line.split('|')[-1].strip() == module)
+    return set(result.stdout.split()), cumulative
+
+
+def test_cli_import_is_lazy():
+    modules, cumulative = imported('open_source_insights_api.cli')
+    assert not {name.split('.')[0] for name in modules} & HEAVY_MODULES
+    assert cumulative < CLI_IMPORT_BUDGET
+
+
+def test_library_does_not_import_cli():
+    for module in ('open_source_insights_api', 'open_source_insights_api.os_insights'):
+        modules, _ = imported(module)
+        assert not {'open_source_insights_api.cli', 'rich', 'pandas'} & modules
+
+
+def test_version_runs_without_heavy_modules():
+    code = "import sys; from open_source_insights_api import cli; sys.argv = ['sbom_insights', '--version']\ntry:\n    cli.cli()\nexcept SystemExit:\n    pass\nprint(' '.join(sys.modules))"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.startswith('Current version:')
+    assert not {name.split('.')[0] for name in result.stdout.split()} & HEAVY_MODULES